@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Batched Action Execution
+Collapses an action plan into as few Home Assistant service calls as
+possible: actions with the same domain.service and service data become one
+call with a list entity_id. Calls that cannot affect each other run
+concurrently; actions that touch the same entity keep their order.
+"""
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ha-batch')
+
+
+def action_entities(action):
+    """Entity ids an action targets, from entity_id or service_data.entity_id"""
+    value = action.get('entity_id') or (action.get('service_data') or {}).get('entity_id')
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, str)]
+    return []
+
+
+def plan_calls(actions):
+    """Group actions into stages of service calls.
+
+    Returns a list of stages; each stage is a list of calls that may run
+    concurrently, and every call is {"domain", "service", "service_data",
+    "entity_ids", "indices"} where indices point back into `actions`.
+    """
+    stage_of = []
+    touched = []  # per stage: entity ids written in that stage
+    for action in actions:
+        entities = action_entities(action)
+        if not entities or 'all' in entities:
+            # Untargeted and "all" calls may touch anything: order them after everything before
+            stage = len(touched)
+        else:
+            stage = 0
+            for index, written in enumerate(touched):
+                if written is None or written & set(entities):
+                    stage = index + 1
+        if stage == len(touched):
+            touched.append(set())
+        if not entities or 'all' in entities:
+            touched[stage] = None
+        elif touched[stage] is not None:
+            touched[stage].update(entities)
+        stage_of.append(stage)
+
+    stages = [[] for _ in touched]
+    groups = {}
+    for index, (action, stage) in enumerate(zip(actions, stage_of)):
+        entities = action_entities(action)
+        service_data = {key: value for key, value in (action.get('service_data') or {}).items() if key != 'entity_id'}
+        mergeable = entities and 'all' not in entities
+        key = (stage, action.get('domain'), action.get('service'), json.dumps(service_data, sort_keys=True))
+        if mergeable and key in groups:
+            call = groups[key]
+            call["entity_ids"].extend(e for e in entities if e not in call["entity_ids"])
+            call["indices"].append(index)
+            continue
+        call = {"domain": action.get('domain'), "service": action.get('service'), "service_data": service_data,
+                "entity_ids": list(entities), "indices": [index]}
+        if mergeable:
+            groups[key] = call
+        stages[stage].append(call)
+    return stages
+
+
+def call_payload(call):
+    """Service data for one batched call"""
+    payload = dict(call["service_data"])
+    if call["entity_ids"]:
+        entity_ids = call["entity_ids"]
+        payload['entity_id'] = entity_ids[0] if len(entity_ids) == 1 else entity_ids
+    return payload
+
+
+def _spread(actions, call, outcome, results):
+    """Copy one call's outcome onto each action it carried"""
+    for index in call["indices"]:
+        action = actions[index]
+        result = dict(outcome, action=f"{call['domain']}.{call['service']}", entity=action.get('entity_id'))
+        if len(call["indices"]) > 1:
+            result["batched_with"] = len(call["indices"])
+        results[index] = result
+
+
+def execute_actions(actions, call_service):
+    """Run a plan's actions in as few round trips as possible; one result per action, in order.
+
+    call_service(domain, service, service_data) returns {"success", "status_code"}
+    or {"success": False, "error"}.
+    """
+    def run(call):
+        try:
+            return call_service(call["domain"], call["service"], call_payload(call))
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    results = [None] * len(actions)
+    for stage in plan_calls(actions):
+        if len(stage) == 1:
+            outcomes = [run(stage[0])]
+        else:
+            # One context copy per call, so each thread carries the request's trace
+            futures = [_executor.submit(tracing.bind(run), call) for call in stage]
+            outcomes = [future.result() for future in futures]
+        for call, outcome in zip(stage, outcomes):
+            _spread(actions, call, outcome, results)
+    return results
+
+
+async def execute_actions_async(actions, call_service):
+    """execute_actions for an async call_service coroutine function"""
+    results = [None] * len(actions)
+    for stage in plan_calls(actions):
+        outcomes = await asyncio.gather(*(call_service(call["domain"], call["service"], call_payload(call))
+                                          for call in stage), return_exceptions=True)
+        for call, outcome in zip(stage, outcomes):
+            if isinstance(outcome, Exception):
+                outcome = {"success": False, "error": str(outcome)}
+            _spread(actions, call, outcome, results)
+    return results
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Action Validation for Model Output
+Parses a model reply into JSON (repairing fenced or truncated replies in one
+pass) and checks each proposed action against the live registry before it is
+executed: the domain and service must exist in HA, and every entity_id must
+be a known entity. An entity_id the model misspelled is repaired when it
+names exactly one entity of that domain; anything else is rejected with a
+reason instead of being sent to HA.
+"""
+
+import json
+import threading
+
+from llm_json import extract_json
+
+
+class ActionValidator:
+    """Registry checks for LLM-proposed actions, with parse and repair counters"""
+
+    def __init__(self, state_store, entity_index):
+        self.state_store = state_store
+        self.entity_index = entity_index  # callable returning the intent parser's EntityIndex
+        self._lock = threading.Lock()
+        self.counters = {"json_clean": 0, "json_repaired": 0, "json_failed": 0,
+                         "actions_valid": 0, "actions_repaired": 0, "actions_rejected": 0, "rejections": {}}
+
+    # ------------------------------------------------------------------
+    # Parsing
+    # ------------------------------------------------------------------
+
+    def parse(self, text):
+        """Return the JSON object in a model reply, or None when nothing can be recovered"""
+        try:
+            document = json.loads(text)
+            outcome = 'json_clean'
+        except json.JSONDecodeError:
+            document = extract_json(text)
+            outcome = 'json_repaired'
+        if not isinstance(document, dict):
+            document, outcome = None, 'json_failed'
+        self._count(outcome)
+        return document
+
+    # ------------------------------------------------------------------
+    # Validation
+    # ------------------------------------------------------------------
+
+    def check(self, action):
+        """Return (action, error): the action, with entity_ids repaired, or the reason it was rejected"""
+        if not isinstance(action, dict):
+            return self._reject(action, 'malformed', "Action is not a JSON object")
+        domain, service = action.get('domain'), action.get('service')
+        if not isinstance(domain, str) or not isinstance(service, str) or not domain or not service:
+            return self._reject(action, 'malformed', "Action is missing domain or service")
+
+        services = self.state_store.services()
+        if services:
+            if domain not in services:
+                return self._reject(action, 'unknown_domain', f"Unknown domain '{domain}'")
+            if service not in services[domain]:
+                return self._reject(action, 'unknown_service',
+                                    f"Domain '{domain}' has no service '{service}'")
+
+        checked = dict(action)
+        repaired = False
+        if action.get('service_data') is not None and not isinstance(action['service_data'], dict):
+            return self._reject(action, 'malformed', "service_data is not a JSON object")
+        targets = [(checked, 'entity_id')]
+        if isinstance(checked.get('service_data'), dict) and 'entity_id' in checked['service_data']:
+            checked['service_data'] = dict(checked['service_data'])
+            targets.append((checked['service_data'], 'entity_id'))
+
+        for container, key in targets:
+            value = container.get(key)
+            if value is None:
+                continue
+            entity_ids = [value] if isinstance(value, str) else value
+            if not isinstance(entity_ids, list) or not all(isinstance(e, str) for e in entity_ids):
+                return self._reject(action, 'malformed', "entity_id must be a string or a list of strings")
+            fixed = []
+            for entity_id in entity_ids:
+                resolved = self._resolve(entity_id, domain)
+                if resolved is None:
+                    return self._reject(action, 'unknown_entity', f"Unknown entity '{entity_id}'")
+                repaired = repaired or resolved != entity_id
+                fixed.append(resolved)
+            container[key] = fixed[0] if isinstance(value, str) else fixed
+
+        self._count('actions_repaired' if repaired else 'actions_valid')
+        return checked, None
+
+    def validate(self, actions):
+        """check() every action of a plan; returns [(action, error)] in plan order"""
+        return [self.check(action) for action in actions]
+
+    def _resolve(self, entity_id, domain):
+        """The entity_id itself when HA knows it, a unique same-domain match when it does not, else None"""
+        if entity_id == 'all' or self.state_store.get(entity_id) is not None:
+            return entity_id
+        entity_domain, _, object_id = entity_id.partition('.')
+        if not object_id:
+            entity_domain, object_id = domain, entity_id
+        matches = self.entity_index().resolve(object_id.replace('_', ' '), (entity_domain,))
+        return matches[0]['entity_id'] if len(matches) == 1 else None
+
+    def _reject(self, action, reason, error):
+        with self._lock:
+            self.counters["actions_rejected"] += 1
+            self.counters["rejections"][reason] = self.counters["rejections"].get(reason, 0) + 1
+        return action, error
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters, rejections=dict(self.counters["rejections"]))
+        replies = counters["json_clean"] + counters["json_repaired"] + counters["json_failed"]
+        counters["wasted_inference_rate"] = round(counters["json_failed"] / replies, 3) if replies else 0.0
+        return counters
+
+
+def rejected_result(action, error):
+    """Execution result for an action that was never sent to HA"""
+    if not isinstance(action, dict):
+        return {"success": False, "error": error, "rejected": True}
+    return {"success": False, "error": error, "rejected": True,
+            "action": f"{action.get('domain')}.{action.get('service')}", "entity": action.get('entity_id')}
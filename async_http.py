@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Shared Non-blocking HTTP Client
+httpx.AsyncClient counterpart of http_client for the asyncio serving mode.
+Uses the same per-endpoint timeouts, retry budget and request counters, so
+/http_stats reads the same whichever mode a service runs in.
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+import http_client
+import tracing
+
+# Configuration
+ASYNC_MAX_CONNECTIONS = int(os.getenv('HTTP_ASYNC_MAX_CONNECTIONS', '200'))  # sockets across all hosts
+ASYNC_MAX_KEEPALIVE = int(os.getenv('HTTP_ASYNC_MAX_KEEPALIVE', str(http_client.POOL_MAXSIZE)))
+
+
+class AsyncHTTPClient:
+    """Keep-alive client for one event loop, sharing policy and counters with http_client"""
+
+    def __init__(self, max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive=ASYNC_MAX_KEEPALIVE,
+                 accounting=http_client.client):
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.accounting = accounting  # PooledHTTPClient whose policies, retry budget and counters we share
+        self._client = None
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _session(self):
+        # Created lazily so the client binds to the serving loop, not the importing thread
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=httpx.Limits(max_connections=self.max_connections,
+                                                                 max_keepalive_connections=self.max_keepalive))
+        return self._client
+
+    def _timeout(self, endpoint):
+        connect, read = self.accounting.policy(endpoint).timeout
+        return httpx.Timeout(read, connect=connect)
+
+    def _enter(self):
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    async def request(self, method, url, endpoint='default', **kwargs):
+        """Send a request using the endpoint's timeout and retry policy"""
+        with tracing.span(f"{method.upper()} {endpoint}", kind='client', **{"http.url": url}) as span:
+            if span is None:
+                return await self._send(method, url, endpoint, **kwargs)
+            kwargs['headers'] = span.inject(kwargs.get('headers'))
+            response = await self._send(method, url, endpoint, **kwargs)
+            span.set(**{"http.status_code": response.status_code})
+            return response
+
+    async def _send(self, method, url, endpoint, **kwargs):
+        policy = self.accounting.policy(endpoint)
+        kwargs.setdefault('timeout', self._timeout(endpoint))
+        host = urlsplit(url).netloc
+        method = method.upper()
+        retries = policy.retries if method in http_client.IDEMPOTENT_METHODS else 0
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            self._enter()
+            try:
+                response = await self._session().request(method, url, **kwargs)
+            except (httpx.TransportError, httpx.TimeoutException) as e:
+                self.accounting._record(host, endpoint, started, error=e)
+                if attempt < retries and self.accounting._take_retry():
+                    attempt += 1
+                    await asyncio.sleep(http_client.RETRY_BACKOFF * attempt)
+                    continue
+                raise
+            finally:
+                self.in_flight -= 1
+            self.accounting._record(host, endpoint, started, status=response.status_code)
+            if response.status_code in (502, 503, 504) and attempt < retries and self.accounting._take_retry():
+                attempt += 1
+                await asyncio.sleep(http_client.RETRY_BACKOFF * attempt)
+                continue
+            return response
+
+    async def get(self, url, endpoint='default', **kwargs):
+        return await self.request('GET', url, endpoint=endpoint, **kwargs)
+
+    async def post(self, url, endpoint='default', **kwargs):
+        return await self.request('POST', url, endpoint=endpoint, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method, url, endpoint='default', **kwargs):
+        """Open a streamed response; never retried, since the body is consumed incrementally"""
+        kwargs.setdefault('timeout', self._timeout(endpoint))
+        host = urlsplit(url).netloc
+        # Not made current: the body is read across the caller's yields
+        span = tracing.start_span(f"{method.upper()} {endpoint}", kind='client', **{"http.url": url})
+        if span is not None:
+            kwargs['headers'] = span.inject(kwargs.get('headers'))
+        started = time.monotonic()
+        self._enter()
+        error = None
+        try:
+            async with self._session().stream(method.upper(), url, **kwargs) as response:
+                self.accounting._record(host, endpoint, started, status=response.status_code)
+                if span is not None:
+                    span.set(**{"http.status_code": response.status_code})
+                yield response
+        except (httpx.TransportError, httpx.TimeoutException) as e:
+            self.accounting._record(host, endpoint, started, error=e)
+            error = e
+            raise
+        finally:
+            self.in_flight -= 1
+            if span is not None:
+                span.end(error=error)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    # ------------------------------------------------------------------
+    # Counters
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        """Shared request counters plus this loop's in-flight gauge"""
+        return dict(self.accounting.stats(), async_pool={
+            "max_connections": self.max_connections,
+            "max_keepalive": self.max_keepalive,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight
+        })
+
+
+# Process-wide shared client (one serving loop per process)
+client = AsyncHTTPClient()
+
+
+async def request(method, url, endpoint='default', **kwargs):
+    return await client.request(method, url, endpoint=endpoint, **kwargs)
+
+
+async def get(url, endpoint='default', **kwargs):
+    return await client.get(url, endpoint=endpoint, **kwargs)
+
+
+async def post(url, endpoint='default', **kwargs):
+    return await client.post(url, endpoint=endpoint, **kwargs)
+
+
+def stream(method, url, endpoint='default', **kwargs):
+    return client.stream(method, url, endpoint=endpoint, **kwargs)
+
+
+async def aclose():
+    await client.aclose()
+
+
+def stats():
+    return client.stats()
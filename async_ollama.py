@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Async Ollama Client
+Non-blocking versions of ollama_client.chat and stream_chat, the
+llm_router failover/hedging loop for the event loop, and PromptManager-aware
+forms that wait for the prompt's scheduler slot first
+"""
+
+import asyncio
+import json
+
+import async_http
+from llm_router import HEDGE_CANCELLED
+from ollama_client import OLLAMA_KEEP_ALIVE, OLLAMA_MODEL, OLLAMA_URL, OllamaError, chat_payload
+
+
+async def chat(messages, base_url=OLLAMA_URL, model=OLLAMA_MODEL, endpoint='ollama_generate',
+               keep_alive=OLLAMA_KEEP_ALIVE, options=None, on_done=None, format=None):
+    """Run one non-streaming /api/chat call and return the assistant's reply text"""
+    response = await async_http.post(f"{base_url}/api/chat", endpoint=endpoint,
+                                     json=chat_payload(messages, model, False, keep_alive, options, format))
+    if response.status_code != 200:
+        raise OllamaError(f"AI service returned HTTP {response.status_code}")
+    body = response.json()
+    if on_done:
+        on_done(body)
+    return (body.get('message') or {}).get('content', '')
+
+
+async def stream_chat(messages, base_url=OLLAMA_URL, model=OLLAMA_MODEL, endpoint='ollama_generate',
+                      keep_alive=OLLAMA_KEEP_ALIVE, options=None, on_done=None, format=None):
+    """Yield reply tokens from /api/chat as Ollama produces them (NDJSON stream)"""
+    async with async_http.stream('POST', f"{base_url}/api/chat", endpoint=endpoint,
+                                 json=chat_payload(messages, model, True, keep_alive, options, format)) as response:
+        if response.status_code != 200:
+            raise OllamaError(f"AI service returned HTTP {response.status_code}")
+
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get('error'):
+                raise OllamaError(chunk['error'])
+            token = (chunk.get('message') or {}).get('content', '')
+            if token:
+                yield token
+            if chunk.get('done'):
+                if on_done:
+                    on_done(chunk)
+                break
+
+
+async def routed_chat(router, request, tier='large'):
+    """LLMRouter.chat for the event loop: failover, and a hedged second host when configured"""
+    attempts = router.candidates(tier)
+    last_error = None
+
+    async def call(backend, model):
+        with router.track(backend, model):
+            return await chat(**dict(request, base_url=backend.url, model=model))
+
+    if router.hedge_after and len(attempts) > 1:
+        racing = [asyncio.ensure_future(call(*attempts[0]))]
+        done, _ = await asyncio.wait(racing, timeout=router.hedge_after)
+        if not done:
+            router.count("hedges")
+            racing.append(asyncio.ensure_future(call(*attempts[1])))
+        pending = set(racing)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not racing[0]:
+                            router.count("hedge_wins")
+                        return task.result()
+                    last_error = task.exception()
+        finally:
+            # The losing request is cancelled, which closes its connection to Ollama;
+            # waiting for it lets router.track count it and end its span before we answer
+            for task in pending:
+                task.cancel(HEDGE_CANCELLED)
+            if pending:
+                await asyncio.wait(pending)
+        attempts = attempts[len(racing):]
+
+    for backend, model in attempts:
+        if last_error is not None:
+            router.count("failovers")
+        try:
+            return await call(backend, model)
+        except Exception as e:
+            last_error = e
+    raise OllamaError(f"All AI backends failed: {last_error}")
+
+
+async def routed_stream_chat(router, request, tier='large'):
+    """LLMRouter.stream_chat for the event loop; fails over only until the first token arrives"""
+    last_error = None
+    for backend, model in router.candidates(tier):
+        if last_error is not None:
+            router.count("failovers")
+        started = False
+        try:
+            with router.track(backend, model):
+                async for token in stream_chat(**dict(request, base_url=backend.url, model=model)):
+                    started = True
+                    yield token
+            return
+        except Exception as e:
+            if started:
+                raise
+            last_error = e
+    raise OllamaError(f"All AI backends failed: {last_error}")
+
+
+async def prompt_chat(prompts, name, user, endpoint='ollama_generate'):
+    """Async PromptManager.chat: a registered prompt, under its scheduler slot, over the router"""
+    async with prompts.slot_async(name):
+        return await routed_chat(prompts.router, prompts.request(name, user, endpoint), prompts.tiers[name])
+
+
+async def prompt_stream_chat(prompts, name, user, endpoint='ollama_generate'):
+    """Async PromptManager.stream_chat; the slot is held until the stream ends"""
+    async with prompts.slot_async(name):
+        async for token in routed_stream_chat(prompts.router, prompts.request(name, user, endpoint),
+                                              prompts.tiers[name]):
+            yield token
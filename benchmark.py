@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Bridge Latency Benchmark
+Starts a local fake Home Assistant (REST, WebSocket and camera_proxy JPEGs)
+and a fake Ollama with configurable latency, serves the bridges and the
+enhanced web UI on local ports, and drives /voice_command, /smart_query,
+/camera_status and /camera_proxy at a fixed concurrency. Prints p50/p95/p99
+latency, throughput and error rate per endpoint and serving mode as JSON.
+
+    python benchmark.py --concurrency 20 --requests 200 --out run.json
+    python benchmark.py --baseline run.json   # adds the change against an earlier run
+
+Scenarios run one after another so they do not compete for the fakes.
+"""
+
+import argparse
+import json
+import logging
+import os
+
+from fake_ha import FakeHomeAssistant
+from fake_ollama import FakeOllama
+from load_test import free_port, run_load, serve_async, serve_sync, wait_for
+
+SCENARIOS = ('voice_command', 'smart_query', 'camera_status', 'camera_proxy')
+MODES = ('sync', 'async')
+
+
+def seed_home(ha, camera_entities):
+    """Entities the bridges resolve against: the fake Ollama's kitchen light plus every camera"""
+    ha.set_state('light.kitchen', 'off', {'friendly_name': 'Kitchen Lights'})
+    ha.set_state('sensor.living_room_temperature', '21.5',
+                 {'friendly_name': 'Living Room Temperature', 'unit_of_measurement': '°C'})
+    for entity_id in camera_entities:
+        ha.set_state(entity_id, 'idle', {'friendly_name': entity_id.split('.', 1)[1].replace('_', ' ').title()})
+
+
+def scenario_requests(name, base, count, run):
+    """(method, url or per-request urls, payloads) for one scenario against a server at base"""
+    if name == 'voice_command':
+        # Distinct commands, across runs too, so neither the fast path nor the
+        # response cache (shared by the sync and async bridge) short-circuits the LLM
+        return 'POST', f"{base}/voice_command", [{"command": f"set up the house for movie night, plan {run} {i}"}
+                                                 for i in range(count)]
+    if name == 'smart_query':
+        return 'POST', f"{base}/smart_query", [
+            {"query": f"what should I do about the garden this evening, plan {run} {i}"} for i in range(count)]
+    if name == 'camera_status':
+        return 'GET', f"{base}/camera_status", [None] * count
+    import web_ui_enhanced
+    cameras = sorted(web_ui_enhanced.CAMERA_ENTITIES)
+    return 'GET', [f"{base}/camera_proxy/{cameras[i % len(cameras)]}" for i in range(count)], [None] * count
+
+
+def services(name):
+    """{mode: service module} serving a scenario; the web UI has no asyncio mode"""
+    if name in ('voice_command', 'smart_query'):
+        import ha_bridge
+        import ha_bridge_async
+        return {'sync': ha_bridge, 'async': ha_bridge_async}
+    if name == 'camera_status':
+        import ha_bridge_camera
+        import ha_bridge_camera_async
+        return {'sync': ha_bridge_camera, 'async': ha_bridge_camera_async}
+    import web_ui_enhanced
+    return {'sync': web_ui_enhanced}
+
+
+def compare(results, baseline):
+    """Ratio of each latency percentile and of throughput to the same scenario in an earlier run"""
+    changes = {}
+    for name, modes in results.items():
+        for mode, current in modes.items():
+            previous = baseline.get('results', {}).get(name, {}).get(mode)
+            if not previous:
+                continue
+            change = {q: round(current['latency_ms'][q] / previous['latency_ms'][q], 2)
+                      for q in ('p50', 'p95', 'p99')
+                      if current['latency_ms'][q] and previous['latency_ms'][q]}
+            if previous['throughput_rps']:
+                change['throughput'] = round(current['throughput_rps'] / previous['throughput_rps'], 2)
+            change['error_rate'] = round(current['error_rate'] - previous['error_rate'], 4)
+            changes.setdefault(name, {})[mode] = change
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario and mode')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated subset of ' +
+                        ', '.join(SCENARIOS))
+    parser.add_argument('--modes', default=','.join(MODES), help='sync, async or both')
+    parser.add_argument('--ollama-latency', type=float, default=0.5, help='fake Ollama seconds to first token')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='fake Ollama seconds between tokens')
+    parser.add_argument('--ha-latency', type=float, default=0.01, help='fake HA seconds per REST call')
+    parser.add_argument('--camera-delay', type=float, default=0.1, help='fake HA seconds per snapshot')
+    parser.add_argument('--frame-bytes', type=int, default=150_000, help='fake snapshot size')
+    parser.add_argument('--max-concurrent', type=int, default=0,
+                        help='OLLAMA_MAX_CONCURRENT for the bridges; 0 = --concurrency')
+    parser.add_argument('--sync-workers', type=int, default=8, help='request threads for the Flask servers')
+    parser.add_argument('--out', help='also write the JSON report to this file')
+    parser.add_argument('--baseline', help='JSON report of an earlier run to compare against')
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = sorted(set(scenarios) - set(SCENARIOS)) + sorted(set(modes) - set(MODES))
+    if unknown:
+        parser.error(f"unknown scenario or mode: {', '.join(unknown)}")
+
+    ha = FakeHomeAssistant(latency=args.ha_latency, camera_delay=args.camera_delay,
+                           frame_bytes=args.frame_bytes).start()
+    ollama = FakeOllama(first_token_delay=args.ollama_latency, token_delay=args.token_delay).start()
+
+    # The services read their configuration at import time
+    os.environ.update({'HA_URL': ha.url, 'HA_TOKEN': ha.token, 'OLLAMA_URL': ollama.url,
+                       'OLLAMA_WARM_UP': 'false',
+                       'OLLAMA_MAX_CONCURRENT': str(args.max_concurrent or args.concurrency)})
+    import ha_bridge_camera
+    seed_home(ha, ha_bridge_camera.CAMERA_NAMES)
+
+    results = {}
+    for name in scenarios:
+        for mode, service in services(name).items():
+            if mode not in modes:
+                continue
+            # Started here as each service's __main__ would; the async ones share their sync module's mirror
+            service.state_store.start()
+            service.state_store.wait_ready(10)
+            port = free_port()
+            if mode == 'sync':
+                stop = serve_sync(service.app, port, args.sync_workers)
+            else:
+                stop = serve_async(service.app, port)
+            wait_for(f"http://127.0.0.1:{port}/health")
+            method, url, payloads = scenario_requests(name, f"http://127.0.0.1:{port}", args.requests, mode)
+            results.setdefault(name, {})[mode] = run_load(url, payloads, args.concurrency, method=method)
+            stop()
+
+    report = {"config": vars(args), "results": results}
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["change"] = compare(results, json.load(f))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+
+    ha.stop()
+    ollama.stop()
+
+
+if __name__ == '__main__':
+    main()
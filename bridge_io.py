@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Transport-agnostic Request Handling
+The bridge routes are written once and served by both Flask (ha_bridge.py,
+ha_bridge_camera.py) and Quart (the *_async.py modules). A handler takes a
+BridgeRequest and returns the response body, (body, status[, headers]) or a
+Stream. When it needs I/O it is a generator: it yields an effect (an HTTP
+call, a model call, a blocking state-mirror read, a fan-out) and is sent
+the result, or has the effect's exception raised at the yield. run()
+performs effects on the calling thread; run_async() awaits them on the
+event loop. Routes installs the handlers on either app, so the servers only
+translate requests and responses.
+"""
+
+import asyncio
+import inspect
+from functools import partial
+
+import async_http
+import async_ollama
+import http_client
+from action_batch import execute_actions, execute_actions_async
+from fanout import FANOUT_DEADLINE, fan_out, fan_out_async
+from sse import SSE_HEADERS
+
+
+class BridgeRequest:
+    """The parts of an HTTP request a handler reads"""
+
+    def __init__(self, json, args, headers, host_url):
+        self.json = json  # parsed body, None when it is missing or not JSON
+        self.args = args
+        self.headers = headers
+        self.host_url = host_url
+
+    def wants_stream(self):
+        """True when the client asked for a Server-Sent Events response"""
+        data = self.json or {}
+        return bool(data.get('stream')) or self.args.get('stream') in ('1', 'true') \
+            or 'text/event-stream' in self.headers.get('Accept', '')
+
+
+class Stream:
+    """A streamed response: a string, or a handler generator whose non-effect yields are the chunks"""
+
+    def __init__(self, body, mimetype='text/event-stream', headers=SSE_HEADERS):
+        self.body = body
+        self.mimetype = mimetype
+        self.headers = headers
+
+
+# ----------------------------------------------------------------------
+# Effects
+# ----------------------------------------------------------------------
+
+class Effect:
+    """One operation a handler yields; run() blocks on it, run_async() awaits it"""
+
+    opens_stream = False  # the result is an iterator the driver closes with the handler
+
+    def run(self):
+        raise NotImplementedError
+
+    async def run_async(self):
+        raise NotImplementedError
+
+
+class Call(Effect):
+    """func(*args, **kwargs) on sync servers, func_async(*args, **kwargs) on the event loop"""
+
+    def __init__(self, func, func_async, *args, **kwargs):
+        self.func, self.func_async = func, func_async
+        self.args, self.kwargs = args, kwargs
+
+    def run(self):
+        return self.func(*self.args, **self.kwargs)
+
+    async def run_async(self):
+        result = self.func_async(*self.args, **self.kwargs)
+        return await result if inspect.isawaitable(result) else result
+
+
+class Blocking(Effect):
+    """A blocking function; the event loop runs it on a worker thread unless ready() says it will not block"""
+
+    def __init__(self, func, *args, ready=None):
+        self.func, self.args, self.ready = func, args, ready
+
+    def run(self):
+        return self.func(*self.args)
+
+    async def run_async(self):
+        if self.ready is not None and self.ready():
+            return self.func(*self.args)
+        return await asyncio.to_thread(self.func, *self.args)
+
+
+class FanOut(Effect):
+    """{key: handler} side by side under one deadline; the result is fanout's (results, pending keys)"""
+
+    def __init__(self, handlers, deadline=FANOUT_DEADLINE):
+        self.handlers, self.deadline = handlers, deadline
+
+    def run(self):
+        return fan_out({key: partial(run, handler) for key, handler in self.handlers.items()}, self.deadline)
+
+    async def run_async(self):
+        return await fan_out_async({key: run_async(handler) for key, handler in self.handlers.items()},
+                                   self.deadline)
+
+
+class ExecuteActions(Effect):
+    """action_batch.execute_actions, where call_service(domain, service, service_data) is a handler"""
+
+    def __init__(self, actions, call_service):
+        self.actions, self.call_service = actions, call_service
+
+    def run(self):
+        return execute_actions(self.actions, lambda *call: run(self.call_service(*call)))
+
+    async def run_async(self):
+        return await execute_actions_async(self.actions, lambda *call: run_async(self.call_service(*call)))
+
+
+class Iterate(Effect):
+    """Open a stream: func's generator on sync servers, func_async's async generator on the event loop"""
+
+    opens_stream = True
+
+    def __init__(self, func, func_async, *args, **kwargs):
+        self.func, self.func_async = func, func_async
+        self.args, self.kwargs = args, kwargs
+
+    def run(self):
+        return self.func(*self.args, **self.kwargs)
+
+    async def run_async(self):
+        return self.func_async(*self.args, **self.kwargs)
+
+
+class Next(Effect):
+    """The next item of a stream opened by Iterate, or None once it is exhausted"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def run(self):
+        return next(self.stream, None)
+
+    async def run_async(self):
+        try:
+            return await self.stream.__anext__()
+        except StopAsyncIteration:
+            return None
+
+
+def http(method, url, endpoint='default', **kwargs):
+    """Upstream HTTP call through the shared pool of the serving mode"""
+    return Call(http_client.request, async_http.request, method, url, endpoint=endpoint, **kwargs)
+
+
+def http_stats():
+    """Connection-pool usage of the serving mode's HTTP client"""
+    return Call(http_client.stats, async_http.stats)
+
+
+def chat(prompts, name, user, endpoint='ollama_generate'):
+    """Reply to a registered prompt, under its scheduler slot"""
+    return Call(prompts.chat, partial(async_ollama.prompt_chat, prompts), name, user, endpoint=endpoint)
+
+
+def stream_chat(prompts, name, user, endpoint='ollama_generate'):
+    """Token stream for a registered prompt; read it with Next"""
+    return Iterate(prompts.stream_chat, partial(async_ollama.prompt_stream_chat, prompts), name, user,
+                   endpoint=endpoint)
+
+
+# ----------------------------------------------------------------------
+# Drivers
+# ----------------------------------------------------------------------
+
+def stream(handler):
+    """Chunks of a streaming handler, performing its effects on this thread in between"""
+    opened = []
+    value, send = None, handler.send
+    try:
+        while True:
+            try:
+                step = send(value)
+            except StopIteration as stop:
+                return stop.value
+            if not isinstance(step, Effect):
+                value, send = None, handler.send
+                yield step
+                continue
+            try:
+                value, send = step.run(), handler.send
+            except Exception as e:
+                value, send = e, handler.throw
+            else:
+                if step.opens_stream:
+                    opened.append(value)
+    finally:
+        # A client that hung up closes the handler, then whatever it was reading
+        handler.close()
+        for iterator in opened:
+            iterator.close()
+
+
+def run(handler):
+    """A handler's result, with its effects performed on this thread"""
+    if not inspect.isgenerator(handler):
+        return handler
+    chunks = stream(handler)
+    try:
+        chunk = next(chunks)
+    except StopIteration as stop:
+        return stop.value
+    chunks.close()
+    raise TypeError(f"handler yielded {chunk!r} outside a Stream")
+
+
+async def stream_async(handler, outcome=None):
+    """stream() for the event loop; an async generator cannot return, so the result goes on outcome"""
+    opened = []
+    value, send = None, handler.send
+    try:
+        while True:
+            try:
+                step = send(value)
+            except StopIteration as stop:
+                if outcome is not None:
+                    outcome.append(stop.value)
+                return
+            if not isinstance(step, Effect):
+                value, send = None, handler.send
+                yield step
+                continue
+            try:
+                value, send = await step.run_async(), handler.send
+            except Exception as e:
+                value, send = e, handler.throw
+            else:
+                if step.opens_stream:
+                    opened.append(value)
+    finally:
+        handler.close()
+        for iterator in opened:
+            await iterator.aclose()
+
+
+async def run_async(handler):
+    """run() for the event loop"""
+    if not inspect.isgenerator(handler):
+        return handler
+    outcome = []
+    chunks = stream_async(handler, outcome)
+    async for chunk in chunks:
+        await chunks.aclose()
+        raise TypeError(f"handler yielded {chunk!r} outside a Stream")
+    return outcome[0]
+
+
+# ----------------------------------------------------------------------
+# Web framework adapters
+# ----------------------------------------------------------------------
+
+class Routes:
+    """Handlers by URL rule, installed on a Flask app by install() or a Quart app by install_async()"""
+
+    def __init__(self):
+        self.rules = []
+
+    def route(self, rule, methods=('GET',)):
+        def register(handler):
+            self.rules.append((rule, methods, handler))
+            return handler
+        return register
+
+    def install(self, app):
+        from flask import Response, jsonify, request, stream_with_context
+
+        def view(handler):
+            def endpoint(**view_args):
+                bridge_request = BridgeRequest(request.get_json(silent=True), request.args, request.headers,
+                                               request.host_url)
+                result = run(handler(bridge_request, **view_args))
+                if isinstance(result, Stream):
+                    body = result.body if isinstance(result.body, str) \
+                        else stream_with_context(stream(result.body))
+                    return Response(body, mimetype=result.mimetype, headers=result.headers)
+                if isinstance(result, tuple):
+                    return (jsonify(result[0]),) + result[1:]
+                return jsonify(result)
+            return endpoint
+
+        for rule, methods, handler in self.rules:
+            app.add_url_rule(rule, handler.__name__, view(handler), methods=list(methods))
+
+    def install_async(self, app):
+        from quart import Response, jsonify, request
+
+        def view(handler):
+            async def endpoint(**view_args):
+                bridge_request = BridgeRequest(await request.get_json(silent=True), request.args,
+                                               request.headers, request.host_url)
+                result = await run_async(handler(bridge_request, **view_args))
+                if isinstance(result, Stream):
+                    body = result.body if isinstance(result.body, str) else stream_async(result.body)
+                    return Response(body, mimetype=result.mimetype, headers=result.headers)
+                if isinstance(result, tuple):
+                    return (jsonify(result[0]),) + result[1:]
+                return jsonify(result)
+            return endpoint
+
+        for rule, methods, handler in self.rules:
+            app.add_url_rule(rule, handler.__name__, view(handler), methods=list(methods))
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Camera Mosaic
+Every camera composited into one grid JPEG, so a wall display or a slow
+client refreshes a single image instead of one per camera. Tiles are
+fetched and scaled concurrently from the snapshot variants (thumbnails for
+small grids), and each finished mosaic is shared by every client for
+MOSAIC_FRESHNESS seconds.
+"""
+
+import io
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import partial
+
+from PIL import Image, ImageDraw
+
+from fanout import FANOUT_DEADLINE, fan_out
+from snapshot_cache import Snapshot
+
+# Configuration
+MOSAIC_WIDTH = int(os.getenv('MOSAIC_WIDTH', '1280'))               # default output width in pixels
+MOSAIC_FRESHNESS = float(os.getenv('MOSAIC_FRESHNESS', '5'))        # seconds a mosaic is served without rebuilding
+MOSAIC_QUALITY = int(os.getenv('MOSAIC_QUALITY', '75'))
+
+MIN_WIDTH, MAX_WIDTH = 160, 3840
+MAX_LAYOUTS = 8  # distinct width/columns combinations cached
+TILE_ASPECT = 16 / 9
+BACKGROUND = (17, 17, 17)
+LABEL_BACKGROUND = (0, 0, 0)
+LABEL_COLOR = (255, 255, 255)
+OFFLINE_COLOR = (136, 136, 136)
+
+
+class MosaicError(ValueError):
+    """Raised for an invalid width or column count"""
+
+
+class CameraMosaic:
+    """Grid of every camera's latest frame, built concurrently and cached per layout"""
+
+    def __init__(self, variants, cameras, freshness=MOSAIC_FRESHNESS, quality=MOSAIC_QUALITY,
+                 deadline=FANOUT_DEADLINE):
+        self.variants = variants  # SnapshotVariants the tiles are read from
+        self.cameras = cameras    # {camera key: entity_id}, in grid order
+        self.freshness = freshness
+        self.quality = quality
+        self.deadline = deadline
+        self._lock = threading.Lock()
+        self._mosaics = OrderedDict()  # (width, columns) -> Snapshot
+        self._inflight = {}            # (width, columns) -> threading.Event set when the build finishes
+        self.counters = {"hits": 0, "builds": 0, "coalesced": 0, "missing_tiles": 0, "build_seconds": 0.0}
+
+    def layout(self, width=MOSAIC_WIDTH, columns=None):
+        """(width, columns, rows, tile width, tile height) for a requested width and column count"""
+        count = len(self.cameras)
+        if not MIN_WIDTH <= width <= MAX_WIDTH:
+            raise MosaicError(f"width must be between {MIN_WIDTH} and {MAX_WIDTH}")
+        if columns is None:
+            columns = math.ceil(math.sqrt(count))
+        if not 1 <= columns <= max(count, 1):
+            raise MosaicError(f"columns must be between 1 and {max(count, 1)}")
+        rows = math.ceil(count / columns)
+        tile_width = width // columns
+        return tile_width * columns, columns, rows, tile_width, round(tile_width / TILE_ASPECT)
+
+    def get(self, width=MOSAIC_WIDTH, columns=None):
+        """Mosaic Snapshot for the layout, rebuilt at most once per freshness window; .missing lists absent cameras"""
+        layout = self.layout(width, columns)
+        key = layout[:2]
+        while True:
+            with self._lock:
+                mosaic = self._mosaics.get(key)
+                if mosaic and mosaic.age() < self.freshness:
+                    self._mosaics.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return mosaic
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    waiter = self._inflight[key] = threading.Event()
+                    break
+                self.counters["coalesced"] += 1
+            waiter.wait()
+            with self._lock:
+                mosaic = self._mosaics.get(key)
+            if mosaic and mosaic.age() < self.freshness:
+                return mosaic
+
+        try:
+            mosaic = self._build(*layout)
+            with self._lock:
+                self._mosaics[key] = mosaic
+                self._mosaics.move_to_end(key)
+                while len(self._mosaics) > MAX_LAYOUTS:
+                    self._mosaics.popitem(last=False)
+            return mosaic
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            waiter.set()
+
+    def _variant_for(self, tile_width):
+        """Smallest snapshot size at least tile_width wide (full frames when none is)"""
+        sized = sorted((width, size) for size, width in self.variants.sizes.items() if width)
+        return next((size for width, size in sized if width >= tile_width), 'full')
+
+    def _tile(self, entity_id, size, box):
+        snapshot = self.variants.get(entity_id, size)
+        image = Image.open(io.BytesIO(snapshot.content))
+        image.draft('RGB', box)
+        image = image.convert('RGB')
+        image.thumbnail(box, Image.Resampling.LANCZOS)  # fits the tile, keeping the camera's aspect ratio
+        return image
+
+    def _build(self, width, columns, rows, tile_width, tile_height):
+        started = time.monotonic()
+        size = self._variant_for(tile_width)
+        box = (tile_width, tile_height)
+        tiles, _ = fan_out({key: partial(self._tile, entity_id, size, box)
+                            for key, entity_id in self.cameras.items()}, self.deadline)
+
+        canvas = Image.new('RGB', (width, rows * tile_height), BACKGROUND)
+        draw = ImageDraw.Draw(canvas)
+        missing = []
+        for index, key in enumerate(self.cameras):
+            x, y = (index % columns) * tile_width, (index // columns) * tile_height
+            tile = tiles.get(key)
+            if isinstance(tile, Image.Image):
+                canvas.paste(tile, (x + (tile_width - tile.width) // 2, y + (tile_height - tile.height) // 2))
+            else:
+                # Unavailable, or still loading when the deadline passed
+                missing.append(key)
+                left, top, right, bottom = draw.textbbox((0, 0), 'Offline')
+                draw.text((x + (tile_width - right + left) // 2, y + (tile_height - bottom + top) // 2),
+                          'Offline', fill=OFFLINE_COLOR)
+            label = key.replace('_', ' ').title()
+            left, top, right, bottom = draw.textbbox((x + 6, y + 4), label)
+            draw.rectangle((left - 4, top - 3, right + 4, bottom + 3), fill=LABEL_BACKGROUND)
+            draw.text((x + 6, y + 4), label, fill=LABEL_COLOR)
+
+        output = io.BytesIO()
+        canvas.save(output, 'JPEG', quality=self.quality)
+        mosaic = Snapshot(output.getvalue(), 'image/jpeg')
+        mosaic.missing = missing
+        with self._lock:
+            self.counters["builds"] += 1
+            self.counters["missing_tiles"] += len(missing)
+            self.counters["build_seconds"] += time.monotonic() - started
+        return mosaic
+
+    def hit_counts(self):
+        """Coalesced requests count as hits: they were served without a build of their own"""
+        with self._lock:
+            return self.counters["hits"] + self.counters["coalesced"], self.counters["builds"]
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            layouts = {f"{width}x{columns}": {"age_seconds": round(mosaic.age(), 2),
+                                              "bytes": len(mosaic.content), "missing": mosaic.missing}
+                       for (width, columns), mosaic in self._mosaics.items()}
+        builds = counters["builds"]
+        counters["build_seconds"] = round(counters["build_seconds"], 3)
+        counters["avg_build_ms"] = round(counters["build_seconds"] * 1000 / builds, 1) if builds else None
+        return dict(counters, freshness_seconds=self.freshness, cameras=len(self.cameras), layouts=layouts)
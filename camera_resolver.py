@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Camera Keyword Resolver
+Compiles camera keywords and aliases into an Aho-Corasick automaton over
+words, so a command is resolved in one pass regardless of how many cameras
+and aliases exist. The longest match wins ("back road" beats "road") and
+competing matches for other cameras are reported as ambiguity.
+"""
+
+import re
+import threading
+from collections import deque
+
+# Words stripped from HA friendly names when deriving aliases
+NAME_NOISE = {'camera', 'high', 'resolution', 'channel', 'low', 'medium', 'package', 'the'}
+
+
+def words(text):
+    return re.findall(r'[a-z0-9]+', text.lower().replace('_', ' '))
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton whose alphabet is whole words"""
+
+    def __init__(self, phrases):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # per node: (phrase length in words, phrase, value)
+
+        for phrase, value in phrases.items():
+            phrase_words = words(phrase)
+            if not phrase_words:
+                continue
+            node = 0
+            for word in phrase_words:
+                if word not in self._goto[node]:
+                    self._goto[node][word] = self._new_node()
+                node = self._goto[node][word]
+            self._output[node].append((len(phrase_words), phrase, value))
+
+        # Breadth-first fail links; each node inherits the outputs of its fail target
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and word not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(word, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def _new_node(self):
+        self._goto.append({})
+        self._fail.append(0)
+        self._output.append([])
+        return len(self._goto) - 1
+
+    def find_all(self, text):
+        """Return every (start word, end word, phrase, value) occurrence in one pass"""
+        matches = []
+        node = 0
+        for index, word in enumerate(words(text)):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+            for length, phrase, value in self._output[node]:
+                matches.append((index - length + 1, index + 1, phrase, value))
+        return matches
+
+    def contains_any(self, text):
+        node = 0
+        for word in words(text):
+            while node and word not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(word, 0)
+            if self._output[node]:
+                return True
+        return False
+
+
+class CameraResolver:
+    """Resolves commands to camera entities from static mappings plus HA-discovered cameras"""
+
+    def __init__(self, mappings, names, state_store=None):
+        self.mappings = dict(mappings)
+        self.names = dict(names)
+        self.state_store = state_store
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._matcher = None
+        self._keywords = {}
+        self._camera_names = {}
+        self.rebuilds = 0
+        if state_store is not None:
+            state_store.add_listener(self._on_state_changed)
+
+    def _on_state_changed(self, entity_id, old_state, new_state):
+        # Hot-reload when a camera appears, disappears or is renamed
+        if entity_id.startswith('camera.') and (
+                old_state is None or new_state is None or
+                old_state.get('attributes', {}).get('friendly_name') != new_state.get('attributes', {}).get('friendly_name')):
+            self._dirty = True
+
+    def _discovered_cameras(self):
+        if self.state_store is None or not self.state_store.is_loaded():
+            return []
+        try:
+            return self.state_store.states_by_domain(['camera'])
+        except Exception:
+            return []
+
+    def rebuild(self):
+        """Recompile the automaton from the mappings and the cameras HA currently reports"""
+        keywords = {}
+        camera_names = dict(self.names)
+        for state in self._discovered_cameras():
+            entity_id = state['entity_id']
+            friendly = state.get('attributes', {}).get('friendly_name') or entity_id.split('.', 1)[1]
+            camera_names.setdefault(entity_id, friendly)
+            short = ' '.join(w for w in words(friendly) if w not in NAME_NOISE)
+            if short:
+                keywords.setdefault(' '.join(words(friendly)), entity_id)
+                keywords.setdefault(short, entity_id)
+        # Hand-maintained keywords override anything derived from HA names
+        for keyword, entity_id in self.mappings.items():
+            keywords[' '.join(words(keyword))] = entity_id
+
+        matcher = PhraseMatcher(keywords)
+        with self._lock:
+            self._matcher, self._keywords, self._camera_names = matcher, keywords, camera_names
+            self._dirty = False
+            self.rebuilds += 1
+
+    def _current(self):
+        if self._dirty or self._matcher is None:
+            self.rebuild()
+        with self._lock:
+            return self._matcher, self._camera_names
+
+    def keywords(self):
+        self._current()
+        with self._lock:
+            return dict(self._keywords)
+
+    def camera_names(self):
+        return dict(self._current()[1])
+
+    def resolve(self, command):
+        """Return the best camera match for a command, or None.
+
+        The result carries the matched keyword, a confidence score in (0, 1]
+        and the other cameras that also matched, when the command is ambiguous.
+        """
+        matcher, camera_names = self._current()
+        matches = matcher.find_all(command)
+        if not matches:
+            return None
+
+        # Longest phrase first; leftmost on ties
+        matches.sort(key=lambda m: (-(m[1] - m[0]), m[0]))
+        start, end, keyword, entity_id = matches[0]
+
+        # Matches nested inside the winner ("road" within "back road") are not competition
+        rivals = {}
+        for other_start, other_end, other_keyword, other_entity in matches[1:]:
+            if other_entity == entity_id or (other_start >= start and other_end <= end):
+                continue
+            rivals[other_entity] = max(rivals.get(other_entity, 0), other_end - other_start)
+
+        best_length = end - start
+        confidence = best_length / (best_length + sum(rivals.values()))
+        return {
+            "entity_id": entity_id,
+            "name": camera_names.get(entity_id, keyword.title()),
+            "keyword": keyword,
+            "confidence": round(confidence, 3),
+            "ambiguous": bool(rivals),
+            "alternatives": [{"entity_id": rival, "name": camera_names.get(rival, rival)} for rival in rivals]
+        }
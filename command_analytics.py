@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Command Analytics
+Streaming aggregates over the command history for /api/analytics. Each
+recorded command is folded into per-minute and per-hour buckets holding
+outcome counts, a latency sketch and per-intent / per-entity / per-source
+counters. Buckets older than the longest window are dropped, so memory and
+the cost of a query depend on the window length, never on how much history
+exists. On startup the retained window is replayed from the history store.
+"""
+
+import math
+import os
+import threading
+import time
+
+# Configuration
+SERIES_HOURS = int(os.getenv('ANALYTICS_SERIES_HOURS', '168'))  # hourly buckets kept (7 days)
+TOP_KEYS = int(os.getenv('ANALYTICS_TOP_KEYS', '10'))  # intents/entities listed per breakdown
+
+MINUTE_BUCKETS = 60
+WINDOWS = {'5m': (300, 60), '1h': (3600, 60), '24h': (86400, 3600), '7d': (7 * 86400, 3600)}
+BREAKDOWN_WINDOWS = ('24h', '7d')  # breakdowns are kept in hourly buckets only
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+SKETCH_ACCURACY = 0.01  # relative error of reported quantiles
+SKETCH_MIN_MS = 0.1     # latencies below this share one bucket
+MAX_BREAKDOWN_KEYS = 1000  # per bucket; further distinct keys are folded into "other"
+BACKFILL_PAGE = 1000
+
+
+class LatencySketch:
+    """Mergeable log-bucketed histogram (HDR / DDSketch style) with bounded relative error"""
+
+    _gamma = (1 + SKETCH_ACCURACY) / (1 - SKETCH_ACCURACY)
+    _log_gamma = math.log(_gamma)
+
+    def __init__(self):
+        self.bins = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        index = math.ceil(math.log(value) / self._log_gamma) if value > SKETCH_MIN_MS else 0
+        self.bins[index] = self.bins.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                if index == 0:
+                    return SKETCH_MIN_MS
+                return min(2 * self._gamma ** index / (self._gamma + 1), self.max)
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return None
+        result = {f"p{round(q * 100)}": round(self.quantile(q), 1) for q in QUANTILES}
+        result.update(mean=round(self.total / self.count, 1), max=round(self.max, 1), samples=self.count)
+        return result
+
+
+class Bucket:
+    """Aggregates for one minute or one hour"""
+
+    def __init__(self, start, breakdowns):
+        self.start = start
+        self.count = 0
+        self.outcomes = {}
+        self.latency = LatencySketch()
+        self.breakdowns = {name: {} for name in breakdowns}  # name -> key -> [count, failures]
+
+    def add(self, outcome, response_ms, keys):
+        self.count += 1
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        if response_ms is not None:
+            self.latency.add(response_ms)
+        failed = outcome != 'success'
+        for name, key in keys.items():
+            counts = self.breakdowns[name]
+            if key not in counts and len(counts) >= MAX_BREAKDOWN_KEYS:
+                key = 'other'
+            entry = counts.setdefault(key, [0, 0])
+            entry[0] += 1
+            entry[1] += failed
+
+
+class CommandAnalytics:
+    """Rolling windows, quantiles, breakdowns and downsampled series over recorded commands"""
+
+    BREAKDOWNS = ('intents', 'entities', 'sources')
+
+    def __init__(self, series_hours=SERIES_HOURS, top_keys=TOP_KEYS):
+        self.series_hours = series_hours
+        self.top_keys = top_keys
+        self._lock = threading.Lock()
+        self._minutes = {}  # start -> Bucket, last MINUTE_BUCKETS minutes
+        self._hours = {}    # start -> Bucket, last series_hours hours
+        self.total = 0      # commands ever recorded (the history's highest row id)
+        self.loaded = False
+
+    # ------------------------------------------------------------------
+    # Ingest
+    # ------------------------------------------------------------------
+
+    def observe(self, row):
+        """Fold one history row (dict with ts, outcome, response_ms, action, entity_id, source) in"""
+        ts = row['ts']
+        keys = {'intents': row.get('action') or 'unparsed',
+                'entities': row.get('entity_id') or 'none',
+                'sources': row.get('source') or row.get('bridge') or 'unknown'}
+        now = time.time()
+        with self._lock:
+            self.total = max(self.total, row.get('id') or self.total + 1)
+            for buckets, width, keep, breakdowns in ((self._minutes, 60, MINUTE_BUCKETS, ()),
+                                                     (self._hours, 3600, self.series_hours, self.BREAKDOWNS)):
+                if ts < now - keep * width:
+                    continue
+                start = int(ts // width * width)
+                bucket = buckets.get(start)
+                if bucket is None:
+                    bucket = buckets[start] = Bucket(start, breakdowns)
+                    self._prune(buckets, now - keep * width)
+                bucket.add(row['outcome'], row.get('response_ms'), {name: keys[name] for name in breakdowns})
+
+    @staticmethod
+    def _prune(buckets, cutoff):
+        for start in [start for start in buckets if start < cutoff]:
+            del buckets[start]
+
+    def attach(self, history):
+        """Follow new commands in history and replay the retained window in the background"""
+        upto = history.last_id()
+        with self._lock:
+            self.total = max(self.total, upto)
+        history.add_listener(self.observe)
+        threading.Thread(target=self._backfill, args=(history, upto), name='analytics-backfill',
+                         daemon=True).start()
+
+    def _backfill(self, history, upto):
+        since = time.time() - self.series_hours * 3600
+        for row in history.scan(since=since, upto=upto, page=BACKFILL_PAGE):
+            self.observe(row)
+        self.loaded = True
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _window(self, seconds, width, now):
+        buckets = self._minutes if width == 60 else self._hours
+        cutoff = now - seconds
+        return [bucket for start, bucket in buckets.items() if start + width > cutoff]
+
+    def _summarize(self, buckets, seconds):
+        count = sum(bucket.count for bucket in buckets)
+        outcomes, latency = {}, LatencySketch()
+        for bucket in buckets:
+            latency.merge(bucket.latency)
+            for outcome, n in bucket.outcomes.items():
+                outcomes[outcome] = outcomes.get(outcome, 0) + n
+        return {
+            "commands": count,
+            "per_minute": round(count / (seconds / 60), 3),
+            "success_rate": round(outcomes.get('success', 0) / count, 4) if count else None,
+            "outcomes": outcomes,
+            "latency_ms": latency.summary()
+        }
+
+    def _breakdown(self, buckets, name):
+        totals = {}
+        for bucket in buckets:
+            for key, (count, failures) in bucket.breakdowns[name].items():
+                entry = totals.setdefault(key, [0, 0])
+                entry[0] += count
+                entry[1] += failures
+        top = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)[:self.top_keys]
+        return [{"key": key, "commands": count, "failures": failures} for key, (count, failures) in top]
+
+    def window(self, name):
+        """Counts, outcomes and latency quantiles for one rolling window"""
+        seconds, width = WINDOWS[name]
+        with self._lock:
+            return self._summarize(self._window(seconds, width, time.time()), seconds)
+
+    def summary(self, breakdown_window='24h'):
+        """Every rolling window, plus per-intent/entity/source breakdowns over breakdown_window"""
+        seconds, _ = WINDOWS[breakdown_window]
+        now = time.time()
+        with self._lock:
+            windows = {name: self._summarize(self._window(seconds_, width, now), seconds_)
+                       for name, (seconds_, width) in WINDOWS.items()}
+            hours = self._window(seconds, 3600, now)
+            breakdowns = {name: self._breakdown(hours, name) for name in self.BREAKDOWNS}
+            total = self.total
+        return {"total_commands": total, "loaded": self.loaded, "windows": windows,
+                "breakdown_window": breakdown_window, **breakdowns}
+
+    def series(self, resolution='minute', hours=24):
+        """Downsampled time series: one point per minute (last hour) or per hour (up to series_hours)"""
+        width, buckets = (60, self._minutes) if resolution == 'minute' else (3600, self._hours)
+        cutoff = time.time() - (MINUTE_BUCKETS * 60 if width == 60 else min(hours, self.series_hours) * 3600)
+        points = []
+        with self._lock:
+            for start, bucket in sorted(buckets.items()):
+                if start + width <= cutoff:
+                    continue
+                latency = bucket.latency.summary() or {}
+                points.append({
+                    "start": start,
+                    "commands": bucket.count,
+                    "failures": bucket.count - bucket.outcomes.get('success', 0),
+                    "p50_ms": latency.get('p50'),
+                    "p95_ms": latency.get('p95')
+                })
+        return {"resolution": resolution, "points": points}
@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Command History Store
+Append-only SQLite log of every command the web UI sends, in WAL mode so
+readers never block the writer. Rows are indexed by time and outcome, and every
+entity a command touched is indexed in its own table;
+pages are read with a cursor (the last row id seen), so a query costs the
+same on day one and after months of commands. Rows older than
+HISTORY_RETENTION_DAYS, or beyond HISTORY_MAX_ROWS, are compacted away in the
+background and their pages returned to the file.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+# Configuration
+HISTORY_DB = os.getenv('COMMAND_HISTORY_DB', 'command_history.db')
+RETENTION_DAYS = float(os.getenv('HISTORY_RETENTION_DAYS', '90'))
+MAX_ROWS = int(os.getenv('HISTORY_MAX_ROWS', '500000'))
+COMPACT_INTERVAL = float(os.getenv('HISTORY_COMPACT_INTERVAL', '3600'))  # seconds between compactions
+
+PAGE_LIMIT = 500  # most rows one page may ask for
+MAX_COMMAND_LENGTH = 1000
+MAX_FIELD_LENGTH = 255  # entity_id, action, source, bridge, request_id
+MAX_ENTITIES = 100  # entities indexed per command
+OUTCOMES = ('success', 'failed', 'rejected', 'error')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS commands (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    command TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    entity_id TEXT,
+    action TEXT,
+    source TEXT,
+    bridge TEXT,
+    response_ms REAL,
+    request_id TEXT,
+    response TEXT
+);
+CREATE INDEX IF NOT EXISTS commands_ts ON commands (ts);
+CREATE INDEX IF NOT EXISTS commands_outcome ON commands (outcome, id);
+DROP INDEX IF EXISTS commands_entity;
+CREATE TABLE IF NOT EXISTS command_entities (
+    entity_id TEXT NOT NULL,
+    command_id INTEGER NOT NULL REFERENCES commands (id) ON DELETE CASCADE,
+    PRIMARY KEY (entity_id, command_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS command_entities_command ON command_entities (command_id);
+"""
+
+# Stores created before command_entities existed indexed one entity per row
+BACKFILL_ENTITIES = """
+INSERT OR IGNORE INTO command_entities (entity_id, command_id)
+SELECT entity_id, id FROM commands WHERE entity_id IS NOT NULL
+"""
+
+COLUMNS = ('id', 'ts', 'command', 'outcome', 'entity_id', 'action', 'source', 'bridge',
+           'response_ms', 'request_id', 'response')
+
+
+class HistoryError(ValueError):
+    """Raised for a malformed record or query"""
+
+
+def summarize(result):
+    """(outcome, entity_id, action, source, response text) from a bridge's /voice_command reply"""
+    result = result if isinstance(result, dict) else {}
+    interpretation = result.get('ai_interpretation') or {}
+    if not isinstance(interpretation, dict):
+        interpretation = {}
+    # Main bridge: execution_results list plus ai_interpretation.actions;
+    # camera bridge: one execution_result with the action fields on ai_interpretation
+    executions = result.get('execution_results')
+    if executions is None:
+        executions = [result['execution_result']] if result.get('execution_result') else []
+    executions = [execution for execution in executions if isinstance(execution, dict)]
+    actions = interpretation.get('actions')
+    if actions is None:
+        actions = [interpretation] if interpretation.get('domain') or interpretation.get('entity_id') else []
+    actions = [action for action in actions if isinstance(action, dict)]
+
+    if any(execution.get('rejected') for execution in executions):
+        outcome = 'rejected'
+    elif not result.get('success') or any(not execution.get('success', True) for execution in executions):
+        outcome = 'failed'
+    else:
+        outcome = 'success'
+
+    # The row names the first action that went wrong, or the first action when all succeeded
+    index = next((i for i, execution in enumerate(executions)
+                  if execution.get('rejected') or not execution.get('success', True)), 0)
+    execution = executions[index] if index < len(executions) else {}
+    planned = actions[index] if index < len(actions) else {}
+    entity_id = (execution.get('entity') or planned.get('entity_id') or interpretation.get('entity_id')
+                 or result.get('camera_entity'))
+    if isinstance(entity_id, list):
+        entity_id = entity_id[0] if entity_id else None
+    action = execution.get('action')
+    if not action and planned.get('domain'):
+        action = f"{planned.get('domain')}.{planned.get('service')}"
+    if not action and result.get('camera_entity'):
+        action = 'camera.view'
+    response = result.get('response') or result.get('error')
+    return outcome, entity_id, action, result.get('source'), response
+
+
+def touched_entities(result):
+    """Every entity_id a bridge reply's actions and executions name, in order, without duplicates"""
+    result = result if isinstance(result, dict) else {}
+    interpretation = result.get('ai_interpretation')
+    interpretation = interpretation if isinstance(interpretation, dict) else {}
+    actions = interpretation.get('actions')
+    sources = [interpretation] + (actions if isinstance(actions, list) else [])
+    executions = result.get('execution_results')
+    sources += executions if isinstance(executions, list) else [result.get('execution_result')]
+    found = []
+    for source in sources:
+        if not isinstance(source, dict):
+            continue
+        for value in (source.get('entity_id'), source.get('entity')):
+            for entity_id in value if isinstance(value, list) else [value]:
+                if isinstance(entity_id, str) and entity_id and entity_id != 'all' and entity_id not in found:
+                    found.append(entity_id)
+    camera = result.get('camera_entity')
+    if isinstance(camera, str) and camera and camera not in found:
+        found.append(camera)
+    return found
+
+
+class CommandHistory:
+    """SQLite WAL store with indexed, cursor-paginated queries and bounded retention"""
+
+    def __init__(self, path=HISTORY_DB, retention_days=RETENTION_DAYS, max_rows=MAX_ROWS,
+                 compact_interval=COMPACT_INTERVAL):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_rows = max_rows
+        self.compact_interval = compact_interval
+        self._local = threading.local()  # one connection per thread; WAL lets them read concurrently
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._listeners = []
+        self.last_error = None
+        self.counters = {"appended": 0, "compactions": 0, "compacted_rows": 0, "queries": 0}
+        self.last_compaction = None
+        with self._write_lock:
+            conn = self._connection()
+            upgrading = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'commands'").fetchone() and \
+                not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'command_entities'").fetchone()
+            conn.executescript(SCHEMA)
+            if upgrading:
+                conn.execute(BACKFILL_ENTITIES)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            # auto_vacuum only takes effect on a new file; set before the first table exists
+            conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')  # durable at checkpoints; a crash loses at most the last commits
+            conn.execute('PRAGMA foreign_keys=ON')  # compaction removes a command's entity rows with it
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def append(self, command, outcome, entity_id=None, action=None, source=None, bridge=None,
+               response_ms=None, request_id=None, response=None, ts=None, entity_ids=()):
+        """Record one command; returns its row id. entity_ids lists every other entity it touched"""
+        if not command or not isinstance(command, str):
+            raise HistoryError("command is required")
+        if len(command) > MAX_COMMAND_LENGTH:
+            raise HistoryError(f"command longer than {MAX_COMMAND_LENGTH} characters")
+        if outcome not in OUTCOMES:
+            raise HistoryError(f"outcome must be one of {', '.join(OUTCOMES)}")
+        for name, value in (('entity_id', entity_id), ('action', action), ('source', source),
+                            ('bridge', bridge), ('request_id', request_id)):
+            if value is not None and (not isinstance(value, str) or len(value) > MAX_FIELD_LENGTH):
+                raise HistoryError(f"{name} must be a string of at most {MAX_FIELD_LENGTH} characters")
+        if response_ms is not None:
+            try:
+                response_ms = float(response_ms)
+            except (TypeError, ValueError):
+                raise HistoryError("response_ms must be a number")
+            if not 0 <= response_ms < 86400000:
+                raise HistoryError("response_ms must be between 0 and 86400000")
+        entities = [entity_id] if entity_id is not None else []
+        for value in entity_ids or ():
+            if not isinstance(value, str) or len(value) > MAX_FIELD_LENGTH:
+                raise HistoryError(f"entity_ids must be strings of at most {MAX_FIELD_LENGTH} characters")
+            if value not in entities:
+                entities.append(value)
+        if len(entities) > MAX_ENTITIES:
+            raise HistoryError(f"a command may touch at most {MAX_ENTITIES} entities")
+        row = (time.time() if ts is None else float(ts), command, outcome, entity_id, action, source, bridge,
+               response_ms, request_id, str(response)[:2000] if response is not None else None)
+        with self._write_lock:
+            conn = self._connection()
+            with conn:  # the command and its entity rows commit together
+                conn.execute('BEGIN')
+                cursor = conn.execute(
+                    'INSERT INTO commands (ts, command, outcome, entity_id, action, source, bridge, '
+                    'response_ms, request_id, response) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', row)
+                conn.executemany('INSERT INTO command_entities (entity_id, command_id) VALUES (?, ?)',
+                                 [(entity, cursor.lastrowid) for entity in entities])
+        with self._lock:
+            self.counters["appended"] += 1
+        entry = dict(zip(COLUMNS, (cursor.lastrowid,) + row))
+        for listener in list(self._listeners):
+            try:
+                listener(entry)
+            except Exception as e:
+                self.last_error = f"listener: {e}"
+        return cursor.lastrowid
+
+    def record(self, command, result, **fields):
+        """Append a command together with the bridge reply it got"""
+        outcome, entity_id, action, source, response = summarize(result)
+        return self.append(command, fields.pop('outcome', None) or outcome, entity_id=entity_id, action=action,
+                           source=source, response=response, entity_ids=touched_entities(result), **fields)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def page(self, limit=50, cursor=None, outcome=None, entity_id=None, since=None, until=None):
+        """Newest-first page of commands; pass the returned next_cursor to read on.
+
+        entity_id matches every command that touched the entity, not only the one its row names.
+        """
+        limit = max(1, min(int(limit), PAGE_LIMIT))
+        tables, order, clauses, params = 'commands', 'commands.id', [], []
+        if entity_id is not None:
+            # Walk the (entity_id, command_id) key newest first and join each hit to its command
+            tables = 'command_entities JOIN commands ON commands.id = command_entities.command_id'
+            order = 'command_entities.command_id'
+            clauses.append('command_entities.entity_id = ?')
+            params.append(entity_id)
+        if cursor is not None:
+            clauses.append(f'{order} < ?')
+            params.append(int(cursor))
+        if outcome is not None:
+            if outcome not in OUTCOMES:
+                raise HistoryError(f"outcome must be one of {', '.join(OUTCOMES)}")
+            clauses.append('commands.outcome = ?')
+            params.append(outcome)
+        if since is not None:
+            clauses.append('commands.ts >= ?')
+            params.append(float(since))
+        if until is not None:
+            clauses.append('commands.ts < ?')
+            params.append(float(until))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connection().execute(
+            f"SELECT {', '.join('commands.' + column for column in COLUMNS)} FROM {tables} {where} "
+            f"ORDER BY {order} DESC LIMIT ?", params + [limit + 1]).fetchall()
+        with self._lock:
+            self.counters["queries"] += 1
+        commands = [dict(row) for row in rows[:limit]]
+        return {
+            "commands": commands,
+            "next_cursor": str(commands[-1]['id']) if len(rows) > limit else None
+        }
+
+    def scan(self, since=None, upto=None, page=1000):
+        """Yield rows oldest first, from the first at or after since up to row id upto, a page at a time"""
+        conn = self._connection()
+        if since is None:
+            after = 0
+        else:
+            first = conn.execute('SELECT MIN(id) FROM commands WHERE ts >= ?', (float(since),)).fetchone()[0]
+            if first is None:
+                return
+            after = first - 1
+        upto = self.last_id() if upto is None else upto
+        while after < upto:
+            rows = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM commands WHERE id > ? AND id <= ? "
+                                "ORDER BY id LIMIT ?", (after, upto, page)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            after = rows[-1]['id']
+
+    def last_id(self):
+        """Highest row id ever assigned, i.e. commands recorded since the store was created"""
+        row = self._connection().execute("SELECT seq FROM sqlite_sequence WHERE name = 'commands'").fetchone()
+        return row[0] if row else 0
+
+    def add_listener(self, callback):
+        """Register callback(row), called after every append with the stored row as a dict"""
+        self._listeners.append(callback)
+
+    def count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM commands').fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Retention
+    # ------------------------------------------------------------------
+
+    def compact(self, now=None):
+        """Drop rows past retention or beyond max_rows, then hand freed pages back to the filesystem"""
+        now = time.time() if now is None else now
+        with self._write_lock:
+            conn = self._connection()
+            removed = 0
+            if self.retention_days:
+                removed += conn.execute('DELETE FROM commands WHERE ts < ?',
+                                        (now - self.retention_days * 86400,)).rowcount
+            if self.max_rows:
+                newest = conn.execute('SELECT MAX(id) FROM commands').fetchone()[0]
+                if newest is not None:
+                    removed += conn.execute('DELETE FROM commands WHERE id <= ?',
+                                            (newest - self.max_rows,)).rowcount
+            if removed:
+                # execute() steps a pragma once, which frees a single page; executescript runs it to the end
+                conn.executescript('PRAGMA incremental_vacuum;')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        with self._lock:
+            self.counters["compactions"] += 1
+            self.counters["compacted_rows"] += removed
+            self.last_compaction = now
+        return removed
+
+    def start(self):
+        """Compact now, then every compact_interval seconds in the background (idempotent)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='history-compaction', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.compact()
+            except sqlite3.Error as e:
+                self.last_error = f"compaction: {e}"
+            time.sleep(self.compact_interval)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        conn = self._connection()
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        pages = conn.execute('PRAGMA page_count').fetchone()[0]
+        with self._lock:
+            return dict(self.counters, path=self.path, rows=self.count(), db_bytes=page_size * pages,
+                        retention_days=self.retention_days, max_rows=self.max_rows,
+                        last_compaction=self.last_compaction, last_error=self.last_error)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Dashboard Event Hub
+Fans server-computed events out to every connected Server-Sent Events client.
+Each event is formatted once and the same bytes are queued for all subscribers.
+"""
+
+import os
+import queue
+import threading
+import time
+
+from sse import format_event
+
+# Configuration
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv('EVENT_QUEUE_SIZE', '256'))
+HEARTBEAT_SECONDS = float(os.getenv('EVENT_HEARTBEAT', '15'))
+
+
+class EventHub:
+    """Publish/subscribe fan-out with bounded per-client queues"""
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE, heartbeat=HEARTBEAT_SECONDS):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._latest = {}  # event name -> last formatted message, replayed to new clients
+        self.counters = {"published": 0, "delivered": 0, "dropped": 0, "connections": 0}
+
+    def publish(self, event, data, retain=False):
+        """Send one event to every subscriber; retained events are replayed on connect"""
+        message = format_event(event, data)
+        with self._lock:
+            if retain:
+                self._latest[event] = message
+            subscribers = list(self._subscribers)
+            self.counters["published"] += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+                delivered = True
+            except queue.Full:
+                delivered = False
+            with self._lock:
+                self.counters["delivered" if delivered else "dropped"] += 1
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stream(self):
+        """Generator for one SSE client: retained state first, then live events"""
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            self.counters["connections"] += 1
+            retained = list(self._latest.values())
+        try:
+            for message in retained:
+                yield message
+            while True:
+                try:
+                    yield subscriber.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    # Comment line keeps proxies and the browser from timing out the stream
+                    yield f": heartbeat {int(time.time())}\n\n"
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, subscribers=len(self._subscribers), retained=sorted(self._latest))
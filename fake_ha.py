@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Local Home Assistant Stand-in
+Serves the REST and WebSocket endpoints the bridges use, plus camera_proxy
+JPEG snapshots and camera_proxy_stream MJPEG streams, so the state mirror,
+bridges and web UIs can be exercised without a real HA instance. REST and
+snapshot latency and the stream frame rate are configurable.
+"""
+
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WS_MAGIC = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+REGISTRY_COMMANDS = ('config/area_registry/list', 'config/device_registry/list', 'config/entity_registry/list',
+                     'get_services')
+
+# Services the fake offers for every domain that has at least one entity
+DEFAULT_SERVICES = {
+    'light': ('turn_on', 'turn_off', 'toggle'),
+    'switch': ('turn_on', 'turn_off', 'toggle'),
+    'fan': ('turn_on', 'turn_off', 'toggle', 'set_percentage'),
+    'climate': ('turn_on', 'turn_off', 'set_temperature', 'set_hvac_mode'),
+    'media_player': ('turn_on', 'turn_off', 'toggle', 'media_play', 'media_pause', 'volume_set'),
+    'cover': ('open_cover', 'close_cover', 'stop_cover', 'set_cover_position'),
+    'lock': ('lock', 'unlock'),
+    'camera': ('snapshot', 'turn_on', 'turn_off'),
+    'scene': ('turn_on',),
+    'script': ('turn_on', 'turn_off', 'toggle'),
+    'automation': ('turn_on', 'turn_off', 'toggle', 'trigger'),
+}
+
+# 16x16 grey baseline JPEG; each served frame gets a comment segment so its bytes (and ETag) change
+SNAPSHOT_JPEG = base64.b64decode(
+    '/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABALDA4MChAODQ4SERATGCgaGBYWGDEjJR0oOjM9PDkzODdASFxOQERXRTc4UG1RV19iZ2hnPk1x'
+    'eXBkeFxlZ2P/2wBDARESEhgVGC8aGi9jQjhCY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2P/wAAR'
+    'CAAQABADASIAAhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEG'
+    'E1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWG'
+    'h4iJipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEB'
+    'AQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREAAgECBAQDBAcFBAQAAQJ3AAECAxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYk'
+    'NOEl8RcYGRomJygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0'
+    'tba3uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwCpRRRWxif/2Q==')
+JPEG_SEGMENT_MAX = 65533  # payload bytes one JPEG marker segment can carry
+
+
+class BurstTolerantHTTPServer(ThreadingHTTPServer):
+    """Threading server with a listen backlog deep enough for load tests"""
+    request_queue_size = 1024
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def make_state(entity_id, state, attributes=None):
+    """Build a state object shaped like HA's /api/states entries"""
+    now = _now_iso()
+    return {
+        "entity_id": entity_id,
+        "state": state,
+        "attributes": attributes or {},
+        "last_changed": now,
+        "last_updated": now
+    }
+
+
+class WebSocketConnection:
+    """Minimal RFC 6455 server-side connection (text frames only)"""
+
+    def __init__(self, rfile, wfile):
+        self.rfile = rfile
+        self.wfile = wfile
+        self.send_lock = threading.Lock()
+        self.closed = False
+
+    def send(self, payload):
+        data = payload.encode('utf-8')
+        header = bytearray([0x81])
+        if len(data) < 126:
+            header.append(len(data))
+        elif len(data) < 65536:
+            header.append(126)
+            header += struct.pack('!H', len(data))
+        else:
+            header.append(127)
+            header += struct.pack('!Q', len(data))
+        with self.send_lock:
+            self.wfile.write(bytes(header) + data)
+            self.wfile.flush()
+
+    def send_json(self, message):
+        self.send(json.dumps(message))
+
+    def recv(self):
+        """Return the next text message, or None once the client has closed"""
+        while True:
+            head = self.rfile.read(2)
+            if len(head) < 2:
+                return None
+            opcode = head[0] & 0x0F
+            masked = head[1] & 0x80
+            length = head[1] & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', self.rfile.read(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', self.rfile.read(8))[0]
+            mask = self.rfile.read(4) if masked else b''
+            data = bytearray(self.rfile.read(length))
+            if masked:
+                for i in range(len(data)):
+                    data[i] ^= mask[i % 4]
+
+            if opcode == 0x8:
+                return None
+            if opcode == 0x9:
+                with self.send_lock:
+                    self.wfile.write(bytes([0x8A, len(data)]) + bytes(data))
+                    self.wfile.flush()
+                continue
+            if opcode in (0x1, 0x0):
+                return data.decode('utf-8')
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            with self.send_lock:
+                self.wfile.write(b'\x88\x00')
+                self.wfile.flush()
+        except Exception:
+            pass
+
+
+class FakeHomeAssistant:
+    """In-process fake HA: REST states/services plus the WebSocket event API"""
+
+    def __init__(self, host='127.0.0.1', port=0, token='test-token', latency=0.0, camera_delay=0.0,
+                 frame_bytes=0, stream_fps=10.0):
+        self.token = token
+        self.latency = latency            # seconds added to every REST response
+        self.camera_delay = camera_delay  # extra seconds to produce a camera_proxy snapshot
+        self.frame_bytes = frame_bytes    # pad snapshots to about this size, like a real camera frame
+        self.stream_fps = stream_fps      # frames per second on camera_proxy_stream
+        self.frames = {}  # camera entity_id -> snapshots served
+        self.streams_opened = {}  # camera entity_id -> camera_proxy_stream connections accepted
+        self.open_streams = {}    # camera entity_id -> camera_proxy_stream connections still open
+        self.states = {}
+        self.areas = {}  # entity_id -> area name
+        self.service_calls = []
+        self.services = None  # {domain: [services]}; None derives them from DEFAULT_SERVICES
+        self.lock = threading.Lock()
+        self.subscriptions = []  # (connection, subscription id)
+        self.connections = []
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                fake._handle_get(self)
+
+            def do_POST(self):
+                fake._handle_post(self)
+
+        self.server = BurstTolerantHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.drop_connections()
+        self.server.shutdown()
+        self.server.server_close()
+
+    # ------------------------------------------------------------------
+    # Test controls
+    # ------------------------------------------------------------------
+
+    def set_state(self, entity_id, state, attributes=None):
+        """Create or update an entity and push a state_changed event"""
+        new_state = make_state(entity_id, state, attributes)
+        with self.lock:
+            old_state = self.states.get(entity_id)
+            if old_state and old_state['state'] == state:
+                new_state['last_changed'] = old_state['last_changed']
+            self.states[entity_id] = new_state
+        self._broadcast_state_changed(entity_id, old_state, new_state)
+        return new_state
+
+    def set_area(self, entity_id, area_name):
+        """Assign an entity to an area in the fake registries"""
+        with self.lock:
+            self.areas[entity_id] = area_name
+
+    def remove_state(self, entity_id):
+        """Remove an entity and push a state_changed event with new_state=None"""
+        with self.lock:
+            old_state = self.states.pop(entity_id, None)
+        self._broadcast_state_changed(entity_id, old_state, None)
+
+    def drop_connections(self):
+        """Close every WebSocket connection, as HA does on restart"""
+        with self.lock:
+            connections = list(self.connections)
+            self.connections.clear()
+            self.subscriptions.clear()
+        for connection in connections:
+            connection.close()
+
+    def frame(self, entity_id):
+        """Next snapshot for a camera: the base JPEG with a per-frame comment and optional padding"""
+        with self.lock:
+            number = self.frames[entity_id] = self.frames.get(entity_id, 0) + 1
+        segments = [f"{entity_id} frame {number}".encode('utf-8')]
+        padding = max(0, self.frame_bytes - len(SNAPSHOT_JPEG))
+        while padding > 0:
+            size = min(padding, JPEG_SEGMENT_MAX)
+            segments.append(b'\0' * size)
+            padding -= size + 4
+        comments = b''.join(b'\xff\xfe' + struct.pack('>H', len(segment) + 2) + segment for segment in segments)
+        return SNAPSHOT_JPEG[:2] + comments + SNAPSHOT_JPEG[2:]
+
+    def _broadcast_state_changed(self, entity_id, old_state, new_state):
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for connection, subscription_id in subscriptions:
+            try:
+                connection.send_json({
+                    "id": subscription_id,
+                    "type": "event",
+                    "event": {
+                        "event_type": "state_changed",
+                        "data": {"entity_id": entity_id, "old_state": old_state, "new_state": new_state},
+                        "time_fired": _now_iso()
+                    }
+                })
+            except Exception:
+                pass
+
+    # ------------------------------------------------------------------
+    # HTTP handling
+    # ------------------------------------------------------------------
+
+    def _authorized(self, handler):
+        return handler.headers.get('Authorization') == f'Bearer {self.token}'
+
+    def _send_json(self, handler, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _send_jpeg(self, handler, body):
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'image/jpeg')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _send_mjpeg(self, handler, entity_id):
+        """multipart/x-mixed-replace stream, chunked like HA's, until the client goes away"""
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'multipart/x-mixed-replace;boundary=frameboundary')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+        with self.lock:
+            self.streams_opened[entity_id] = self.streams_opened.get(entity_id, 0) + 1
+            self.open_streams[entity_id] = self.open_streams.get(entity_id, 0) + 1
+        try:
+            while True:
+                jpeg = self.frame(entity_id)
+                part = (b'--frameboundary\r\nContent-Type: image/jpeg\r\n'
+                        b'Content-Length: ' + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+                handler.wfile.write(f"{len(part):X}\r\n".encode() + part + b"\r\n")
+                handler.wfile.flush()
+                time.sleep(1 / self.stream_fps)
+        except OSError:
+            handler.close_connection = True
+        finally:
+            with self.lock:
+                self.open_streams[entity_id] -= 1
+
+    def _handle_get(self, handler):
+        path = handler.path.split('?')[0]
+        if path == '/api/websocket' and handler.headers.get('Upgrade', '').lower() == 'websocket':
+            self._serve_websocket(handler)
+            return
+        if not self._authorized(handler):
+            self._send_json(handler, {"message": "Unauthorized"}, 401)
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        if path == '/api/':
+            self._send_json(handler, {"message": "API running."})
+        elif path == '/api/states':
+            with self.lock:
+                states = list(self.states.values())
+            self._send_json(handler, states)
+        elif path.startswith('/api/states/'):
+            with self.lock:
+                state = self.states.get(path[len('/api/states/'):])
+            if state is None:
+                self._send_json(handler, {"message": "Entity not found."}, 404)
+            else:
+                self._send_json(handler, state)
+        elif path.startswith('/api/camera_proxy_stream/'):
+            entity_id = path[len('/api/camera_proxy_stream/'):]
+            with self.lock:
+                known = entity_id.startswith('camera.') and entity_id in self.states
+            if not known:
+                self._send_json(handler, {"message": "Entity not found."}, 404)
+                return
+            self._send_mjpeg(handler, entity_id)
+        elif path.startswith('/api/camera_proxy/'):
+            entity_id = path[len('/api/camera_proxy/'):]
+            with self.lock:
+                known = entity_id.startswith('camera.') and entity_id in self.states
+            if not known:
+                self._send_json(handler, {"message": "Entity not found."}, 404)
+                return
+            if self.camera_delay:
+                time.sleep(self.camera_delay)
+            self._send_jpeg(handler, self.frame(entity_id))
+        else:
+            self._send_json(handler, {"message": "Not found"}, 404)
+
+    def _handle_post(self, handler):
+        length = int(handler.headers.get('Content-Length', 0) or 0)
+        body = handler.rfile.read(length) if length else b''
+        if not self._authorized(handler):
+            self._send_json(handler, {"message": "Unauthorized"}, 401)
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        path = handler.path.split('?')[0]
+        if path.startswith('/api/services/'):
+            domain, _, service = path[len('/api/services/'):].partition('/')
+            service_data = json.loads(body or b'{}')
+            with self.lock:
+                self.service_calls.append({"domain": domain, "service": service,
+                                           "service_data": service_data, "time": time.time()})
+            self._send_json(handler, [])
+        else:
+            self._send_json(handler, {"message": "Not found"}, 404)
+
+    def _services(self):
+        with self.lock:
+            if self.services is not None:
+                services = self.services
+            else:
+                domains = {entity_id.split('.', 1)[0] for entity_id in self.states}
+                services = {domain: DEFAULT_SERVICES.get(domain, ('turn_on', 'turn_off')) for domain in domains}
+                services['homeassistant'] = ('turn_on', 'turn_off', 'toggle')
+        return {domain: {name: {"fields": {}} for name in names} for domain, names in services.items()}
+
+    def _registry(self, command):
+        with self.lock:
+            areas = dict(self.areas)
+            entity_ids = list(self.states)
+        if command == 'config/area_registry/list':
+            return [{"area_id": name.lower().replace(' ', '_'), "name": name} for name in sorted(set(areas.values()))]
+        if command == 'config/device_registry/list':
+            return []
+        if command == 'get_services':
+            return self._services()
+        return [{"entity_id": entity_id, "device_id": None,
+                 "area_id": areas[entity_id].lower().replace(' ', '_') if entity_id in areas else None}
+                for entity_id in entity_ids]
+
+    def _serve_websocket(self, handler):
+        key = handler.headers.get('Sec-WebSocket-Key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WS_MAGIC).encode()).digest()).decode()
+        handler.send_response(101, 'Switching Protocols')
+        handler.send_header('Upgrade', 'websocket')
+        handler.send_header('Connection', 'Upgrade')
+        handler.send_header('Sec-WebSocket-Accept', accept)
+        handler.end_headers()
+        handler.wfile.flush()
+        handler.close_connection = True
+
+        connection = WebSocketConnection(handler.rfile, handler.wfile)
+        with self.lock:
+            self.connections.append(connection)
+
+        try:
+            connection.send_json({"type": "auth_required", "ha_version": "fake"})
+            message = json.loads(connection.recv() or '{}')
+            if message.get('access_token') != self.token:
+                connection.send_json({"type": "auth_invalid", "message": "Invalid access token"})
+                return
+            connection.send_json({"type": "auth_ok", "ha_version": "fake"})
+
+            while not connection.closed:
+                raw = connection.recv()
+                if raw is None:
+                    break
+                message = json.loads(raw)
+                if message.get('type') == 'subscribe_events':
+                    with self.lock:
+                        self.subscriptions.append((connection, message['id']))
+                    connection.send_json({"id": message['id'], "type": "result", "success": True, "result": None})
+                elif message.get('type') in REGISTRY_COMMANDS:
+                    connection.send_json({"id": message['id'], "type": "result", "success": True,
+                                          "result": self._registry(message['type'])})
+                elif message.get('type') == 'ping':
+                    connection.send_json({"id": message['id'], "type": "pong"})
+                else:
+                    connection.send_json({"id": message.get('id'), "type": "result", "success": False,
+                                          "error": {"code": "unknown_command", "message": "Unknown command."}})
+        except Exception:
+            pass
+        finally:
+            with self.lock:
+                self.subscriptions = [s for s in self.subscriptions if s[0] is not connection]
+                if connection in self.connections:
+                    self.connections.remove(connection)
+            connection.close()
+
+
+if __name__ == '__main__':
+    fake = FakeHomeAssistant(port=8123).start()
+    fake.set_state('light.kitchen', 'off', {'friendly_name': 'Kitchen Lights'})
+    fake.set_state('sensor.living_room_temperature', '21.5',
+                   {'friendly_name': 'Living Room Temperature', 'unit_of_measurement': '°C'})
+    print(f"🧪 Fake Home Assistant on {fake.url} (token: {fake.token})")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Local MQTT Broker Stand-in
+Just enough MQTT 3.1.1 to stand in for Mosquitto in tests: CONNECT,
+SUBSCRIBE with + and # wildcards, QoS 0/1 PUBLISH, retained messages and
+keep-alive pings. Messages are delivered at QoS 0. frigate_event() publishes
+a message shaped like Frigate's frigate/events payload.
+"""
+
+import json
+import socket
+import socketserver
+import struct
+import threading
+import time
+import uuid
+
+CONNECT, CONNACK, PUBLISH, PUBACK, SUBSCRIBE, SUBACK = 1, 2, 3, 4, 8, 9
+UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 10, 11, 12, 13, 14
+
+
+def topic_matches(topic_filter, topic):
+    filter_parts, topic_parts = topic_filter.split('/'), topic.split('/')
+    for index, part in enumerate(filter_parts):
+        if part == '#':
+            return True
+        if index >= len(topic_parts) or (part != '+' and part != topic_parts[index]):
+            return False
+    return len(filter_parts) == len(topic_parts)
+
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(encoded)
+
+
+def packet(packet_type, body, flags=0):
+    return bytes([packet_type << 4 | flags]) + encode_length(len(body)) + body
+
+
+def encode_string(text):
+    data = text.encode('utf-8')
+    return struct.pack('!H', len(data)) + data
+
+
+class Session:
+    """One connected client"""
+
+    def __init__(self, connection, wfile):
+        self.connection = connection
+        self.wfile = wfile
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+
+    def send(self, data):
+        with self.lock:
+            self.wfile.write(data)
+            self.wfile.flush()
+
+
+class FakeMQTTBroker:
+    """In-process fake MQTT broker"""
+
+    def __init__(self, host='127.0.0.1', port=0, topic_prefix='frigate'):
+        self.topic_prefix = topic_prefix
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.retained = {}
+        self.published = []  # (topic, payload) of every message routed, oldest first
+        broker = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                broker._serve(self.connection, self.rfile, self.wfile)
+
+        class Server(socketserver.ThreadingTCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+        self.server = Server((host, port), Handler)
+        self.thread = None
+
+    @property
+    def host(self):
+        return self.server.server_address[0]
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # ------------------------------------------------------------------
+    # Publishing from the test side
+    # ------------------------------------------------------------------
+
+    def publish(self, topic, payload, retain=False):
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload)
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        with self.lock:
+            if retain:
+                self.retained[topic] = payload
+            self.published.append((topic, payload))
+            targets = [session for session in self.sessions
+                       if any(topic_matches(f, topic) for f in session.subscriptions)]
+        message = packet(PUBLISH, encode_string(topic) + payload)
+        for session in targets:
+            try:
+                session.send(message)
+            except OSError:
+                pass
+
+    def frigate_event(self, camera, label, event_type='new', event_id=None, score=0.85,
+                      start_time=None, end_time=None, zones=(), false_positive=False):
+        """Publish one frigate/events message; returns the event id for follow-up updates"""
+        event_id = event_id or f"{time.time():.6f}-{uuid.uuid4().hex[:6]}"
+        after = {
+            "id": event_id, "camera": camera, "label": label, "sub_label": None,
+            "score": score, "top_score": score, "false_positive": false_positive,
+            "start_time": start_time or time.time(), "end_time": end_time,
+            "current_zones": list(zones), "entered_zones": list(zones),
+            "has_snapshot": True, "has_clip": False, "stationary": False
+        }
+        self.publish(f"{self.topic_prefix}/events", {"type": event_type, "before": after, "after": after})
+        return event_id
+
+    def object_count(self, camera, label, count):
+        """Publish Frigate's live object count for one camera (frigate/<camera>/<label>)"""
+        self.publish(f"{self.topic_prefix}/{camera}/{label}", str(count))
+
+    def drop_connections(self):
+        """Close every client socket, as a broker restart would"""
+        with self.lock:
+            sessions, self.sessions = list(self.sessions), set()
+        for session in sessions:
+            try:
+                session.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def subscriber_count(self):
+        with self.lock:
+            return sum(1 for session in self.sessions if session.subscriptions)
+
+    # ------------------------------------------------------------------
+    # Protocol
+    # ------------------------------------------------------------------
+
+    def _read_packet(self, rfile):
+        header = rfile.read(1)
+        if not header:
+            return None, None, None
+        length, shift = 0, 0
+        while True:
+            byte = rfile.read(1)
+            if not byte:
+                return None, None, None
+            length |= (byte[0] & 0x7F) << shift
+            shift += 7
+            if not byte[0] & 0x80:
+                break
+        return header[0] >> 4, header[0] & 0x0F, rfile.read(length)
+
+    def _serve(self, connection, rfile, wfile):
+        session = Session(connection, wfile)
+        try:
+            while True:
+                packet_type, flags, body = self._read_packet(rfile)
+                if packet_type is None or packet_type == DISCONNECT:
+                    return
+                if packet_type == CONNECT:
+                    session.send(packet(CONNACK, b'\x00\x00'))
+                    with self.lock:
+                        self.sessions.add(session)
+                elif packet_type == SUBSCRIBE:
+                    self._subscribe(session, body)
+                elif packet_type == UNSUBSCRIBE:
+                    packet_id, offset = body[:2], 2
+                    while offset < len(body):
+                        (length,) = struct.unpack('!H', body[offset:offset + 2])
+                        session.subscriptions.discard(body[offset + 2:offset + 2 + length].decode('utf-8'))
+                        offset += 2 + length
+                    session.send(packet(UNSUBACK, packet_id))
+                elif packet_type == PUBLISH:
+                    (length,) = struct.unpack('!H', body[:2])
+                    topic, offset = body[2:2 + length].decode('utf-8'), 2 + length
+                    qos = (flags >> 1) & 0x03
+                    if qos:
+                        packet_id, offset = body[offset:offset + 2], offset + 2
+                        session.send(packet(PUBACK, packet_id))
+                    self.publish(topic, body[offset:], retain=bool(flags & 0x01))
+                elif packet_type == PINGREQ:
+                    session.send(packet(PINGRESP, b''))
+        except (OSError, ValueError):
+            return
+        finally:
+            with self.lock:
+                self.sessions.discard(session)
+
+    def _subscribe(self, session, body):
+        packet_id, offset, granted, filters = body[:2], 2, bytearray(), []
+        while offset < len(body):
+            (length,) = struct.unpack('!H', body[offset:offset + 2])
+            filters.append(body[offset + 2:offset + 2 + length].decode('utf-8'))
+            offset += 3 + length  # filter plus its requested-QoS byte
+            granted.append(0)
+        session.subscriptions.update(filters)
+        session.send(packet(SUBACK, packet_id + bytes(granted)))
+        with self.lock:
+            retained = [(topic, payload) for topic, payload in self.retained.items()
+                        if any(topic_matches(f, topic) for f in filters)]
+        for topic, payload in retained:
+            session.send(packet(PUBLISH, encode_string(topic) + payload, flags=0x01))
+
+
+if __name__ == '__main__':
+    fake = FakeMQTTBroker(port=1883).start()
+    print(f"🧪 Fake MQTT broker on {fake.host}:{fake.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
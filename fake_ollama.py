@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Local Ollama Stand-in
+Answers /api/tags, /api/generate and /api/chat (blocking and NDJSON
+streaming) with canned responses and configurable latency. Models unload
+after their keep_alive expires and pay load_delay on the next call; a chat
+whose system message matches the previous one only evaluates the new tokens.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+
+from fake_ha import BurstTolerantHTTPServer
+
+DEFAULT_ACTION_RESPONSE = json.dumps({
+    "actions": [
+        {"domain": "light", "service": "turn_on", "entity_id": "light.kitchen",
+         "service_data": {"brightness": 255}}
+    ],
+    "response": "I've turned on the kitchen lights to full brightness"
+})
+
+
+class FakeOllama:
+    """In-process fake Ollama server"""
+
+    def __init__(self, host='127.0.0.1', port=0, models=('dolphin-llama3:latest',),
+                 first_token_delay=0.0, token_delay=0.0, token_size=4, load_delay=0.0):
+        self.models = list(models)
+        self.load_delay = load_delay
+        self.loaded_until = {}   # model -> time its keep_alive expires
+        self.cached_prefix = {}  # model -> system message of the previous chat
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.token_size = token_size
+        self.responder = lambda payload: DEFAULT_ACTION_RESPONSE
+        self.requests = []
+        self.streams_abandoned = 0  # streamed replies the client hung up on before done
+        self.lock = threading.Lock()
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                fake._handle_get(self)
+
+            def do_POST(self):
+                fake._handle_post(self)
+
+        self.server = BurstTolerantHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond_with(self, responder):
+        """Set the reply text: a string, or a callable taking the request payload"""
+        self.responder = responder if callable(responder) else (lambda payload: responder)
+
+    @staticmethod
+    def embedding(text, dimensions=64):
+        """Deterministic bag-of-words vector: texts sharing words score as similar"""
+        vector = [0.0] * dimensions
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % dimensions] += 1.0
+        return vector
+
+    @staticmethod
+    def keep_alive_seconds(value):
+        """Parse Ollama keep_alive ("30m", "1h", "90s", 300, -1 = forever)"""
+        if value is None:
+            return 300
+        if isinstance(value, (int, float)):
+            return float('inf') if value < 0 else float(value)
+        value = str(value).strip()
+        units = {'s': 1, 'm': 60, 'h': 3600}
+        if value and value[-1] in units:
+            return float(value[:-1]) * units[value[-1]]
+        number = float(value)
+        return float('inf') if number < 0 else number
+
+    def _load(self, payload):
+        """Simulate model residency; returns load_duration in nanoseconds"""
+        model = payload.get('model')
+        now = time.time()
+        with self.lock:
+            cold = self.loaded_until.get(model, 0) < now
+            self.loaded_until[model] = float('inf')  # held while the request runs
+        if cold:
+            time.sleep(self.load_delay)
+        with self.lock:
+            self.loaded_until[model] = time.time() + self.keep_alive_seconds(payload.get('keep_alive'))
+        return int((self.load_delay if cold else 0.001) * 1e9)
+
+    def _prompt_eval_count(self, payload):
+        messages = payload.get('messages')
+        if messages is None:
+            return max(1, len(payload.get('prompt', '')) // 4)
+        system = ''.join(m.get('content', '') for m in messages if m.get('role') == 'system')
+        rest = ''.join(m.get('content', '') for m in messages if m.get('role') != 'system')
+        with self.lock:
+            reused = self.cached_prefix.get(payload.get('model')) == system
+            self.cached_prefix[payload.get('model')] = system
+        return max(1, len(rest if reused else system + rest) // 4)
+
+    def _tokens(self, text):
+        return [text[i:i + self.token_size] for i in range(0, len(text), self.token_size)]
+
+    def _send_json(self, handler, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Content-Length', str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _handle_get(self, handler):
+        if handler.path.split('?')[0] == '/api/tags':
+            self._send_json(handler, {"models": [{"name": name} for name in self.models]})
+        else:
+            self._send_json(handler, {"error": "not found"}, 404)
+
+    def _handle_post(self, handler):
+        length = int(handler.headers.get('Content-Length', 0) or 0)
+        payload = json.loads(handler.rfile.read(length) or b'{}')
+        path = handler.path.split('?')[0]
+        with self.lock:
+            self.requests.append({"path": path, "payload": payload, "time": time.time()})
+
+        if path == '/api/embeddings':
+            self._send_json(handler, {"embedding": self.embedding(payload.get('prompt', ''))})
+            return
+        if path not in ('/api/generate', '/api/chat'):
+            self._send_json(handler, {"error": "not found"}, 404)
+            return
+
+        started = time.time()
+        load_duration = self._load(payload)
+        prompt_eval_count = self._prompt_eval_count(payload)
+        text = self.responder(payload)
+        tokens = self._tokens(text)
+        if (payload.get('options') or {}).get('num_predict'):
+            tokens = tokens[:payload['options']['num_predict']]
+        time.sleep(self.first_token_delay)
+
+        def chunk(token, done):
+            body = {"model": payload.get('model'), "done": done}
+            if path == '/api/chat':
+                body["message"] = {"role": "assistant", "content": token}
+            else:
+                body["response"] = token
+            if done:
+                body.update(total_duration=int((time.time() - started) * 1e9), load_duration=load_duration,
+                            prompt_eval_count=prompt_eval_count, eval_count=len(tokens))
+            return body
+
+        if not payload.get('stream', True):
+            time.sleep(self.token_delay * len(tokens))
+            self._send_json(handler, chunk(''.join(tokens), True))
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'application/x-ndjson')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+        def write_chunk(obj):
+            data = (json.dumps(obj) + '\n').encode('utf-8')
+            handler.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            handler.wfile.flush()
+
+        try:
+            for index, token in enumerate(tokens):
+                if index:
+                    time.sleep(self.token_delay)
+                write_chunk(chunk(token, False))
+            write_chunk(chunk('', True))
+            handler.wfile.write(b"0\r\n\r\n")
+            handler.wfile.flush()
+        except OSError:
+            # Like Ollama, stop generating once the client has gone
+            handler.close_connection = True
+            with self.lock:
+                self.streams_abandoned += 1
+
+
+if __name__ == '__main__':
+    fake = FakeOllama(port=11434, first_token_delay=0.5, token_delay=0.05, load_delay=3.0).start()
+    print(f"🧪 Fake Ollama on {fake.url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Concurrent Fan-out
+Runs independent probes side by side under one overall deadline, so a
+response waits for the slowest probe (or the deadline), not the sum of all
+of them. Whatever finished in time is returned; the rest is reported pending.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import tracing
+
+# Configuration
+FANOUT_DEADLINE = float(os.getenv('FANOUT_DEADLINE', '3'))  # seconds a fan-out endpoint waits overall
+
+
+def fan_out(calls, deadline=FANOUT_DEADLINE):
+    """Run {key: callable} concurrently; return ({key: result} for finished calls, [pending keys])"""
+    if not calls:
+        return {}, []
+    # One thread per call, owned by this fan-out: a straggler still running past
+    # the deadline holds only its own thread, never a slot a later request needs
+    executor = ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix='fanout')
+    try:
+        futures = {key: executor.submit(tracing.bind(call)) for key, call in calls.items()}
+        wait(futures.values(), timeout=deadline)
+    finally:
+        executor.shutdown(wait=False)
+
+    results, pending = {}, []
+    for key, future in futures.items():
+        if not future.done():
+            # Stragglers finish on their own threads; their results are discarded
+            pending.append(key)
+        elif future.exception() is not None:
+            results[key] = {"error": str(future.exception())}
+        else:
+            results[key] = future.result()
+    return results, pending
+
+
+async def fan_out_async(calls, deadline=FANOUT_DEADLINE):
+    """Awaitable form of fan_out for {key: coroutine}; pending coroutines are cancelled"""
+    tasks = {key: asyncio.ensure_future(call) for key, call in calls.items()}
+    if tasks:
+        await asyncio.wait(tasks.values(), timeout=deadline)
+
+    results, pending = {}, []
+    for key, task in tasks.items():
+        if not task.done():
+            task.cancel()
+            pending.append(key)
+        elif task.exception() is not None:
+            results[key] = {"error": str(task.exception())}
+        else:
+            results[key] = task.result()
+    return results, pending
+
+
+def timed_out(deadline=FANOUT_DEADLINE, **fields):
+    """Placeholder result for a probe that missed the deadline"""
+    return dict(fields, error=f"No response within {deadline:g}s", timed_out=True)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Frigate Event Index
+Subscribes to the MQTT topics Frigate publishes (frigate/events for tracked
+objects, frigate/<camera>/<object> for live object counts) and keeps a
+bounded in-memory index of recent detections per camera and object type.
+Presence questions ("was anyone at the front door?") are answered from that
+index with no LLM call and no HA round trip.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import paho.mqtt.client as mqtt
+
+# Configuration
+FRIGATE_EVENTS = os.getenv('FRIGATE_EVENTS', 'true').lower() in ('1', 'true', 'yes')
+MQTT_HOST = os.getenv('MQTT_HOST', '192.168.0.81')
+MQTT_PORT = int(os.getenv('MQTT_PORT', '1883'))
+MQTT_USERNAME = os.getenv('MQTT_USERNAME', '')
+MQTT_PASSWORD = os.getenv('MQTT_PASSWORD', '')
+FRIGATE_TOPIC_PREFIX = os.getenv('FRIGATE_TOPIC_PREFIX', 'frigate')
+FRIGATE_EVENTS_PER_KEY = int(os.getenv('FRIGATE_EVENTS_PER_KEY', '200'))  # per camera and object type
+FRIGATE_EVENT_MAX_AGE = float(os.getenv('FRIGATE_EVENT_MAX_AGE', str(7 * 86400)))
+PRESENCE_WINDOW = float(os.getenv('FRIGATE_PRESENCE_WINDOW', '3600'))  # "was anyone..." with no time given
+
+RECONNECT_MAX_DELAY = 30
+
+# Words in a question -> Frigate object label (None = any object)
+PRESENCE_OBJECTS = {
+    'anyone': 'person', 'anybody': 'person', 'someone': 'person', 'somebody': 'person',
+    'person': 'person', 'people': 'person', 'visitor': 'person', 'visitors': 'person',
+    'car': 'car', 'cars': 'car', 'vehicle': 'car', 'vehicles': 'car', 'truck': 'car',
+    'dog': 'dog', 'dogs': 'dog', 'cat': 'cat', 'cats': 'cat',
+    'package': 'package', 'packages': 'package', 'delivery': 'package', 'deliveries': 'package',
+    'motion': None, 'activity': None, 'movement': None
+}
+QUESTION_WORDS = {'was', 'were', 'has', 'have', 'had', 'did', 'is', 'are', 'any', 'who', 'when', 'how'}
+# A presence question also needs one of these; "is the car charging?" is a state question, not presence
+PRESENCE_WORDS = {'anyone', 'anybody', 'someone', 'somebody', 'any', 'seen', 'see', 'saw', 'spotted',
+                  'detected', 'came', 'come', 'visited', 'arrived', 'around', 'outside'}
+PRESENCE_PHRASES = re.compile(r'\b(?:is|are|was|were) there\b|\b(?:at|in|on|by) the\b')
+PRESENT_TENSE = {'is', 'are'}
+UNIT_SECONDS = {'minute': 60, 'min': 60, 'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+RELATIVE_WINDOW = re.compile(r'\b(?:last|past)\s+(\d+|a|an|one)?\s*(minute|min|hour|day|week)s?\b')
+
+
+def words(text):
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def ago(seconds):
+    if seconds < 60:
+        return "just now"
+    for unit, size in (('day', 86400), ('hour', 3600), ('minute', 60)):
+        if seconds >= size:
+            count = int(seconds // size)
+            return f"{count} {unit}{'s' if count != 1 else ''} ago"
+
+
+def parse_presence_question(text, now=None):
+    """{label, since, until, present, window} for a presence question, or None for anything else"""
+    tokens = words(text)
+    if not tokens or not (tokens[0] in QUESTION_WORDS or text.strip().endswith('?')):
+        return None
+    objects = [PRESENCE_OBJECTS[token] for token in tokens if token in PRESENCE_OBJECTS]
+    if not objects:
+        return None
+    lowered = ' '.join(tokens)
+    if not (PRESENCE_WORDS.intersection(tokens) or PRESENCE_PHRASES.search(lowered)):
+        return None
+
+    now = time.time() if now is None else now
+    today = datetime.fromtimestamp(now).replace(hour=0, minute=0, second=0, microsecond=0)
+    present = tokens[0] in PRESENT_TENSE or 'right now' in lowered or 'currently' in tokens
+    since, until, window = now - PRESENCE_WINDOW, None, None
+
+    relative = RELATIVE_WINDOW.search(lowered)
+    if relative:
+        count = relative.group(1)
+        count = int(count) if count and count.isdigit() else 1
+        unit = relative.group(2)
+        since = now - count * UNIT_SECONDS[unit]
+        unit = 'minute' if unit == 'min' else unit
+        window = f"in the last {unit}" if count == 1 else f"in the last {count} {unit}s"
+        present = False
+    elif 'last night' in lowered or 'tonight' in tokens or 'overnight' in tokens:
+        evening = today.replace(hour=18) if now >= today.replace(hour=18).timestamp() else \
+            today - timedelta(hours=6)
+        since, window, present = evening.timestamp(), "last night" if 'last night' in lowered else "tonight", False
+    elif 'yesterday' in tokens:
+        since, until, window, present = (today - timedelta(days=1)).timestamp(), today.timestamp(), "yesterday", False
+    elif 'today' in tokens or 'this morning' in lowered:
+        since, window, present = today.timestamp(), "today", False
+
+    if window is None:
+        window = "right now" if present else f"in the last {ago(PRESENCE_WINDOW).replace(' ago', '')}"
+        window = window.replace('last 1 hour', 'last hour')
+    # "has someone left a package" is about the package, not the person
+    label = next((label for label in objects if label not in (None, 'person')), objects[0])
+    return {"label": label, "since": since, "until": until, "present": present, "window": window}
+
+
+class DetectionIndex:
+    """Recent Frigate detections keyed by (camera, object label), bounded per key and by age"""
+
+    def __init__(self, per_key=FRIGATE_EVENTS_PER_KEY, max_age=FRIGATE_EVENT_MAX_AGE):
+        self.per_key = per_key
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._events = {}  # (camera, label) -> OrderedDict event id -> detection, oldest first
+        self._keys = {}    # event id -> (camera, label)
+        self._counts = {}  # (camera, label) -> objects in view now, from frigate/<camera>/<label>
+        self.last_message = None
+        self.counters = {"events": 0, "updates": 0, "false_positives": 0, "evicted": 0, "counts": 0}
+
+    def ready(self):
+        """True once anything has arrived from Frigate"""
+        return self.last_message is not None
+
+    # ------------------------------------------------------------------
+    # Ingest
+    # ------------------------------------------------------------------
+
+    def observe_event(self, message):
+        """Apply one frigate/events message ({"type": new|update|end, "before": {...}, "after": {...}})"""
+        after = message.get('after') or message.get('before') or {}
+        event_id, camera, label = after.get('id'), after.get('camera'), after.get('label')
+        if not (event_id and camera and label):
+            return
+        with self._lock:
+            self.last_message = time.time()
+            key = (camera, label)
+            if after.get('false_positive'):
+                # Frigate re-classified it; forget any earlier update
+                self.counters["false_positives"] += 1
+                if self._keys.pop(event_id, None) is not None:
+                    self._events.get(key, {}).pop(event_id, None)
+                return
+            events = self._events.setdefault(key, OrderedDict())
+            if event_id in events:
+                self.counters["updates"] += 1
+            else:
+                self.counters["events"] += 1
+                self._keys[event_id] = key
+            events[event_id] = {
+                "id": event_id,
+                "camera": camera,
+                "label": label,
+                "sub_label": after.get('sub_label'),
+                "score": after.get('top_score') or after.get('score'),
+                "start_time": after.get('start_time') or time.time(),
+                "end_time": after.get('end_time'),
+                "zones": after.get('entered_zones') or after.get('current_zones') or [],
+                "has_snapshot": bool(after.get('has_snapshot')),
+                "has_clip": bool(after.get('has_clip')),
+                "active": message.get('type') != 'end' and after.get('end_time') is None
+            }
+            self._evict(events, time.time() - self.max_age)
+
+    def _evict(self, events, cutoff):
+        while events:
+            oldest = next(iter(events.values()))
+            if len(events) <= self.per_key and oldest['start_time'] >= cutoff:
+                break
+            events.popitem(last=False)
+            self._keys.pop(oldest['id'], None)
+            self.counters["evicted"] += 1
+
+    def observe_count(self, camera, label, count):
+        with self._lock:
+            self.last_message = time.time()
+            self._counts[(camera, label)] = count
+            self.counters["counts"] += 1
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _matching(self, camera, label):
+        return [events for (cam, lab), events in self._events.items()
+                if (camera is None or cam == camera) and (label is None or lab == label)]
+
+    def query(self, camera=None, label=None, since=None, until=None, limit=20):
+        """Detections newest first; cost is bounded by cameras x labels x per_key, not by uptime"""
+        since = time.time() - self.max_age if since is None else since
+        found = []
+        with self._lock:
+            for events in self._matching(camera, label):
+                # Frigate can report events out of start order, so scan the whole (bounded) key
+                found.extend(dict(detection) for detection in events.values()
+                             if detection['start_time'] >= since and (until is None or detection['start_time'] < until))
+        found.sort(key=lambda detection: detection['start_time'], reverse=True)
+        return found if limit is None else found[:limit]
+
+    def in_view(self, camera=None, label=None):
+        """Objects in view right now: Frigate's live counts, else detections still active"""
+        with self._lock:
+            counts = [count for (cam, lab), count in self._counts.items()
+                      if (camera is None or cam == camera) and (label is None or lab == label) and lab != 'all']
+            if counts:
+                return sum(counts)
+            return sum(detection['active'] for events in self._matching(camera, label)
+                       for detection in events.values())
+
+    def answer(self, question, camera=None, camera_name=None):
+        """Answer a parsed presence question for one Frigate camera (None = every camera)"""
+        label, now = question['label'], time.time()
+        what = label or 'activity'
+        where = f"at the {camera_name}" if camera_name else "on any camera"
+        latest = self.query(camera, label, limit=1)
+        last_seen = latest[0]['start_time'] if latest else None
+        seen_text = f" Last seen {ago(now - last_seen)}." if last_seen else ""
+
+        if question['present']:
+            count = self.in_view(camera, label)
+            detections = self.query(camera, label, since=now - 300, limit=5) if count else []
+            response = f"Yes, {count} {what} {where} right now." if count else \
+                f"No {what} {where} right now.{seen_text}"
+        else:
+            detections = self.query(camera, label, since=question['since'], until=question['until'], limit=None)
+            count = len(detections)
+            if count:
+                response = (f"Yes, {count} {what} detection{'s' if count != 1 else ''} {where} "
+                            f"{question['window']}, most recently {ago(now - detections[0]['start_time'])}.")
+            else:
+                response = f"No {what} detected {where} {question['window']}.{seen_text}"
+        return {
+            "frigate_camera": camera,
+            "label": label,
+            "window": question['window'],
+            "since": None if question['present'] else question['since'],
+            "count": count,
+            "last_seen": last_seen,
+            "detections": detections[:5],
+            "response": response
+        }
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters,
+                        indexed=sum(len(events) for events in self._events.values()),
+                        keys=sorted(f"{camera}/{label}" for camera, label in self._events),
+                        in_view={f"{camera}/{label}": count for (camera, label), count in self._counts.items()},
+                        last_message=self.last_message)
+
+
+class FrigateSubscriber:
+    """MQTT client feeding a DetectionIndex; paho reconnects on its own after a broker drop"""
+
+    def __init__(self, index, host=MQTT_HOST, port=MQTT_PORT, prefix=FRIGATE_TOPIC_PREFIX,
+                 username=MQTT_USERNAME, password=MQTT_PASSWORD, enabled=FRIGATE_EVENTS, cameras=None):
+        self.index = index
+        # Frigate camera names; frigate/<name>/<object> for anything else (zones, mostly) is not indexed
+        self.cameras = set(cameras) if cameras is not None else None
+        self.host = host
+        self.port = port
+        self.prefix = prefix.rstrip('/')
+        self.username = username
+        self.password = password
+        self.enabled = enabled and bool(host)
+        self.connected = False
+        self.frigate_available = None
+        self.last_error = None
+        self._client = None
+        self._lock = threading.Lock()
+        self.counters = {"connects": 0, "disconnects": 0, "messages": 0, "bad_messages": 0, "ignored": 0}
+
+    def start(self):
+        """Connect in the background (idempotent); does nothing when disabled"""
+        with self._lock:
+            if not self.enabled or self._client is not None:
+                return
+            client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"ha-bridge-{os.getpid()}")
+            if self.username:
+                client.username_pw_set(self.username, self.password or None)
+            client.reconnect_delay_set(min_delay=1, max_delay=RECONNECT_MAX_DELAY)
+            client.on_connect = self._on_connect
+            client.on_disconnect = self._on_disconnect
+            client.on_message = self._on_message
+            self._client = client
+        client.connect_async(self.host, self.port, keepalive=60)
+        client.loop_start()
+
+    def stop(self):
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.disconnect()
+            client.loop_stop()
+
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            self.last_error = f"connect: {reason_code}"
+            return
+        self.connected = True
+        self.counters["connects"] += 1
+        client.subscribe([(f"{self.prefix}/events", 0), (f"{self.prefix}/+/+", 0),
+                          (f"{self.prefix}/available", 0)])
+
+    def _on_disconnect(self, client, userdata, flags, reason_code, properties):
+        self.connected = False
+        self.counters["disconnects"] += 1
+        if reason_code.is_failure:
+            self.last_error = f"disconnect: {reason_code}"
+
+    def _on_message(self, client, userdata, message):
+        self.handle(message.topic, message.payload)
+
+    def handle(self, topic, payload):
+        """Route one message by topic: events, per-camera object counts or Frigate availability"""
+        self.counters["messages"] += 1
+        parts = topic[len(self.prefix) + 1:].split('/') if topic.startswith(self.prefix + '/') else []
+        try:
+            if parts == ['events']:
+                self.index.observe_event(json.loads(payload))
+            elif parts == ['available']:
+                self.frigate_available = payload.decode() if isinstance(payload, bytes) else str(payload)
+            elif len(parts) == 2:
+                # frigate/<camera>/<object> carries a count; other two-level topics (detect, recordings...) don't
+                if self.cameras is not None and parts[0] not in self.cameras:
+                    self.counters["ignored"] += 1
+                    return
+                text = payload.decode() if isinstance(payload, bytes) else str(payload)
+                if text.isdigit():
+                    self.index.observe_count(parts[0], parts[1], int(text))
+        except (ValueError, AttributeError) as e:
+            self.counters["bad_messages"] += 1
+            self.last_error = f"{topic}: {e}"
+
+    def stats(self):
+        return dict(self.counters, enabled=self.enabled, broker=f"{self.host}:{self.port}",
+                    connected=self.connected, frigate_available=self.frigate_available,
+                    last_error=self.last_error, index=self.index.stats())
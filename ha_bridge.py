@@ -3,14 +3,32 @@
 Simple Home Assistant AI Bridge - Ready to Deploy
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask
 from flask_cors import CORS
-import requests
-import json
+import http_client
 import os
 
+import bridge_io
+import metrics
+import ollama_client
+import tracing
+from ha_state_store import HAStateStore
+from home_context import HomeContextBuilder
+from intent_parser import IntentParser
+from llm_cache import CACHE_EMBEDDINGS, LLMResponseCache
+from llm_json import ACTION_PLAN_SCHEMA, ActionStreamParser
+from prompt_manager import PromptManager
+from action_validation import ActionValidator, rejected_result
+from fanout import timed_out
+from llm_scheduler import LLMBusy
+from ollama_client import OllamaError, StreamTimer
+from sse import format_event
+
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=tracing.RESPONSE_HEADERS)
+
+# Route handlers, shared with the Quart app in ha_bridge_async.py
+routes = bridge_io.Routes()
 
 # Configuration
 HA_URL = os.getenv('HA_URL', 'http://192.168.0.81:8123')
@@ -23,164 +41,370 @@ HA_HEADERS = {
     'Content-Type': 'application/json'
 }
 
-@app.route('/health', methods=['GET'])
-def health():
-    return jsonify({"status": "healthy", "service": "ha-ai-bridge"})
+# In-memory mirror of HA entity states, kept current over the WebSocket API
+state_store = HAStateStore(HA_URL, HA_TOKEN)
 
-@app.route('/test_connections', methods=['GET'])
-def test_connections():
-    """Test all connections"""
-    results = {}
+# Deterministic matcher that answers common commands without the LLM
+intent_parser = IntentParser(state_store)
+
+# Registry checks for model-proposed actions before they reach HA
+action_validator = ActionValidator(state_store, intent_parser.index)
+
+# Relevance-ranked, token-budgeted entity context for /smart_query
+context_builder = HomeContextBuilder(state_store)
+
+# Validated action plans for repeated commands, so a hit skips inference
+llm_cache = LLMResponseCache(
+    state_store,
+    embed=(lambda text: ollama_client.embed(text, base_url=OLLAMA_URL)) if CACHE_EMBEDDINGS else None
+)
+
+def from_mirror(func, *args):
+    """Mirror reads are in-memory once loaded; until then they may block on a REST load"""
+    return bridge_io.Blocking(func, *args, ready=state_store.is_loaded)
+
+@routes.route('/health')
+def health(request):
+    return {"status": "healthy", "service": "ha-ai-bridge"}
 
-    # Test HA connection
+@routes.route('/state_store')
+def state_store_status(request):
+    """Report health of the local entity-state mirror"""
+    return state_store.stats()
+
+@routes.route('/http_stats')
+def http_stats(request):
+    """Report shared HTTP connection-pool usage"""
+    return (yield bridge_io.http_stats())
+
+@routes.route('/intent_stats')
+def intent_stats(request):
+    """Report how much LLM traffic the fast-path intent parser removes"""
+    return intent_parser.stats()
+
+@routes.route('/cache_stats')
+def cache_stats(request):
+    """Report LLM response cache hit rate and evictions"""
+    return llm_cache.stats()
+
+def probe_home_assistant():
     try:
-        response = requests.get(f"{HA_URL}/api/", headers=HA_HEADERS, timeout=5)
-        results['home_assistant'] = {
+        response = yield bridge_io.http('GET', f"{HA_URL}/api/", endpoint='ha_api', headers=HA_HEADERS)
+        return {
             'status': 'connected' if response.status_code == 200 else 'auth_error',
             'code': response.status_code
         }
     except Exception as e:
-        results['home_assistant'] = {'status': 'error', 'error': str(e)}
+        return {'status': 'error', 'error': str(e)}
 
-    # Test AI connection
+def probe_ai_service():
     try:
-        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
+        response = yield bridge_io.http('GET', f"{OLLAMA_URL}/api/tags", endpoint='ollama_tags')
         if response.status_code == 200:
             models = response.json().get('models', [])
-            results['ai_service'] = {
+            return {
                 'status': 'connected',
                 'models_count': len(models),
                 'models': [m['name'] for m in models]
             }
-        else:
-            results['ai_service'] = {'status': 'error', 'code': response.status_code}
+        return {'status': 'error', 'code': response.status_code}
     except Exception as e:
-        results['ai_service'] = {'status': 'error', 'error': str(e)}
+        return {'status': 'error', 'error': str(e)}
+
+@routes.route('/llm_stats')
+def llm_stats(request):
+    """Report cold vs. warm model latency, prompt tokens evaluated and reply validation"""
+    return dict(prompts.stats(), validation=action_validator.stats())
 
-    return jsonify(results)
+@routes.route('/context_stats')
+def context_stats(request):
+    """Report smart-query context size and index rebuilds"""
+    return context_builder.stats()
 
-@app.route('/voice_command', methods=['POST'])
-def voice_command():
+@routes.route('/test_connections')
+def test_connections(request):
+    """Test all connections"""
+    # Both probes run at once; a dead service costs the deadline, not its full timeout
+    results, pending = yield bridge_io.FanOut({'home_assistant': probe_home_assistant(),
+                                               'ai_service': probe_ai_service()})
+    for name in pending:
+        results[name] = timed_out(status='error')
+    return results
+
+# Fixed system prompts: identical on every call, so Ollama reuses their KV cache
+ACTION_SYSTEM_PROMPT = """
+You are a smart home assistant. Convert each voice command to Home Assistant API calls.
+
+Respond with ONLY a JSON object in this exact format:
+{
+    "actions": [
+        {
+            "domain": "light",
+            "service": "turn_on",
+            "entity_id": "light.living_room",
+            "service_data": {"brightness": 255}
+        }
+    ],
+    "response": "I've turned on the living room lights to full brightness"
+}
+
+Common domains: light, switch, climate, media_player, automation, script
+Common services: turn_on, turn_off, toggle, set_temperature
+Always include a friendly response message.
+"""
+
+QUERY_SYSTEM_PROMPT = """
+You are a smart home assistant. Each message gives the current smart home status,
+one line per domain as "domain: name=state [area]", followed by the user's question.
+Answer from that status, conversationally. Mention specific device states when relevant.
+"""
+
+prompts = PromptManager(OLLAMA_URL)
+prompts.register('action', ACTION_SYSTEM_PROMPT, schema=ACTION_PLAN_SCHEMA, priority='voice',
+                 tier='small')
+prompts.register('query', QUERY_SYSTEM_PROMPT, priority='query', tier='large')
+
+# Request counters, per-stage latency histograms and component gauges on /metrics
+metrics.instrument(app, http=http_client, caches={'intent_fast_path': intent_parser, 'llm_response': llm_cache},
+                   prompts=prompts, state_store=state_store)
+tracing.instrument(app, 'ha-ai-bridge')
+
+def build_action_prompt(command):
+    """Create the user message that carries a voice command"""
+    return f'Voice Command: "{command}"'
+
+def build_query_prompt(query, context):
+    """Create the user message that answers a question from the home context"""
+    return f"Smart home status:\n{context['text']}\n\nUser question: \"{query}\""
+
+@routes.route('/voice_command', methods=['POST'])
+def voice_command(request):
     """Process voice commands for smart home"""
     try:
         data = request.json
         command = data.get('command', '')
 
         if not command:
-            return jsonify({"error": "No command provided"}), 400
+            return {"error": "No command provided"}, 400
+
+        # Common commands resolve against the entity registry without the LLM
+        plan = yield from_mirror(intent_parser.parse, command)
+        source = 'fast_path'
+        if not plan:
+            # Repeated commands reuse the plan the model produced last time
+            plan = yield cache_lookup(command)
+            source = 'cache'
+        if plan:
+            if request.wants_stream():
+                return bridge_io.Stream(stream_action_plan(command, plan, source))
+            return (yield from run_action_plan(command, plan, source))
 
         # Create AI prompt for smart home control
-        prompt = f"""
-        You are a smart home assistant. Convert this voice command to Home Assistant API calls.
-
-        Voice Command: "{command}"
-
-        Respond with ONLY a JSON object in this exact format:
-        {{
-            "actions": [
-                {{
-                    "domain": "light",
-                    "service": "turn_on",
-                    "entity_id": "light.living_room",
-                    "service_data": {{"brightness": 255}}
-                }}
-            ],
-            "response": "I've turned on the living room lights to full brightness"
-        }}
-
-        Common domains: light, switch, climate, media_player, automation, script
-        Common services: turn_on, turn_off, toggle, set_temperature
-        Always include a friendly response message.
-        """
+        prompt = build_action_prompt(command)
+
+        if request.wants_stream():
+            return bridge_io.Stream(stream_voice_command(command, prompt))
 
         # Ask AI what to do
-        ai_response = requests.post(f"{OLLAMA_URL}/api/generate",
-                                   json={
-                                       "model": "dolphin-llama3:latest",
-                                       "prompt": prompt,
-                                       "stream": False
-                                   }, timeout=30)
-
-        if ai_response.status_code == 200:
-            ai_result = ai_response.json().get('response', '')
-
-            try:
-                # Parse AI response
-                action_plan = json.loads(ai_result)
-
-                # Execute each action
-                execution_results = []
-                for action in action_plan.get('actions', []):
-                    result = execute_ha_action(action)
-                    execution_results.append(result)
-
-                return jsonify({
-                    "success": True,
-                    "command": command,
-                    "ai_interpretation": action_plan,
-                    "execution_results": execution_results,
-                    "response": action_plan.get('response', 'Command executed')
-                })
-
-            except json.JSONDecodeError:
-                return jsonify({
-                    "success": False,
-                    "error": "AI response was not valid JSON",
-                    "ai_response": ai_result
-                })
-        else:
-            return jsonify({"error": "AI service unavailable"}), 500
+        try:
+            ai_result = yield bridge_io.chat(prompts, 'action', prompt)
+        except LLMBusy as e:
+            return {"error": "AI service busy", "detail": str(e)}, 503, {'Retry-After': str(e.retry_after)}
+        except OllamaError:
+            return {"error": "AI service unavailable"}, 500
+
+        # Parse AI response, repairing fences or truncation rather than re-asking the model
+        action_plan = action_validator.parse(ai_result)
+        if action_plan is None:
+            return {
+                "success": False,
+                "error": "AI response was not valid JSON",
+                "ai_response": ai_result
+            }
 
+        # Check the actions against the registry, then run the valid ones batched
+        action_plan['actions'], execution_results = yield from execute_llm_actions(action_plan.get('actions', []))
+        yield cache_store(command, action_plan, execution_results)
+
+        return {
+            "success": True,
+            "command": command,
+            "ai_interpretation": action_plan,
+            "execution_results": execution_results,
+            "response": action_plan.get('response', 'Command executed'),
+            "source": "llm"
+        }
+
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+def cache_lookup(command):
+    """Cached plan for a command; semantic matching calls the (blocking) embeddings endpoint"""
+    return bridge_io.Blocking(llm_cache.lookup, command, ready=lambda: not llm_cache.embed and state_store.is_loaded())
+
+def cache_store(command, action_plan, execution_results):
+    return bridge_io.Blocking(cache_if_successful, command, action_plan, execution_results,
+                              ready=lambda: not llm_cache.embed)
+
+def cache_if_successful(command, action_plan, execution_results):
+    """Only plans whose every action HA accepted are worth replaying"""
+    if execution_results and all(result.get('success') for result in execution_results):
+        llm_cache.store(command, action_plan)
+
+def run_action_plan(command, plan, source):
+    """Execute an action plan from the intent parser or the response cache"""
+    return plan_result(command, plan, (yield from execute_ha_actions(plan['actions'])), source)
+
+def plan_result(command, plan, execution_results, source):
+    """Response body for an executed fast-path or cached plan"""
+    result = {
+        "success": True,
+        "command": command,
+        "ai_interpretation": plan,
+        "execution_results": execution_results,
+        "response": plan.get('response', 'Command executed'),
+        "source": source
+    }
+    if plan.get('camera'):
+        entity_id = plan['camera']['entity_id']
+        result['camera'] = dict(plan['camera'],
+                                snapshot_url=f"{HA_URL}/api/camera_proxy/{entity_id}",
+                                stream_url=f"{HA_URL}/api/camera_proxy_stream/{entity_id}")
+    return result
+
+def stream_action_plan(command, plan, source):
+    """SSE form of run_action_plan, for clients that asked for a stream"""
+    timer = StreamTimer()
+    try:
+        result = yield from run_action_plan(command, plan, source)
+        for action, action_result in zip(plan['actions'], result['execution_results']):
+            timer.action()
+            yield format_event('action', {"action": action, "result": action_result,
+                                          "elapsed_ms": timer.elapsed_ms()})
+        result['timing'] = timer.summary()
+        yield format_event('done', result)
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        yield format_event('error', {"error": str(e), "timing": timer.summary()})
+
+def stream_voice_command(command, prompt):
+    """Relay model tokens over SSE and dispatch each action as soon as its JSON object closes"""
+    timer = StreamTimer()
+    parser = ActionStreamParser()
+    actions = []
+    execution_results = []
+
+    try:
+        tokens = yield bridge_io.stream_chat(prompts, 'action', prompt)
+        while True:
+            token = yield bridge_io.Next(tokens)
+            if token is None:
+                break
+            timer.token()
+            yield format_event('token', {"text": token})
+
+            for action in parser.feed(token):
+                timer.action()
+                action, result = yield from dispatch_llm_action(action)
+                actions.append(action)
+                execution_results.append(result)
+                yield format_event('action', {"action": action, "result": result,
+                                              "elapsed_ms": timer.elapsed_ms()})
+
+        action_plan = action_validator.parse(parser.text)
+        if action_plan is None:
+            yield format_event('done', {
+                "success": False,
+                "error": "AI response was not valid JSON",
+                "ai_response": parser.text,
+                "timing": timer.summary()
+            })
+            return
+
+        # Actions only the repaired document holds (a reply cut off mid-plan)
+        remaining = action_plan.get('actions') if isinstance(action_plan.get('actions'), list) else []
+        for action in remaining[len(actions):]:
+            timer.action()
+            action, result = yield from dispatch_llm_action(action)
+            actions.append(action)
+            execution_results.append(result)
+            yield format_event('action', {"action": action, "result": result,
+                                          "elapsed_ms": timer.elapsed_ms()})
+
+        action_plan['actions'] = actions
+        yield cache_store(command, action_plan, execution_results)
+        yield format_event('done', {
+            "success": True,
+            "command": command,
+            "ai_interpretation": action_plan,
+            "execution_results": execution_results,
+            "response": action_plan.get('response', 'Command executed'),
+            "source": "llm",
+            "timing": timer.summary()
+        })
 
-@app.route('/smart_query', methods=['POST'])
-def smart_query():
+    except Exception as e:
+        yield format_event('error', {"error": str(e), "timing": timer.summary()})
+
+@routes.route('/smart_query', methods=['POST'])
+def smart_query(request):
     """Answer questions about home status"""
     try:
         data = request.json
         query = data.get('query', '')
 
-        # Get current home state
-        states_response = requests.get(f"{HA_URL}/api/states", headers=HA_HEADERS, timeout=10)
+        # Rank mirrored entities against the question and pack the best into the token budget
+        try:
+            context = yield from_mirror(context_builder.build, query)
+        except Exception:
+            return {"error": "Could not get home status"}, 500
 
-        if states_response.status_code != 200:
-            return jsonify({"error": "Could not get home status"}), 500
+        ai_prompt = build_query_prompt(query, context)
 
-        states = states_response.json()
+        if request.wants_stream():
+            return bridge_io.Stream(stream_smart_query(query, ai_prompt, context))
 
-        # Create context for AI
-        context = create_home_context(states)
+        try:
+            answer = yield bridge_io.chat(prompts, 'query', ai_prompt)
+        except LLMBusy as e:
+            return {"error": "AI service busy", "detail": str(e)}, 503, {'Retry-After': str(e.retry_after)}
+        except OllamaError:
+            return {"error": "AI service unavailable"}, 500
 
-        ai_prompt = f"""
-        Current Smart Home Status: {json.dumps(context, indent=2)}
-
-        User Question: "{query}"
+        return {
+            "success": True,
+            "query": query,
+            "answer": answer,
+            "context_used": context
+        }
 
-        Based on the current state of the smart home, provide a helpful answer.
-        Be conversational and friendly. Include specific device states when relevant.
-        """
+    except Exception as e:
+        return {"error": str(e)}, 500
 
-        ai_response = requests.post(f"{OLLAMA_URL}/api/generate",
-                                   json={
-                                       "model": "dolphin-llama3:latest",
-                                       "prompt": ai_prompt,
-                                       "stream": False
-                                   }, timeout=30)
+def stream_smart_query(query, ai_prompt, context):
+    """Relay the model's answer token by token over SSE"""
+    timer = StreamTimer()
+    answer = []
 
-        if ai_response.status_code == 200:
-            answer = ai_response.json().get('response', '')
-            return jsonify({
-                "success": True,
-                "query": query,
-                "answer": answer,
-                "context_used": context
-            })
-        else:
-            return jsonify({"error": "AI service unavailable"}), 500
+    try:
+        tokens = yield bridge_io.stream_chat(prompts, 'query', ai_prompt)
+        while True:
+            token = yield bridge_io.Next(tokens)
+            if token is None:
+                break
+            timer.token()
+            answer.append(token)
+            yield format_event('token', {"text": token})
+
+        yield format_event('done', {
+            "success": True,
+            "query": query,
+            "answer": ''.join(answer),
+            "context_used": context,
+            "timing": timer.summary()
+        })
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        yield format_event('error', {"error": str(e), "timing": timer.summary()})
 
 def execute_ha_action(action):
     """Execute a Home Assistant action"""
@@ -188,67 +412,46 @@ def execute_ha_action(action):
         domain = action.get('domain')
         service = action.get('service')
         entity_id = action.get('entity_id')
-        service_data = action.get('service_data', {})
+        service_data = dict(action.get('service_data') or {})
 
         if entity_id:
             service_data['entity_id'] = entity_id
 
-        url = f"{HA_URL}/api/services/{domain}/{service}"
-        response = requests.post(url, headers=HA_HEADERS, json=service_data, timeout=10)
-
-        return {
-            "success": response.status_code == 200,
-            "action": f"{domain}.{service}",
-            "entity": entity_id,
-            "status_code": response.status_code
-        }
+        outcome = yield from call_ha_service(domain, service, service_data)
+        return dict(outcome, action=f"{domain}.{service}", entity=entity_id)
 
     except Exception as e:
         return {"success": False, "error": str(e)}
 
-def create_home_context(states):
-    """Create a simple context from HA states"""
-    context = {
-        "lights": {"on": [], "off": []},
-        "switches": {"on": [], "off": []},
-        "sensors": {},
-        "climate": {}
-    }
-
-    for state in states[:50]:  # Limit for performance
-        entity_id = state.get('entity_id', '')
-        entity_state = state.get('state', '')
-        attributes = state.get('attributes', {})
-        friendly_name = attributes.get('friendly_name', entity_id)
-
-        if entity_id.startswith('light.'):
-            if entity_state == 'on':
-                context["lights"]["on"].append(friendly_name)
-            else:
-                context["lights"]["off"].append(friendly_name)
-
-        elif entity_id.startswith('switch.'):
-            if entity_state == 'on':
-                context["switches"]["on"].append(friendly_name)
-            else:
-                context["switches"]["off"].append(friendly_name)
-
-        elif entity_id.startswith('sensor.') and 'temperature' in entity_id.lower():
-            context["sensors"][friendly_name] = f"{entity_state} {attributes.get('unit_of_measurement', '')}"
-
-        elif entity_id.startswith('climate.'):
-            context["climate"][friendly_name] = {
-                "current_temp": attributes.get('current_temperature'),
-                "target_temp": attributes.get('temperature'),
-                "mode": entity_state
-            }
-
-    return context
-
-@app.route('/demo_commands', methods=['GET'])
-def demo_commands():
-    """Get example commands to try"""
-    examples = [
+def call_ha_service(domain, service, service_data):
+    """POST one service call to HA"""
+    url = f"{HA_URL}/api/services/{domain}/{service}"
+    with tracing.span('execute_ha_action', action=f"{domain}.{service}",
+                      entity=str(service_data.get('entity_id'))):
+        response = yield bridge_io.http('POST', url, endpoint='ha_service', headers=HA_HEADERS, json=service_data)
+    return {"success": response.status_code == 200, "status_code": response.status_code}
+
+def execute_ha_actions(actions):
+    """Execute a multi-action plan as batched, concurrent service calls"""
+    return (yield bridge_io.ExecuteActions(actions, call_ha_service))
+
+def execute_llm_actions(actions):
+    """Validate model-proposed actions, execute the valid ones; returns (checked actions, results)"""
+    checked = yield from_mirror(action_validator.validate, actions if isinstance(actions, list) else [])
+    results = iter((yield from execute_ha_actions([action for action, error in checked if error is None])))
+    return ([action for action, _ in checked],
+            [next(results) if error is None else rejected_result(action, error) for action, error in checked])
+
+def dispatch_llm_action(action):
+    """Validate one streamed action and execute it if it passes; returns (checked action, result)"""
+    action, error = yield from_mirror(action_validator.check, action)
+    if error is not None:
+        return action, rejected_result(action, error)
+    return action, (yield from execute_ha_action(action))
+
+# Example commands to try
+DEMO_COMMANDS = {
+    "example_commands": [
         "Turn on the living room lights",
         "Set temperature to 72 degrees",
         "Turn off all lights",
@@ -256,20 +459,27 @@ def demo_commands():
         "Is everything secure?",
         "Turn on movie mode",
         "Good night - secure the house"
-    ]
+    ],
+    "usage": {
+        "voice_command": "POST /voice_command with {'command': 'your command'}",
+        "smart_query": "POST /smart_query with {'query': 'your question'}"
+    }
+}
 
-    return jsonify({
-        "example_commands": examples,
-        "usage": {
-            "voice_command": "POST /voice_command with {'command': 'your command'}",
-            "smart_query": "POST /smart_query with {'query': 'your question'}"
-        }
-    })
+@routes.route('/demo_commands')
+def demo_commands(request):
+    """Get example commands to try"""
+    return DEMO_COMMANDS
+
+# Flask serves the shared handlers here; ha_bridge_async.py serves the same ones from Quart
+routes.install(app)
 
 if __name__ == '__main__':
     print("🏠 Home Assistant AI Bridge Starting...")
     print(f"HA URL: {HA_URL}")
     print(f"AI URL: {OLLAMA_URL}")
+    state_store.start()
+    prompts.start()
     print("Bridge ready on port 5001!")
 
     app.run(host='0.0.0.0', port=5001, debug=False)
\ No newline at end of file
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Home Assistant AI Bridge - Async Serving Mode
+The handlers of ha_bridge.py, served from one asyncio event loop so slow
+Ollama and HA calls wait on sockets instead of holding worker threads.
+
+Run with:  python ha_bridge_async.py   or   hypercorn ha_bridge_async:app --bind 0.0.0.0:5001
+"""
+
+import asyncio
+
+from quart import Quart
+from quart_cors import cors
+
+import async_http
+import metrics
+import tracing
+from ha_bridge import HA_URL, OLLAMA_URL, intent_parser, llm_cache, prompts, routes, state_store
+
+app = cors(Quart(__name__), expose_headers=tracing.RESPONSE_HEADERS)
+app.config['RESPONSE_TIMEOUT'] = None  # SSE answers can outlive Quart's 60 s default
+metrics.instrument_async(app, http=async_http, caches={'intent_fast_path': intent_parser, 'llm_response': llm_cache},
+                         prompts=prompts, state_store=state_store)
+tracing.instrument_async(app, 'ha-ai-bridge')
+routes.install_async(app)
+
+@app.before_serving
+async def start_state_store():
+    state_store.start()
+    prompts.start()
+    await asyncio.to_thread(state_store.wait_ready, state_store.load_timeout)
+
+@app.after_serving
+async def close_http_client():
+    await async_http.aclose()
+
+if __name__ == '__main__':
+    print("🏠⚡ Home Assistant AI Bridge (async) Starting...")
+    print(f"HA URL: {HA_URL}")
+    print(f"AI URL: {OLLAMA_URL}")
+    print("Bridge ready on port 5001!")
+
+    app.run(host='0.0.0.0', port=5001, debug=False)
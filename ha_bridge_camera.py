@@ -4,14 +4,33 @@ Enhanced Home Assistant AI Bridge with Voice Camera Control
 Adds camera control capabilities to the existing bridge
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask
 from flask_cors import CORS
-import requests
-import json
+import http_client
 import os
+import time
+
+import bridge_io
+import metrics
+import tracing
+from ha_state_store import HAStateStore
+from intent_parser import IntentParser
+from camera_resolver import CameraResolver, PhraseMatcher
+from frigate_events import DetectionIndex, FrigateSubscriber, parse_presence_question
+from mjpeg_relay import BOUNDARY, MJPEGRelay, RelayError
+from llm_json import ACTION_SCHEMA, ActionStreamParser
+from action_validation import ActionValidator, rejected_result
+from prompt_manager import PromptManager
+from fanout import timed_out
+from llm_scheduler import LLMBusy
+from ollama_client import OllamaError, StreamTimer
+from sse import format_event
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=tracing.RESPONSE_HEADERS)
+
+# Route handlers, shared with the Quart app in ha_bridge_camera_async.py
+routes = bridge_io.Routes()
 
 # Configuration
 HA_URL = os.getenv('HA_URL', 'http://192.168.0.81:8123')
@@ -24,6 +43,19 @@ HA_HEADERS = {
     'Content-Type': 'application/json'
 }
 
+# In-memory mirror of HA entity states, kept current over the WebSocket API
+state_store = HAStateStore(HA_URL, HA_TOKEN)
+
+# Deterministic matcher that answers common commands without the LLM
+intent_parser = IntentParser(state_store)
+
+# Registry checks for model-proposed actions before they reach HA
+action_validator = ActionValidator(state_store, intent_parser.index)
+
+def from_mirror(func, *args):
+    """Mirror reads are in-memory once loaded; until then they may block on a REST load"""
+    return bridge_io.Blocking(func, *args, ready=state_store.is_loaded)
+
 # Camera mappings for your specific Unifi Protect cameras
 CAMERA_MAPPINGS = {
     'front door': 'camera.doorbell_main_entrance_camera_high_resolution_channel',
@@ -57,186 +89,320 @@ CAMERA_NAMES = {
     'camera.garage_camera_high_resolution_channel': 'Garage Camera'
 }
 
-@app.route('/health', methods=['GET'])
-def health():
-    return jsonify({"status": "healthy", "service": "ha-ai-bridge-camera"})
+@routes.route('/health')
+def health(request):
+    return {"status": "healthy", "service": "ha-ai-bridge-camera"}
 
-@app.route('/test_connections', methods=['GET'])
-def test_connections():
-    """Test all connections"""
-    results = {}
+@routes.route('/http_stats')
+def http_stats(request):
+    """Report shared HTTP connection-pool usage"""
+    return (yield bridge_io.http_stats())
 
-    # Test HA connection
+@routes.route('/intent_stats')
+def intent_stats(request):
+    """Report how much LLM traffic the fast-path intent parser removes"""
+    return intent_parser.stats()
+
+def probe_home_assistant():
     try:
-        response = requests.get(f"{HA_URL}/api/", headers=HA_HEADERS, timeout=5)
-        results['home_assistant'] = {
+        response = yield bridge_io.http('GET', f"{HA_URL}/api/", endpoint='ha_api', headers=HA_HEADERS)
+        return {
             'status': 'connected' if response.status_code == 200 else 'auth_error',
             'code': response.status_code
         }
     except Exception as e:
-        results['home_assistant'] = {'status': 'error', 'error': str(e)}
+        return {'status': 'error', 'error': str(e)}
 
-    # Test AI connection
+def probe_ai_service():
     try:
-        response = requests.get(f"{OLLAMA_URL}/api/tags", timeout=5)
+        response = yield bridge_io.http('GET', f"{OLLAMA_URL}/api/tags", endpoint='ollama_tags')
         if response.status_code == 200:
             models = response.json().get('models', [])
-            results['ai_service'] = {
+            return {
                 'status': 'connected',
                 'models_count': len(models),
                 'models': [m['name'] for m in models]
             }
-        else:
-            results['ai_service'] = {'status': 'error', 'code': response.status_code}
+        return {'status': 'error', 'code': response.status_code}
     except Exception as e:
-        results['ai_service'] = {'status': 'error', 'error': str(e)}
-
-    return jsonify(results)
-
-def detect_camera_command(command):
-    """Detect if this is a camera-related command"""
-    camera_keywords = ['show', 'display', 'camera', 'view', 'check', 'see', 'look at', 'watch']
-    command_lower = command.lower()
-
-    return any(keyword in command_lower for keyword in camera_keywords)
+        return {'status': 'error', 'error': str(e)}
 
-def find_camera_entity(command):
-    """Find the camera entity based on voice command"""
-    command_lower = command.lower()
+@routes.route('/llm_stats')
+def llm_stats(request):
+    """Report cold vs. warm model latency, prompt tokens evaluated and reply validation"""
+    return dict(prompts.stats(), validation=action_validator.stats())
 
-    # Check each mapping
-    for keyword, entity in CAMERA_MAPPINGS.items():
-        if keyword in command_lower:
-            return entity, CAMERA_NAMES.get(entity, keyword.title())
+@routes.route('/test_connections')
+def test_connections(request):
+    """Test all connections"""
+    # Both probes run at once; a dead service costs the deadline, not its full timeout
+    results, pending = yield bridge_io.FanOut({'home_assistant': probe_home_assistant(),
+                                               'ai_service': probe_ai_service()})
+    for name in pending:
+        results[name] = timed_out(status='error')
+    return results
+
+# Compiled keyword matchers: one pass over the command, however many cameras exist
+CAMERA_VERBS = PhraseMatcher({keyword: True for keyword in
+                              ['show', 'display', 'camera', 'view', 'check', 'see', 'look at', 'watch']})
+camera_resolver = CameraResolver(CAMERA_MAPPINGS, CAMERA_NAMES, state_store)
+
+# Frigate camera names (frigate-config-udm-optimized.yml) for the HA camera entities
+FRIGATE_CAMERAS = {
+    'camera.doorbell_main_entrance_camera_high_resolution_channel': 'front_doorbell',
+    'camera.front_lt_driveway_camera_high_resolution_channel': 'front_driveway',
+    'camera.back_rt_facing_patio_camera_high_resolution_channel': 'back_patio',
+    'camera.back_lt_facing_road_camera_high_resolution_channel': 'back_left_patio',
+    'camera.garage_camera_high_resolution_channel': 'garage'
+}
 
-    return None, None
+# Recent Frigate detections, fed from MQTT; answers presence questions without the LLM or HA
+detections = DetectionIndex()
+frigate = FrigateSubscriber(detections, cameras=FRIGATE_CAMERAS.values())
 
-@app.route('/voice_command', methods=['POST'])
-def voice_command():
+def detect_camera_command(command):
+    """Detect if this is a camera-related command"""
+    return CAMERA_VERBS.contains_any(command)
+
+def presence_question(command):
+    """Parsed "was anyone at ..." question, once Frigate events are flowing; otherwise None"""
+    if not detections.ready():
+        return None
+    return parse_presence_question(command)
+
+def presence_result(command, question):
+    """Response body for a presence question, answered from the detection index"""
+    match = camera_resolver.resolve(command)
+    camera = FRIGATE_CAMERAS.get(match['entity_id']) if match else None
+    answer = detections.answer(question, camera, match['name'] if match else None)
+    return dict(answer, success=True, command=command, source="frigate",
+                camera_entity=match['entity_id'] if match else None)
+
+@routes.route('/voice_command', methods=['POST'])
+def voice_command(request):
     """Process voice commands for smart home with camera support"""
     try:
         data = request.json
         command = data.get('command', '')
 
         if not command:
-            return jsonify({"error": "No command provided"}), 400
+            return {"error": "No command provided"}, 400
+
+        # Presence questions are answered from recent Frigate detections
+        question = presence_question(command)
+        if question:
+            return (yield from_mirror(presence_result, command, question))
 
         # Check if this is a camera command
         if detect_camera_command(command):
-            return handle_camera_command(command)
+            return (yield from handle_camera_command(command, request.host_url))
         else:
-            return handle_general_command(command)
+            return (yield from handle_general_command(command, request.wants_stream()))
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
-def handle_camera_command(command):
+def handle_camera_command(command, host_url):
     """Handle camera-specific voice commands"""
     try:
         # Find the camera
-        camera_entity, camera_name = find_camera_entity(command)
-
-        if not camera_entity:
-            return jsonify({
-                "success": False,
-                "error": "Camera not found",
-                "available_cameras": list(CAMERA_NAMES.values()),
-                "command": command
-            })
+        match = yield from_mirror(camera_resolver.resolve, command)
 
-        # Get camera snapshot/stream
-        snapshot_url = f"{HA_URL}/api/camera_proxy/{camera_entity}"
+        if not match:
+            return (yield from_mirror(camera_not_found, command))
 
         # Test if camera is accessible
         try:
-            test_response = requests.get(snapshot_url, headers=HA_HEADERS, timeout=5)
+            test_response = yield bridge_io.http('GET', snapshot_url(match['entity_id']), endpoint='ha_camera',
+                                                 headers=HA_HEADERS)
             camera_accessible = test_response.status_code == 200
-        except:
+        except Exception:
             camera_accessible = False
 
-        return jsonify({
-            "success": True,
-            "command": command,
-            "camera_entity": camera_entity,
-            "camera_name": camera_name,
-            "camera_accessible": camera_accessible,
-            "snapshot_url": snapshot_url if camera_accessible else None,
-            "stream_url": f"{HA_URL}/api/camera_proxy_stream/{camera_entity}",
-            "response": f"Displaying {camera_name}. Camera is {'online' if camera_accessible else 'offline'}."
-        })
+        return camera_result(command, match, camera_accessible, host_url)
 
     except Exception as e:
-        return jsonify({
+        return {
             "success": False,
             "error": str(e),
             "command": command
-        })
+        }
 
-def handle_general_command(command):
-    """Handle general smart home commands (original functionality)"""
+def snapshot_url(camera_entity):
+    return f"{HA_URL}/api/camera_proxy/{camera_entity}"
+
+def camera_not_found(command):
+    return {
+        "success": False,
+        "error": "Camera not found",
+        "available_cameras": list(camera_resolver.camera_names().values()),
+        "command": command
+    }
+
+def camera_result(command, match, camera_accessible, stream_base=None):
+    """Response body for a resolved camera command; stream_base is this bridge's URL, for the relayed stream"""
+    camera_entity, camera_name = match['entity_id'], match['name']
+    return {
+        "success": True,
+        "command": command,
+        "camera_entity": camera_entity,
+        "camera_name": camera_name,
+        "camera_accessible": camera_accessible,
+        "snapshot_url": snapshot_url(camera_entity) if camera_accessible else None,
+        "stream_url": (f"{stream_base}camera_stream/{camera_entity}" if stream_base
+                       else f"{HA_URL}/api/camera_proxy_stream/{camera_entity}"),
+        "match": {key: match[key] for key in ('keyword', 'confidence', 'ambiguous', 'alternatives')},
+        "response": f"Displaying {camera_name}. Camera is {'online' if camera_accessible else 'offline'}."
+    }
+
+# Fixed system prompt: identical on every call, so Ollama reuses its KV cache
+COMMAND_SYSTEM_PROMPT = 'Convert each command to JSON. Use format: {"domain":"light","service":"turn_on","entity_id":"light.kitchen_lights_light_1"}'
+
+prompts = PromptManager(OLLAMA_URL)
+prompts.register('command', COMMAND_SYSTEM_PROMPT, schema=ACTION_SCHEMA, priority='voice', tier='small')
+
+# Request counters, per-stage latency histograms and component gauges on /metrics
+metrics.instrument(app, http=http_client, caches={'intent_fast_path': intent_parser},
+                   prompts=prompts, state_store=state_store)
+tracing.instrument(app, 'ha-ai-bridge-camera')
+
+def build_command_prompt(command):
+    """User message for a command; the instructions live in COMMAND_SYSTEM_PROMPT"""
+    return command
+
+def handle_general_command(command, stream=False):
+    """Handle general smart home commands (original functionality); stream asks for Server-Sent Events"""
     try:
-        # Simplified AI prompt for faster response
-        prompt = f'Convert to JSON: {command}. Use format: {{\"domain\":\"light\",\"service\":\"turn_on\",\"entity_id\":\"light.kitchen_lights_light_1\"}}'
+        # Common commands resolve against the entity registry without the LLM
+        plan = yield from_mirror(intent_parser.parse, command)
+        if plan and len(plan['actions']) == 1:
+            action = plan['actions'][0]
+            result = yield from execute_ha_action(action)
+            response = {
+                "success": True,
+                "command": command,
+                "ai_interpretation": action,
+                "execution_result": result,
+                "response": plan['response'],
+                "source": "fast_path"
+            }
+            if stream:
+                return bridge_io.Stream(format_event('action', {"action": action, "result": result}) +
+                                        format_event('done', response))
+            return response
+
+        prompt = build_command_prompt(command)
+
+        if stream:
+            return bridge_io.Stream(stream_general_command(command, prompt))
 
         # Ask AI what to do
-        ai_response = requests.post(f"{OLLAMA_URL}/api/generate",
-                                   json={
-                                       "model": "dolphin-llama3:latest",
-                                       "prompt": prompt,
-                                       "stream": False
-                                   }, timeout=15)
-
-        if ai_response.status_code == 200:
-            ai_result = ai_response.json().get('response', '')
-
-            try:
-                # Parse AI response
-                action = json.loads(ai_result)
-
-                # Execute the action
-                result = execute_ha_action(action)
-
-                return jsonify({
-                    "success": True,
-                    "command": command,
-                    "ai_interpretation": action,
-                    "execution_result": result,
-                    "response": f"Executed {action.get('domain', 'unknown')}.{action.get('service', 'unknown')}"
-                })
-
-            except json.JSONDecodeError:
-                return jsonify({
-                    "success": False,
-                    "error": "AI response was not valid JSON",
-                    "ai_response": ai_result
-                })
-        else:
-            return jsonify({"error": "AI service unavailable"}), 500
+        try:
+            ai_result = yield bridge_io.chat(prompts, 'command', prompt, endpoint='ollama_command')
+        except LLMBusy as e:
+            return {"error": "AI service busy", "detail": str(e)}, 503, {'Retry-After': str(e.retry_after)}
+        except OllamaError:
+            return {"error": "AI service unavailable"}, 500
+
+        # Parse AI response, repairing fences or truncation rather than re-asking the model
+        action = action_validator.parse(ai_result)
+        if action is None:
+            return {
+                "success": False,
+                "error": "AI response was not valid JSON",
+                "ai_response": ai_result
+            }
+
+        # Execute the action once the registry confirms it
+        action, result = yield from dispatch_llm_action(action)
+
+        return {
+            "success": True,
+            "command": command,
+            "ai_interpretation": action,
+            "execution_result": result,
+            "response": f"Executed {action.get('domain', 'unknown')}.{action.get('service', 'unknown')}",
+            "source": "llm"
+        }
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
+def stream_general_command(command, prompt):
+    """Relay model tokens over SSE and execute the action the moment its JSON object closes"""
+    timer = StreamTimer()
+    parser = ActionStreamParser()
+    action, result = None, None
+
+    try:
+        tokens = yield bridge_io.stream_chat(prompts, 'command', prompt, endpoint='ollama_command')
+        while True:
+            token = yield bridge_io.Next(tokens)
+            if token is None:
+                break
+            timer.token()
+            yield format_event('token', {"text": token})
+
+            for parsed in parser.feed(token):
+                timer.action()
+                action, result = yield from dispatch_llm_action(parsed)
+                yield format_event('action', {"action": action, "result": result,
+                                              "elapsed_ms": timer.elapsed_ms()})
+
+        # A reply cut off before its object closed may still be repairable
+        document = action_validator.parse(parser.text)
+        if action is None and document is not None and 'domain' in document:
+            timer.action()
+            action, result = yield from dispatch_llm_action(document)
+            yield format_event('action', {"action": action, "result": result,
+                                          "elapsed_ms": timer.elapsed_ms()})
+
+        if action is None:
+            yield format_event('done', {
+                "success": False,
+                "error": "AI response was not valid JSON",
+                "ai_response": parser.text,
+                "timing": timer.summary()
+            })
+            return
 
-@app.route('/camera_command', methods=['POST'])
-def camera_command():
+        yield format_event('done', {
+            "success": True,
+            "command": command,
+            "ai_interpretation": action,
+            "execution_result": result,
+            "response": f"Executed {action.get('domain', 'unknown')}.{action.get('service', 'unknown')}",
+            "source": "llm",
+            "timing": timer.summary()
+        })
+
+    except Exception as e:
+        yield format_event('error', {"error": str(e), "timing": timer.summary()})
+
+@routes.route('/camera_command', methods=['POST'])
+def camera_command(request):
     """Dedicated camera command endpoint"""
     try:
         data = request.json
         command = data.get('command', '')
 
         if not command:
-            return jsonify({"error": "No command provided"}), 400
+            return {"error": "No command provided"}, 400
 
-        return handle_camera_command(command)
+        return (yield from handle_camera_command(command, request.host_url))
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
-@app.route('/list_cameras', methods=['GET'])
-def list_cameras():
+@routes.route('/list_cameras')
+def list_cameras(request):
     """List all available cameras"""
-    return jsonify({
-        "cameras": CAMERA_NAMES,
-        "camera_keywords": list(CAMERA_MAPPINGS.keys()),
+    return (yield from_mirror(camera_catalog))
+
+def camera_catalog():
+    return {
+        "cameras": camera_resolver.camera_names(),
+        "camera_keywords": list(camera_resolver.keywords()),
         "example_commands": [
             "Show me the front door",
             "Check the driveway camera",
@@ -244,52 +410,146 @@ def list_cameras():
             "Look at the backyard",
             "View the road camera"
         ]
-    })
+    }
+
+# /camera_status answers from the state mirror while it is at most this many seconds old
+CAMERA_STATUS_MAX_AGE = float(os.getenv('CAMERA_STATUS_MAX_AGE', '30'))
+
+def camera_state_status(entity, state):
+    """Status entry for one camera from its HA state object"""
+    if state is None:
+        return {"entity_id": entity, "accessible": False, "error": "Entity not found"}
+    return {
+        "entity_id": entity,
+        "state": state.get('state', 'unknown'),
+        "accessible": True,
+        "snapshot_url": snapshot_url(entity)
+    }
+
+def probe_camera(entity):
+    """Fetch one camera's state straight from HA"""
+    try:
+        state_response = yield bridge_io.http('GET', f"{HA_URL}/api/states/{entity}", endpoint='ha_states',
+                                              headers=HA_HEADERS)
+        if state_response.status_code == 200:
+            return camera_state_status(entity, state_response.json())
+        return {
+            "entity_id": entity,
+            "accessible": False,
+            "error": f"HTTP {state_response.status_code}"
+        }
+    except Exception as e:
+        return {
+            "entity_id": entity,
+            "accessible": False,
+            "error": str(e)
+        }
 
-@app.route('/camera_status', methods=['GET'])
-def camera_status():
+def mirrored_camera_status():
+    """Camera statuses from the state mirror, or None when it is missing or too stale to trust"""
+    if not state_store.is_loaded():
+        return None
+    freshness = state_store.freshness()
+    if freshness['age_seconds'] is None or freshness['age_seconds'] > CAMERA_STATUS_MAX_AGE:
+        return None
+    statuses = {entity: camera_state_status(entity, state_store.get(entity)) for entity in CAMERA_NAMES}
+    return camera_status_result(statuses, 'state_store', freshness)
+
+def camera_status_result(statuses, source, freshness, pending=()):
+    """Response body for /camera_status; cameras that missed the deadline are marked timed out"""
+    camera_statuses = {}
+    for entity, name in CAMERA_NAMES.items():
+        camera_statuses[name] = timed_out(entity_id=entity, accessible=False) if entity in pending \
+            else statuses[entity]
+    return {
+        "camera_statuses": camera_statuses,
+        "total_cameras": len(CAMERA_NAMES),
+        "source": source,
+        "freshness": freshness,
+        "complete": not pending
+    }
+
+def probe_freshness():
+    return {"live": True, "as_of": time.time(), "age_seconds": 0.0}
+
+def detection_query(args):
+    """Keyword arguments for DetectionIndex.query from request args"""
+    return {
+        "camera": args.get('camera'),
+        "label": args.get('label'),
+        "since": float(args['since']) if args.get('since') else None,
+        "limit": min(int(args.get('limit', 20)), 200)
+    }
+
+@routes.route('/detections')
+def recent_detections(request):
+    """Recent Frigate detections, newest first; filter by Frigate camera, object label or time"""
+    try:
+        return {"detections": detections.query(**detection_query(request.args))}
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+@routes.route('/frigate_stats')
+def frigate_stats(request):
+    """Report MQTT connection state and detection index counters"""
+    return frigate.stats()
+
+def open_camera_stream(entity_id):
+    """Streaming response for HA's MJPEG proxy of one camera"""
+    response = http_client.get(f"{HA_URL}/api/camera_proxy_stream/{entity_id}", endpoint='ha_camera_stream',
+                               headers=HA_HEADERS, stream=True)
+    if response.status_code != 200:
+        response.close()
+        raise RelayError(f"camera_proxy_stream returned {response.status_code}")
+    return response
+
+# One upstream MJPEG connection per camera, shared by every viewer of /camera_stream
+relay = MJPEGRelay(open_camera_stream)
+STREAM_MIMETYPE = f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+STREAM_HEADERS = {"Cache-Control": "no-cache, no-store", "X-Accel-Buffering": "no"}
+
+def stream_entity(camera):
+    """Camera entity for a /camera_stream path segment: an entity id or a spoken camera name"""
+    if camera in CAMERA_NAMES:
+        return camera
+    match = camera_resolver.resolve(camera.replace('_', ' '))
+    return match['entity_id'] if match else None
+
+@routes.route('/camera_stream/<camera>')
+def camera_stream(request, camera):
+    """Live MJPEG for one camera, relayed from a single shared connection to Home Assistant"""
+    entity_id = yield from_mirror(stream_entity, camera)
+    if entity_id is None:
+        return (yield from_mirror(camera_not_found, camera)), 404
+    return bridge_io.Stream(relay_frames(entity_id), mimetype=STREAM_MIMETYPE, headers=STREAM_HEADERS)
+
+def relay_frames(entity_id):
+    """One viewer's multipart sections from the relay"""
+    frames = yield bridge_io.Iterate(relay.frames, relay.frames_async, entity_id)
+    while True:
+        frame = yield bridge_io.Next(frames)
+        if frame is None:
+            return
+        yield frame
+
+@routes.route('/relay_stats')
+def relay_stats(request):
+    """Report open upstream streams, viewers and dropped frames"""
+    return relay.stats()
+
+@routes.route('/camera_status')
+def camera_status(request):
     """Check status of all cameras"""
     try:
-        camera_statuses = {}
-
-        for entity, name in CAMERA_NAMES.items():
-            try:
-                # Check camera state
-                state_response = requests.get(
-                    f"{HA_URL}/api/states/{entity}",
-                    headers=HA_HEADERS,
-                    timeout=5
-                )
-
-                if state_response.status_code == 200:
-                    state_data = state_response.json()
-                    camera_statuses[name] = {
-                        "entity_id": entity,
-                        "state": state_data.get('state', 'unknown'),
-                        "accessible": True,
-                        "snapshot_url": f"{HA_URL}/api/camera_proxy/{entity}"
-                    }
-                else:
-                    camera_statuses[name] = {
-                        "entity_id": entity,
-                        "accessible": False,
-                        "error": f"HTTP {state_response.status_code}"
-                    }
-
-            except Exception as e:
-                camera_statuses[name] = {
-                    "entity_id": entity,
-                    "accessible": False,
-                    "error": str(e)
-                }
-
-        return jsonify({
-            "camera_statuses": camera_statuses,
-            "total_cameras": len(CAMERA_NAMES)
-        })
+        # The mirror answers without touching HA; probe live only when it is stale
+        result = mirrored_camera_status()
+        if result is None:
+            statuses, pending = yield bridge_io.FanOut({entity: probe_camera(entity) for entity in CAMERA_NAMES})
+            result = camera_status_result(statuses, 'live_probe', probe_freshness(), pending)
+        return result
 
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
 
 def execute_ha_action(action):
     """Execute a Home Assistant action"""
@@ -297,13 +557,15 @@ def execute_ha_action(action):
         domain = action.get('domain')
         service = action.get('service')
         entity_id = action.get('entity_id')
-        service_data = action.get('service_data', {})
+        service_data = dict(action.get('service_data') or {})
 
         if entity_id:
             service_data['entity_id'] = entity_id
 
         url = f"{HA_URL}/api/services/{domain}/{service}"
-        response = requests.post(url, headers=HA_HEADERS, json=service_data, timeout=10)
+        with tracing.span('execute_ha_action', action=f"{domain}.{service}", entity=str(entity_id)):
+            response = yield bridge_io.http('POST', url, endpoint='ha_service', headers=HA_HEADERS,
+                                            json=service_data)
 
         return {
             "success": response.status_code == 200,
@@ -315,10 +577,23 @@ def execute_ha_action(action):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+def dispatch_llm_action(action):
+    """Validate one model-proposed action and execute it if it passes; returns (checked action, result)"""
+    action, error = yield from_mirror(action_validator.check, action)
+    if error is not None:
+        return action, rejected_result(action, error)
+    return action, (yield from execute_ha_action(action))
+
+# Flask serves the shared handlers here; ha_bridge_camera_async.py serves the same ones from Quart
+routes.install(app)
+
 if __name__ == '__main__':
     print("🏠📹 Home Assistant AI Bridge with Camera Control Starting...")
     print(f"HA URL: {HA_URL}")
     print(f"AI URL: {OLLAMA_URL}")
+    state_store.start()
+    prompts.start()
+    frigate.start()
     print(f"Available Cameras: {len(CAMERA_NAMES)}")
     for name in CAMERA_NAMES.values():
         print(f"   - {name}")
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Home Assistant AI Bridge with Voice Camera Control - Async Serving Mode
+The handlers of ha_bridge_camera.py, served from one asyncio event loop so
+camera probes and Ollama calls wait on sockets, not worker threads.
+
+Run with:  python ha_bridge_camera_async.py   or   hypercorn ha_bridge_camera_async:app --bind 0.0.0.0:5002
+"""
+
+import asyncio
+
+from quart import Quart
+from quart_cors import cors
+
+import async_http
+import metrics
+import tracing
+from ha_bridge_camera import CAMERA_NAMES, HA_URL, OLLAMA_URL, frigate, intent_parser, prompts, routes, state_store
+
+app = cors(Quart(__name__), expose_headers=tracing.RESPONSE_HEADERS)
+app.config['RESPONSE_TIMEOUT'] = None  # SSE answers can outlive Quart's 60 s default
+metrics.instrument_async(app, http=async_http, caches={'intent_fast_path': intent_parser},
+                         prompts=prompts, state_store=state_store)
+tracing.instrument_async(app, 'ha-ai-bridge-camera')
+routes.install_async(app)
+
+@app.before_serving
+async def start_state_store():
+    state_store.start()
+    prompts.start()
+    frigate.start()
+    await asyncio.to_thread(state_store.wait_ready, state_store.load_timeout)
+
+@app.after_serving
+async def close_http_client():
+    await async_http.aclose()
+
+if __name__ == '__main__':
+    print("🏠📹⚡ Home Assistant AI Bridge with Camera Control (async) Starting...")
+    print(f"HA URL: {HA_URL}")
+    print(f"AI URL: {OLLAMA_URL}")
+    print(f"Available Cameras: {len(CAMERA_NAMES)}")
+    for name in CAMERA_NAMES.values():
+        print(f"   - {name}")
+    print("Bridge ready on port 5002!")
+
+    app.run(host='0.0.0.0', port=5002, debug=False)
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Home Assistant Entity-State Mirror
+Loads /api/states once, then keeps an in-memory copy current by following
+state_changed events over the Home Assistant WebSocket API
+"""
+
+import json
+import os
+import threading
+import time
+
+import http_client
+import websocket
+
+# Configuration
+HA_URL = os.getenv('HA_URL', 'http://192.168.0.81:8123')
+HA_TOKEN = os.getenv('HA_TOKEN', 'your_token_here')
+RECONNECT_DELAY = float(os.getenv('HA_WS_RECONNECT_DELAY', '5'))
+HEARTBEAT_INTERVAL = float(os.getenv('HA_WS_HEARTBEAT', '30'))
+
+
+def websocket_url(ha_url):
+    """Derive the HA WebSocket endpoint from the REST base URL"""
+    if ha_url.startswith('https://'):
+        base = 'wss://' + ha_url[len('https://'):]
+    elif ha_url.startswith('http://'):
+        base = 'ws://' + ha_url[len('http://'):]
+    else:
+        base = ha_url
+    return base.rstrip('/') + '/api/websocket'
+
+
+class HAStateStore:
+    """Long-lived mirror of every HA entity state, updated from the event stream"""
+
+    def __init__(self, ha_url=HA_URL, token=HA_TOKEN, reconnect_delay=RECONNECT_DELAY,
+                 heartbeat_interval=HEARTBEAT_INTERVAL, load_timeout=10):
+        self.ha_url = ha_url.rstrip('/')
+        self.ws_url = websocket_url(self.ha_url)
+        self.token = token
+        self.reconnect_delay = reconnect_delay
+        self.heartbeat_interval = heartbeat_interval
+        self.load_timeout = load_timeout
+
+        self._states = {}
+        self._areas = {}
+        self._services = {}  # domain -> set of service names
+        self._lock = threading.RLock()
+        self._loaded = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._ws = None
+        self._listeners = []
+        self._message_id = 0
+
+        self.connected = False
+        self.resync_count = 0
+        self.event_count = 0
+        self.last_event_at = None
+        self.last_resync_at = None
+        self.disconnected_at = None
+        self.last_error = None
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the background subscriber thread (idempotent)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='ha-state-store', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the subscriber and close the WebSocket"""
+        self._stopped.set()
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:
+                pass
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def wait_ready(self, timeout=None):
+        """Block until the initial /api/states load has completed"""
+        return self._loaded.wait(timeout)
+
+    def is_loaded(self):
+        """True once the mirror holds data; never blocks"""
+        return self._loaded.is_set()
+
+    def _ensure_loaded(self):
+        """Make sure the mirror has data, loading it over REST if the stream is not up yet"""
+        if self._loaded.is_set():
+            return
+        self.start()
+        if not self._loaded.wait(self.load_timeout):
+            self.resync()
+
+    # ------------------------------------------------------------------
+    # Reads (served entirely from memory)
+    # ------------------------------------------------------------------
+
+    def get(self, entity_id):
+        """Return the state object for one entity, or None"""
+        self._ensure_loaded()
+        with self._lock:
+            return self._states.get(entity_id)
+
+    def all_states(self):
+        """Return every state object, in the same shape as GET /api/states"""
+        self._ensure_loaded()
+        with self._lock:
+            return list(self._states.values())
+
+    def states_by_domain(self, domains):
+        """Return state objects whose entity_id belongs to one of the given domains"""
+        prefixes = tuple(f"{domain}." for domain in domains)
+        return [state for state in self.all_states() if state.get('entity_id', '').startswith(prefixes)]
+
+    def entity_ids(self):
+        """Return the set of entity_ids currently known to HA"""
+        self._ensure_loaded()
+        with self._lock:
+            return set(self._states)
+
+    def area_of(self, entity_id):
+        """Return the area name HA assigns to an entity (directly or via its device), or None"""
+        with self._lock:
+            return self._areas.get(entity_id)
+
+    def services(self):
+        """Return {domain: set of services} HA offers; empty until the WebSocket has loaded it"""
+        with self._lock:
+            return self._services
+
+    def add_listener(self, callback):
+        """Register callback(entity_id, old_state, new_state), called on every applied change"""
+        self._listeners.append(callback)
+
+    def stats(self):
+        """Return mirror health counters"""
+        with self._lock:
+            entity_count = len(self._states)
+            area_count = len(set(self._areas.values()))
+            service_domains = len(self._services)
+        return {
+            "connected": self.connected,
+            "loaded": self._loaded.is_set(),
+            "entities": entity_count,
+            "areas": area_count,
+            "service_domains": service_domains,
+            "events_applied": self.event_count,
+            "resyncs": self.resync_count,
+            "last_event_at": self.last_event_at,
+            "last_resync_at": self.last_resync_at,
+            "last_error": self.last_error
+        }
+
+    def freshness(self):
+        """How current the mirror is: live while the event stream is up, else as of the last update"""
+        now = time.time()
+        if self.connected:
+            as_of = now
+        else:
+            as_of = max(filter(None, (self.disconnected_at, self.last_resync_at)), default=None)
+        return {
+            "live": self.connected,
+            "as_of": as_of,
+            "age_seconds": round(now - as_of, 3) if as_of is not None else None
+        }
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def resync(self):
+        """Replace the mirror with a fresh GET /api/states snapshot"""
+        response = http_client.get(f"{self.ha_url}/api/states", endpoint='ha_states', headers=self._headers())
+        response.raise_for_status()
+        fresh = {state['entity_id']: state for state in response.json() if 'entity_id' in state}
+
+        with self._lock:
+            previous = self._states
+            self._states = fresh
+            self.resync_count += 1
+            self.last_resync_at = time.time()
+        self._loaded.set()
+
+        # Report entities that appeared, changed or vanished while we were disconnected
+        for entity_id in set(previous) | set(fresh):
+            old_state = previous.get(entity_id)
+            new_state = fresh.get(entity_id)
+            if old_state != new_state:
+                self._notify(entity_id, old_state, new_state)
+
+    def apply_event(self, event):
+        """Apply one state_changed event payload to the mirror"""
+        data = event.get('data', {})
+        entity_id = data.get('entity_id')
+        if not entity_id:
+            return
+
+        new_state = data.get('new_state')
+        with self._lock:
+            old_state = self._states.get(entity_id)
+            if new_state is None:
+                self._states.pop(entity_id, None)
+            else:
+                # Events queued during a resync can be older than the snapshot
+                if old_state and new_state.get('last_updated', '') < old_state.get('last_updated', ''):
+                    return
+                self._states[entity_id] = new_state
+            self.event_count += 1
+            self.last_event_at = time.time()
+
+        self._notify(entity_id, old_state, new_state)
+
+    def _notify(self, entity_id, old_state, new_state):
+        for callback in list(self._listeners):
+            try:
+                callback(entity_id, old_state, new_state)
+            except Exception as e:
+                self.last_error = f"listener: {e}"
+
+    # ------------------------------------------------------------------
+    # WebSocket subscriber
+    # ------------------------------------------------------------------
+
+    def _headers(self):
+        return {
+            'Authorization': f'Bearer {self.token}',
+            'Content-Type': 'application/json'
+        }
+
+    def _next_id(self):
+        self._message_id += 1
+        return self._message_id
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._connect_and_follow()
+            except Exception as e:
+                self.last_error = str(e)
+            finally:
+                if self.connected:
+                    self.disconnected_at = time.time()
+                self.connected = False
+                ws, self._ws = self._ws, None
+                if ws is not None:
+                    try:
+                        ws.close()
+                    except Exception:
+                        pass
+            self._stopped.wait(self.reconnect_delay)
+
+    def _connect_and_follow(self):
+        ws = websocket.create_connection(self.ws_url, timeout=10)
+        self._ws = ws
+        self._message_id = 0
+
+        # Authentication handshake
+        message = json.loads(ws.recv())
+        if message.get('type') == 'auth_required':
+            ws.send(json.dumps({"type": "auth", "access_token": self.token}))
+            message = json.loads(ws.recv())
+        if message.get('type') != 'auth_ok':
+            raise RuntimeError(f"WebSocket auth failed: {message.get('message', message.get('type'))}")
+
+        self._load_registries(ws)
+        self._load_services(ws)
+
+        # Subscribe first, then snapshot, so no change can fall between the two
+        subscription_id = self._next_id()
+        ws.send(json.dumps({"id": subscription_id, "type": "subscribe_events", "event_type": "state_changed"}))
+        self.resync()
+        self.connected = True
+        self.last_error = None
+
+        ws.settimeout(self.heartbeat_interval)
+        awaiting_pong = False
+        while not self._stopped.is_set():
+            try:
+                raw = ws.recv()
+            except websocket.WebSocketTimeoutException:
+                if awaiting_pong:
+                    raise RuntimeError("WebSocket heartbeat timed out")
+                ws.send(json.dumps({"id": self._next_id(), "type": "ping"}))
+                awaiting_pong = True
+                continue
+
+            if not raw:
+                raise RuntimeError("WebSocket closed by Home Assistant")
+            awaiting_pong = False
+
+            message = json.loads(raw)
+            if message.get('type') == 'event' and message.get('id') == subscription_id:
+                self.apply_event(message.get('event', {}))
+            elif message.get('type') == 'result' and message.get('id') == subscription_id:
+                if not message.get('success', False):
+                    raise RuntimeError(f"subscribe_events failed: {message.get('error')}")
+
+    def _command(self, ws, message_type):
+        """Send one request/response WebSocket command and return its result"""
+        message_id = self._next_id()
+        ws.send(json.dumps({"id": message_id, "type": message_type}))
+        while True:
+            reply = json.loads(ws.recv())
+            if reply.get('id') == message_id and reply.get('type') == 'result':
+                if not reply.get('success', False):
+                    raise RuntimeError(f"{message_type} failed: {reply.get('error')}")
+                return reply.get('result') or []
+
+    def _load_registries(self, ws):
+        """Map entity_ids to area names using HA's area, device and entity registries"""
+        try:
+            areas = {area['area_id']: area.get('name') or area['area_id']
+                     for area in self._command(ws, 'config/area_registry/list')}
+            device_areas = {device['id']: device.get('area_id')
+                            for device in self._command(ws, 'config/device_registry/list')}
+            entries = self._command(ws, 'config/entity_registry/list')
+        except RuntimeError as e:
+            # Registry commands need an admin token; the mirror still works without areas
+            self.last_error = str(e)
+            return
+
+        entity_areas = {}
+        for entry in entries:
+            area_id = entry.get('area_id') or device_areas.get(entry.get('device_id'))
+            if area_id in areas:
+                entity_areas[entry['entity_id']] = areas[area_id]
+        with self._lock:
+            self._areas = entity_areas
+
+    def _load_services(self, ws):
+        """Record which services each domain offers, for validating model-proposed actions"""
+        try:
+            services = self._command(ws, 'get_services') or {}
+        except RuntimeError as e:
+            self.last_error = str(e)
+            return
+        with self._lock:
+            self._services = {domain: set(names) for domain, names in services.items()}
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Smart-Query Context Builder
+Ranks mirrored entities by relevance to the question (name, area, domain and
+topic words) and packs the best ones into a compact one-line-per-domain
+encoding that fits a token budget, instead of dumping the first 50 states.
+"""
+
+import math
+import os
+import threading
+
+from intent_parser import DOMAIN_WORDS, EntityIndex, normalize, tokens
+
+# Configuration
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '600'))
+CHARS_PER_TOKEN = 4  # rough size of an LLM token in English text
+
+# Question words that point at a kind of entity rather than at a name.
+# Tags are "<domain>" or "<domain>:<device_class>".
+TOPIC_WORDS = {
+    'temperature': ('climate', 'sensor:temperature', 'weather'),
+    'temp': ('climate', 'sensor:temperature'),
+    'warm': ('climate', 'sensor:temperature'), 'cold': ('climate', 'sensor:temperature'),
+    'hot': ('climate', 'sensor:temperature'), 'degree': ('climate', 'sensor:temperature'),
+    'humidity': ('sensor:humidity',), 'humid': ('sensor:humidity',),
+    'secure': ('lock', 'alarm_control_panel', 'binary_sensor:door', 'binary_sensor:window',
+               'binary_sensor:garage_door', 'cover:garage'),
+    'security': ('lock', 'alarm_control_panel', 'binary_sensor:door', 'binary_sensor:window', 'camera'),
+    'locked': ('lock',), 'unlocked': ('lock',),
+    'open': ('binary_sensor:door', 'binary_sensor:window', 'binary_sensor:garage_door', 'cover'),
+    'closed': ('binary_sensor:door', 'binary_sensor:window', 'binary_sensor:garage_door', 'cover'),
+    'door': ('binary_sensor:door', 'binary_sensor:garage_door', 'lock', 'cover:garage'),
+    'window': ('binary_sensor:window', 'cover'),
+    'motion': ('binary_sensor:motion', 'binary_sensor:occupancy'),
+    'anyone': ('person', 'binary_sensor:occupancy', 'binary_sensor:motion'),
+    'who': ('person',), 'away': ('person',),
+    'energy': ('sensor:energy', 'sensor:power'), 'power': ('sensor:power', 'sensor:energy'),
+    'usage': ('sensor:energy', 'sensor:power'), 'battery': ('sensor:battery',),
+    'playing': ('media_player',), 'music': ('media_player',), 'watching': ('media_player',),
+    'weather': ('weather',), 'outside': ('weather', 'sensor:temperature'), 'rain': ('weather',),
+}
+
+# Domains worth mentioning even when the question names nothing in particular
+DOMAIN_PRIORITY = {
+    'climate': 3, 'lock': 3, 'alarm_control_panel': 3,
+    'light': 2, 'cover': 2, 'media_player': 2, 'person': 2,
+    'switch': 1, 'fan': 1, 'binary_sensor': 1, 'weather': 1,
+    'sensor': 0.5, 'camera': 0.5,
+}
+
+ACTIVE_STATES = {'on', 'open', 'unlocked', 'playing', 'home', 'heat', 'cool', 'heat_cool', 'detected'}
+DEAD_STATES = {'unknown', 'unavailable'}
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def describe(state):
+    """Compact value for one entity: its state plus the one or two attributes that matter"""
+    domain = state['entity_id'].split('.', 1)[0]
+    value = state.get('state', '')
+    attributes = state.get('attributes', {})
+    if domain == 'sensor' and attributes.get('unit_of_measurement'):
+        return f"{value}{attributes['unit_of_measurement']}"
+    if domain == 'climate':
+        parts = [value]
+        if attributes.get('current_temperature') is not None:
+            parts.append(f"now {attributes['current_temperature']}")
+        if attributes.get('temperature') is not None:
+            parts.append(f"set {attributes['temperature']}")
+        return ' '.join(parts)
+    if domain == 'light' and value == 'on' and attributes.get('brightness') is not None:
+        return f"on {round(attributes['brightness'] / 255 * 100)}%"
+    if domain == 'cover' and attributes.get('current_position') is not None:
+        return f"{value} {attributes['current_position']}%"
+    if domain == 'media_player' and attributes.get('media_title'):
+        return f"{value} '{attributes['media_title']}'"
+    return value
+
+
+class HomeContextBuilder:
+    """Inverted index over the entity registry, rebuilt when entities change"""
+
+    def __init__(self, state_store, token_budget=CONTEXT_TOKEN_BUDGET):
+        self.state_store = state_store
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._resync = None
+        self._entries = []
+        self._by_token = {}   # name/area token -> entry indices
+        self._by_tag = {}     # domain and domain:device_class -> entry indices
+        self._baseline = []   # entries of priority domains, for open-ended questions
+        self.counters = {"builds": 0, "index_rebuilds": 0, "tokens_total": 0, "entities_total": 0}
+        state_store.add_listener(self._on_state_changed)
+
+    def _on_state_changed(self, entity_id, old_state, new_state):
+        # Values are read live at build time; only additions, removals and renames touch the index
+        if old_state is None or new_state is None or \
+                old_state.get('attributes', {}).get('friendly_name') != new_state.get('attributes', {}).get('friendly_name'):
+            self._dirty = True
+
+    def _index(self):
+        resync = getattr(self.state_store, 'resync_count', None)
+        with self._lock:
+            if not self._dirty and self._resync == resync and self._entries:
+                return
+            self._dirty = False
+            self._resync = resync
+            states = self.state_store.all_states()
+            entries = EntityIndex(states, self.state_store.area_of).entries
+            device_classes = {state['entity_id']: state.get('attributes', {}).get('device_class')
+                              for state in states if 'entity_id' in state}
+            by_token, by_tag = {}, {}
+            for index, entry in enumerate(entries):
+                entry["tags"] = {entry['domain']}
+                if device_classes.get(entry['entity_id']):
+                    entry["tags"].add(f"{entry['domain']}:{device_classes[entry['entity_id']]}")
+                for token in entry['name_tokens'] | entry['area_tokens']:
+                    by_token.setdefault(token, set()).add(index)
+                for tag in entry["tags"]:
+                    by_tag.setdefault(tag, set()).add(index)
+            self._entries, self._by_token, self._by_tag = entries, by_token, by_tag
+            self._baseline = [i for i, entry in enumerate(entries) if DOMAIN_PRIORITY.get(entry['domain'], 0) >= 1]
+            self.counters["index_rebuilds"] += 1
+
+    # ------------------------------------------------------------------
+    # Ranking
+    # ------------------------------------------------------------------
+
+    def rank(self, query):
+        """Return (score, entry, state) for relevant entities, best first.
+
+        When the question matches anything by name, area or topic only those
+        matches are returned; open-ended questions get the priority domains.
+        """
+        self._index()
+        query_tokens = tokens(query)
+        topics = set()
+        for word in normalize(query).split():
+            if word in DOMAIN_WORDS:
+                topics.add(DOMAIN_WORDS[word])
+            topics.update(TOPIC_WORDS.get(word, ()))
+        for token in query_tokens:
+            topics.update(TOPIC_WORDS.get(token, ()))
+
+        candidates = set(self._baseline)
+        for token in query_tokens:
+            candidates |= self._by_token.get(token, set())
+        for topic in topics:
+            candidates |= self._by_tag.get(topic, set())
+
+        ranked = []
+        for index in candidates:
+            entry = self._entries[index]
+            state = self.state_store.get(entry['entity_id'])
+            if state is None:
+                continue
+            relevance = 3 * len(query_tokens & entry['name_tokens']) + 2 * len(query_tokens & entry['area_tokens'])
+            relevance += 2.5 * bool(entry['tags'] & topics)
+            score = relevance + 0.5 * DOMAIN_PRIORITY.get(entry['domain'], 0)
+            value = state.get('state', '')
+            if value in ACTIVE_STATES:
+                score += 0.5
+            elif value in DEAD_STATES:
+                score -= 1
+            ranked.append((relevance, score, entry, state))
+
+        focused = any(relevance > 0 for relevance, _, _, _ in ranked)
+        ranked = [(score, entry, state) for relevance, score, entry, state in ranked
+                  if score > 0 and (relevance > 0 or not focused)]
+        ranked.sort(key=lambda item: (-item[0], item[1]['entity_id']))
+        return ranked
+
+    # ------------------------------------------------------------------
+    # Packing
+    # ------------------------------------------------------------------
+
+    def build(self, query, token_budget=None):
+        """Return the context for one question: compact text plus what went into it"""
+        budget = token_budget or self.token_budget
+        ranked = self.rank(query)
+
+        lines = {}  # domain -> rendered items, in rank order of first appearance
+        included, used = [], 0
+        for score, entry, state in ranked:
+            item = f"{entry['name']}={describe(state)}"
+            if entry['area'] and normalize(entry['area']) not in entry['name_key']:
+                item += f" [{entry['area']}]"
+            cost = estimate_tokens(item + '; ')
+            if entry['domain'] not in lines:
+                cost += estimate_tokens(entry['domain'] + ': \n')
+            if used + cost > budget:
+                continue
+            lines.setdefault(entry['domain'], []).append(item)
+            included.append(entry['entity_id'])
+            used += cost
+
+        text = '\n'.join(f"{domain}: {'; '.join(items)}" for domain, items in lines.items())
+        with self._lock:
+            self.counters["builds"] += 1
+            self.counters["tokens_total"] += used
+            self.counters["entities_total"] += len(included)
+        return {
+            "text": text,
+            "entity_ids": included,
+            "estimated_tokens": estimate_tokens(text),
+            "token_budget": budget,
+            "candidates": len(ranked)
+        }
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            indexed = len(self._entries)
+        builds = counters["builds"]
+        return dict(counters, indexed_entities=indexed, token_budget=self.token_budget,
+                    avg_tokens=round(counters["tokens_total"] / builds, 1) if builds else 0.0,
+                    avg_entities=round(counters["entities_total"] / builds, 1) if builds else 0.0)
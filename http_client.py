@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Shared Keep-Alive HTTP Client
+One pooled requests.Session for every HA, Ollama and bridge call, with
+per-endpoint timeouts, retry budgets and pool-usage counters. Calls made
+while serving a traced request carry its trace context and get a span.
+"""
+
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+import tracing
+
+# Configuration
+POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '10'))  # distinct hosts kept pooled
+POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))          # keep-alive sockets per host
+RETRY_BUDGET_RATIO = float(os.getenv('HTTP_RETRY_BUDGET_RATIO', '0.1'))
+RETRY_BUDGET_MIN = int(os.getenv('HTTP_RETRY_BUDGET_MIN', '10'))
+RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', '0.1'))
+CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '3.05'))
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, default))
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, default))
+
+
+# Per-endpoint read timeouts (seconds) and retry counts.
+# Override with HTTP_TIMEOUT_<NAME> / HTTP_RETRIES_<NAME>, e.g. HTTP_TIMEOUT_OLLAMA_GENERATE=45
+ENDPOINT_DEFAULTS = {
+    'ha_api': (5, 1),           # GET /api/ connectivity probe
+    'ha_states': (10, 1),       # GET /api/states[/<entity>]
+    'ha_service': (10, 0),      # POST /api/services/<domain>/<service> (not idempotent)
+    'ha_camera': (10, 1),       # GET /api/camera_proxy/<entity>
+    'ha_camera_stream': (15, 0), # GET /api/camera_proxy_stream/<entity>; read timeout is per frame gap
+    'ollama_tags': (5, 1),      # GET /api/tags
+    'ollama_generate': (30, 0), # POST /api/chat, open-ended answers
+    'ollama_command': (15, 0),  # POST /api/chat, short command-to-JSON prompts
+    'ollama_embeddings': (10, 1), # POST /api/embeddings
+    'bridge': (5, 1),           # calls between our own services
+    'otlp': (5, 0),             # POST /v1/traces to an OpenTelemetry collector
+    'default': (10, 0),
+}
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Endpoints whose calls are a request stage of their own in /metrics
+STAGE_ENDPOINTS = {
+    'ha_service': 'ha_service_call',
+    'ha_camera': 'snapshot_fetch',
+}
+
+
+class EndpointPolicy:
+    """Timeout and retry settings for one logical endpoint"""
+
+    def __init__(self, name, read_timeout, retries):
+        self.name = name
+        self.timeout = (CONNECT_TIMEOUT, _env_float(f'HTTP_TIMEOUT_{name.upper()}', read_timeout))
+        self.retries = _env_int(f'HTTP_RETRIES_{name.upper()}', retries)
+
+
+class PooledHTTPClient:
+    """Thread-safe keep-alive client with per-host connection pools"""
+
+    def __init__(self, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                 retry_budget_ratio=RETRY_BUDGET_RATIO, retry_budget_min=RETRY_BUDGET_MIN):
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                   max_retries=0)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.retry_budget_ratio = retry_budget_ratio
+        self.retry_budget_min = retry_budget_min
+        self.policies = {name: EndpointPolicy(name, *defaults) for name, defaults in ENDPOINT_DEFAULTS.items()}
+
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._endpoints = {}
+        self._requests_total = 0
+        self._retries_total = 0
+
+    def policy(self, endpoint):
+        return self.policies.get(endpoint) or self.policies['default']
+
+    # ------------------------------------------------------------------
+    # Requests
+    # ------------------------------------------------------------------
+
+    def request(self, method, url, endpoint='default', **kwargs):
+        """Send a request through the shared pool using the endpoint's timeout and retry policy"""
+        with tracing.span(f"{method.upper()} {endpoint}", kind='client', **{"http.url": url}) as span:
+            if span is None:
+                return self._send(method, url, endpoint, **kwargs)
+            kwargs['headers'] = span.inject(kwargs.get('headers'))
+            response = self._send(method, url, endpoint, **kwargs)
+            span.set(**{"http.status_code": response.status_code})
+            return response
+
+    def _send(self, method, url, endpoint, **kwargs):
+        policy = self.policy(endpoint)
+        kwargs.setdefault('timeout', policy.timeout)
+        host = urlsplit(url).netloc
+        method = method.upper()
+        retries = policy.retries if method in IDEMPOTENT_METHODS else 0
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(host, endpoint, started, error=e)
+                if attempt < retries and self._take_retry():
+                    attempt += 1
+                    time.sleep(RETRY_BACKOFF * attempt)
+                    continue
+                raise
+            self._record(host, endpoint, started, status=response.status_code)
+            if response.status_code in (502, 503, 504) and attempt < retries and self._take_retry():
+                response.close()
+                attempt += 1
+                time.sleep(RETRY_BACKOFF * attempt)
+                continue
+            return response
+
+    def get(self, url, endpoint='default', **kwargs):
+        return self.request('GET', url, endpoint=endpoint, **kwargs)
+
+    def post(self, url, endpoint='default', **kwargs):
+        return self.request('POST', url, endpoint=endpoint, **kwargs)
+
+    def _take_retry(self):
+        """Spend one retry if the budget (a fraction of all traffic) allows it"""
+        with self._lock:
+            allowed = self.retry_budget_min + self._requests_total * self.retry_budget_ratio
+            if self._retries_total >= allowed:
+                return False
+            self._retries_total += 1
+            return True
+
+    # ------------------------------------------------------------------
+    # Counters
+    # ------------------------------------------------------------------
+
+    def _record(self, host, endpoint, started, status=None, error=None):
+        elapsed = time.monotonic() - started
+        if endpoint in STAGE_ENDPOINTS:
+            metrics.observe_stage(STAGE_ENDPOINTS[endpoint], elapsed)
+        with self._lock:
+            self._requests_total += 1
+            for key, table in ((host, self._hosts), (endpoint, self._endpoints)):
+                entry = table.setdefault(key, {"requests": 0, "errors": 0, "total_seconds": 0.0, "status_codes": {}})
+                entry["requests"] += 1
+                entry["total_seconds"] += elapsed
+                if error is not None:
+                    entry["errors"] += 1
+                else:
+                    entry["status_codes"][str(status)] = entry["status_codes"].get(str(status), 0) + 1
+
+    def stats(self):
+        """Return per-host pool usage and per-endpoint request counters"""
+        pools = {}
+        container = self.adapter.poolmanager.pools
+        for key in list(container.keys()):
+            try:
+                pool = container[key]
+            except KeyError:
+                continue
+            opened = getattr(pool, 'num_connections', 0)
+            served = getattr(pool, 'num_requests', 0)
+            pools[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                "connections_opened": opened,
+                "requests_served": served,
+                "connections_reused": max(served - opened, 0),
+                # The pool queue is pre-filled with None placeholders for unopened slots
+                "idle_connections": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0,
+                "maxsize": pool.pool.maxsize if pool.pool else self.pool_maxsize
+            }
+
+        with self._lock:
+            hosts = {host: dict(entry, status_codes=dict(entry["status_codes"])) for host, entry in self._hosts.items()}
+            endpoints = {name: dict(entry, status_codes=dict(entry["status_codes"])) for name, entry in self._endpoints.items()}
+            totals = {"requests": self._requests_total, "retries": self._retries_total}
+
+        return {
+            "pool_connections": self.pool_connections,
+            "pool_maxsize": self.pool_maxsize,
+            "pools": pools,
+            "hosts": hosts,
+            "endpoints": endpoints,
+            "totals": totals
+        }
+
+
+# Process-wide shared client
+client = PooledHTTPClient()
+
+
+def request(method, url, endpoint='default', **kwargs):
+    return client.request(method, url, endpoint=endpoint, **kwargs)
+
+
+def get(url, endpoint='default', **kwargs):
+    return client.get(url, endpoint=endpoint, **kwargs)
+
+
+def post(url, endpoint='default', **kwargs):
+    return client.post(url, endpoint=endpoint, **kwargs)
+
+
+def stats():
+    return client.stats()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Fast-Path Intent Parser
+Resolves common commands ("turn off the kitchen lights", "set temperature to 72",
+"show me the garage camera") against the live entity registry without calling
+the LLM. Emits the same action plan shape the bridges get from Ollama; a miss
+returns None and the caller falls back to the model.
+"""
+
+import re
+import threading
+import time
+
+import metrics
+
+FILLER_WORDS = {
+    'please', 'the', 'my', 'a', 'an', 'can', 'could', 'would', 'you', 'hey', 'ok', 'okay',
+    'now', 'for', 'me', 'in', 'on', 'of', 'to', 'at', 'up'
+}
+
+# Words that name a kind of device rather than a specific one
+DOMAIN_WORDS = {
+    'light': 'light', 'lights': 'light', 'lamp': 'light', 'lamps': 'light', 'bulb': 'light', 'bulbs': 'light',
+    'switch': 'switch', 'switches': 'switch', 'plug': 'switch', 'plugs': 'switch', 'outlet': 'switch',
+    'fan': 'fan', 'fans': 'fan',
+    'tv': 'media_player', 'television': 'media_player', 'speaker': 'media_player', 'speakers': 'media_player',
+    'thermostat': 'climate', 'ac': 'climate', 'heating': 'climate', 'heat': 'climate', 'hvac': 'climate',
+    'camera': 'camera', 'cameras': 'camera', 'cam': 'camera',
+    'lock': 'lock', 'locks': 'lock',
+    'cover': 'cover', 'blinds': 'cover', 'shades': 'cover', 'curtains': 'cover',
+    'scene': 'scene', 'script': 'script', 'automation': 'automation'
+}
+
+# Domains that accept homeassistant-style turn_on / turn_off
+SWITCHABLE_DOMAINS = ('light', 'switch', 'fan', 'media_player', 'climate', 'input_boolean',
+                      'automation', 'script', 'scene')
+
+TURN_PATTERNS = [
+    re.compile(r'^(?:turn|switch|power)\s+(?P<state>on|off)\s+(?P<target>.+)$'),
+    re.compile(r'^(?:turn|switch|power)\s+(?P<target>.+?)\s+(?P<state>on|off)$'),
+    re.compile(r'^(?P<state>toggle)\s+(?P<target>.+)$'),
+    re.compile(r'^(?P<state>activate|enable|start)\s+(?P<target>.+)$'),
+    re.compile(r'^(?P<state>deactivate|disable|stop)\s+(?P<target>.+)$'),
+]
+TEMPERATURE_PATTERN = re.compile(
+    r'^(?:set|change|make)\s+(?:(?P<target>.+?)\s+)?(?P<keyword>temperature|temp|thermostat|heat|ac)?\s*'
+    r'(?:to|at)\s+(?P<value>\d+(?:\.\d+)?)\s*(?:degrees?|°)?\s*(?:f|c|fahrenheit|celsius)?$'
+)
+BRIGHTNESS_PATTERN = re.compile(
+    r'^(?:set|dim|brighten|make)\s+(?P<target>.+?)\s+(?:to|at)\s+(?P<value>\d{1,3})\s*(?:%|percent)$'
+)
+CAMERA_PATTERN = re.compile(
+    r'^(?:show|display|view|check|see|watch|look\s+at|pull\s+up|open)\s+(?:me\s+)?(?P<target>.+?)$'
+)
+
+SERVICE_FOR_STATE = {
+    'on': 'turn_on', 'activate': 'turn_on', 'enable': 'turn_on', 'start': 'turn_on',
+    'off': 'turn_off', 'deactivate': 'turn_off', 'disable': 'turn_off', 'stop': 'turn_off',
+    'toggle': 'toggle'
+}
+
+
+def normalize(text):
+    """Lowercase, strip punctuation and collapse whitespace"""
+    text = text.lower().replace('°', ' degrees ').replace('%', ' percent ')
+    text = re.sub(r"[^a-z0-9.\s]", ' ', text)
+    text = re.sub(r'(?<!\d)\.|\.(?!\d)', ' ', text)
+    return ' '.join(text.split())
+
+
+def tokens(text):
+    """Normalized word set with simple plural folding"""
+    words = set()
+    for word in normalize(text.replace('_', ' ')).split():
+        if word in FILLER_WORDS:
+            continue
+        words.add(word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word)
+    return words
+
+
+class EntityIndex:
+    """Token index over the live entity registry"""
+
+    def __init__(self, states, area_of):
+        self.entries = []
+        for state in states:
+            entity_id = state.get('entity_id', '')
+            if '.' not in entity_id:
+                continue
+            domain, object_id = entity_id.split('.', 1)
+            name = state.get('attributes', {}).get('friendly_name') or object_id.replace('_', ' ')
+            area = area_of(entity_id) or ''
+            self.entries.append({
+                "entity_id": entity_id,
+                "domain": domain,
+                "name": name,
+                "name_key": normalize(name),
+                "name_tokens": tokens(name) | tokens(object_id),
+                "area": area,
+                "area_tokens": tokens(area)
+            })
+
+    def resolve(self, phrase, domains):
+        """Return matching entries for a target phrase, or [] when nothing or something ambiguous matches"""
+        phrase_tokens = tokens(phrase)
+        hinted = {DOMAIN_WORDS[word] for word in normalize(phrase).split() if word in DOMAIN_WORDS}
+        hinted &= set(domains)
+        kind_tokens = {word for word in phrase_tokens if word in DOMAIN_WORDS or word + 's' in DOMAIN_WORDS}
+        candidates = [entry for entry in self.entries if entry['domain'] in (hinted or domains)]
+
+        # Exact friendly-name match wins outright
+        phrase_key = normalize(phrase)
+        exact = [entry for entry in candidates if entry['name_key'] in (phrase_key, f"the {phrase_key}")]
+        if len(exact) == 1:
+            return exact
+
+        specific = phrase_tokens - kind_tokens
+        if not specific:
+            # "the fan" is unambiguous when there is exactly one fan
+            return candidates if hinted and len(candidates) == 1 else []
+
+        # Area + kind ("living room lights") addresses every entity of that kind in the area
+        if hinted:
+            in_area = [entry for entry in candidates if entry['area_tokens'] and specific <= entry['area_tokens']]
+            if in_area:
+                return in_area
+
+        scored = []
+        for entry in candidates:
+            if not specific <= (entry['name_tokens'] | entry['area_tokens']):
+                continue
+            score = len(specific & entry['name_tokens']) * 2 + len(specific & entry['area_tokens'])
+            score -= len(entry['name_tokens'] - phrase_tokens) * 0.1  # prefer the tightest name
+            scored.append((score, entry))
+        if not scored:
+            return []
+        scored.sort(key=lambda item: item[0], reverse=True)
+        if len(scored) > 1 and scored[0][0] == scored[1][0]:
+            return []
+        return [scored[0][1]]
+
+
+class IntentParser:
+    """Deterministic matcher in front of the LLM, with hit-rate and latency counters"""
+
+    def __init__(self, state_store):
+        self.state_store = state_store
+        self._index = None
+        self._index_dirty = True
+        self._index_resync = None
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "hit_seconds": 0.0, "miss_seconds": 0.0, "by_intent": {}}
+        state_store.add_listener(self._on_state_changed)
+
+    def _on_state_changed(self, entity_id, old_state, new_state):
+        # Only entity additions, removals and renames change the index
+        if old_state is None or new_state is None or \
+                old_state.get('attributes', {}).get('friendly_name') != new_state.get('attributes', {}).get('friendly_name'):
+            self._index_dirty = True
+
+    def index(self):
+        # A resync also reloads the area registry, so rebuild after one too
+        resync = getattr(self.state_store, 'resync_count', None)
+        if self._index_dirty or self._index is None or resync != self._index_resync:
+            with self._lock:
+                self._index_dirty = False
+                self._index_resync = resync
+                self._index = EntityIndex(self.state_store.all_states(), self.state_store.area_of)
+        return self._index
+
+    # ------------------------------------------------------------------
+    # Parsing
+    # ------------------------------------------------------------------
+
+    def parse(self, command):
+        """Return an action plan for a recognised command, or None to fall back to the LLM"""
+        started = time.perf_counter()
+        try:
+            plan = self._match(normalize(command))
+        except Exception:
+            plan = None
+        elapsed = time.perf_counter() - started
+        metrics.observe_stage('intent_parse', elapsed)
+
+        with self._lock:
+            if plan:
+                self.counters["hits"] += 1
+                self.counters["hit_seconds"] += elapsed
+                intent = plan["intent"]
+                self.counters["by_intent"][intent] = self.counters["by_intent"].get(intent, 0) + 1
+            else:
+                self.counters["misses"] += 1
+                self.counters["miss_seconds"] += elapsed
+        return plan
+
+    def _match(self, text):
+        match = TEMPERATURE_PATTERN.match(text)
+        if match:
+            return self._set_temperature(match.group('target') or '', float(match.group('value')),
+                                         bool(match.group('keyword')))
+
+        match = BRIGHTNESS_PATTERN.match(text)
+        if match:
+            return self._set_brightness(match.group('target'), int(match.group('value')))
+
+        for pattern in TURN_PATTERNS:
+            match = pattern.match(text)
+            if match:
+                return self._turn(match.group('target'), SERVICE_FOR_STATE[match.group('state')])
+
+        match = CAMERA_PATTERN.match(text)
+        if match:
+            return self._show_camera(match.group('target'))
+        return None
+
+    def _turn(self, target, service):
+        words = normalize(target).split()
+        if 'all' in words or 'every' in words:
+            domains = {DOMAIN_WORDS[word] for word in words if word in DOMAIN_WORDS} & set(SWITCHABLE_DOMAINS)
+            if len(domains) != 1:
+                return None
+            domain = domains.pop()
+            return self._plan(f"{service}_all", [{"domain": domain, "service": service, "entity_id": "all"}],
+                              f"{self._done(service)} all {domain.replace('_', ' ')}s")
+
+        entries = self.index().resolve(target, SWITCHABLE_DOMAINS)
+        if not entries or len({entry['domain'] for entry in entries}) != 1:
+            return None
+        domain = entries[0]['domain']
+        if domain == 'scene' and service != 'turn_on':
+            return None
+        entity_id = [entry['entity_id'] for entry in entries] if len(entries) > 1 else entries[0]['entity_id']
+        return self._plan(service, [{"domain": domain, "service": service, "entity_id": entity_id}],
+                          f"{self._done(service)} {self._names(entries)}")
+
+    def _set_temperature(self, target, value, keyword):
+        index = self.index()
+        climates = [entry for entry in index.entries if entry['domain'] == 'climate']
+        named = tokens(target) - set(DOMAIN_WORDS)
+        entries = index.resolve(target, ('climate',)) if named else []
+        if not entries:
+            # "set kitchen lights to 50" names something else; "set alarm to 7" names nothing
+            other_domains = {entry['domain'] for entry in index.entries} - {'climate'}
+            if not keyword or len(climates) != 1 or (named and index.resolve(target, other_domains)):
+                return None
+            entries = climates
+        entity_id = [entry['entity_id'] for entry in entries] if len(entries) > 1 else entries[0]['entity_id']
+        value = int(value) if value.is_integer() else value
+        return self._plan("set_temperature", [{
+            "domain": "climate", "service": "set_temperature", "entity_id": entity_id,
+            "service_data": {"temperature": value}
+        }], f"I've set {self._names(entries)} to {value} degrees")
+
+    def _set_brightness(self, target, value):
+        entries = self.index().resolve(target, ('light',))
+        if not entries or value > 100:
+            return None
+        entity_id = [entry['entity_id'] for entry in entries] if len(entries) > 1 else entries[0]['entity_id']
+        return self._plan("set_brightness", [{
+            "domain": "light", "service": "turn_on", "entity_id": entity_id,
+            "service_data": {"brightness_pct": value}
+        }], f"I've set {self._names(entries)} to {value}% brightness")
+
+    def _show_camera(self, target):
+        entries = self.index().resolve(target, ('camera',))
+        if len(entries) != 1:
+            return None
+        entry = entries[0]
+        plan = self._plan("show_camera", [], f"Displaying {entry['name']}")
+        plan["camera"] = {"entity_id": entry['entity_id'], "name": entry['name']}
+        return plan
+
+    @staticmethod
+    def _plan(intent, actions, response):
+        return {"intent": intent, "actions": actions, "response": response}
+
+    @staticmethod
+    def _done(service):
+        return {"turn_on": "I've turned on", "turn_off": "I've turned off", "toggle": "I've toggled"}[service]
+
+    @staticmethod
+    def _names(entries):
+        names = [entry['name'] for entry in entries]
+        return names[0] if len(names) == 1 else ', '.join(names[:-1]) + ' and ' + names[-1]
+
+    # ------------------------------------------------------------------
+    # Counters
+    # ------------------------------------------------------------------
+
+    def hit_counts(self):
+        with self._lock:
+            return self.counters["hits"], self.counters["misses"]
+
+    def stats(self):
+        """Return hit rate and average parse latency for hits and misses"""
+        with self._lock:
+            hits, misses = self.counters["hits"], self.counters["misses"]
+            total = hits + misses
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "llm_calls_avoided": hits,
+                "avg_hit_ms": round(self.counters["hit_seconds"] / hits * 1000, 3) if hits else 0.0,
+                "avg_miss_ms": round(self.counters["miss_seconds"] / misses * 1000, 3) if misses else 0.0,
+                "by_intent": dict(self.counters["by_intent"])
+            }
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+LLM Response Cache
+Remembers validated action plans keyed on normalized command text, optionally
+matching near-duplicate phrasings by Ollama embedding similarity, so repeated
+commands skip inference entirely
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from intent_parser import normalize
+
+# Configuration
+CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '256'))
+CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '86400'))
+CACHE_EMBEDDINGS = os.getenv('LLM_CACHE_EMBEDDINGS', 'false').lower() in ('1', 'true', 'yes')
+CACHE_SIMILARITY = float(os.getenv('LLM_CACHE_SIMILARITY', '0.92'))
+
+# Words that never change what a command means
+IGNORED_WORDS = {'please', 'hey', 'ok', 'okay', 'now', 'thanks', 'thank', 'you', 'can', 'could', 'would'}
+
+
+def cache_key(command):
+    """Normalize command text so trivial variations share one entry"""
+    return ' '.join(word for word in normalize(command).split() if word not in IGNORED_WORDS)
+
+
+def referenced_entities(plan):
+    """Every entity_id an action plan touches"""
+    entity_ids = set()
+    for action in plan.get('actions', []):
+        for value in (action.get('entity_id'), (action.get('service_data') or {}).get('entity_id')):
+            if isinstance(value, str):
+                entity_ids.add(value)
+            elif isinstance(value, list):
+                entity_ids.update(v for v in value if isinstance(v, str))
+    entity_ids.discard('all')
+    return entity_ids
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class LLMResponseCache:
+    """TTL + LRU cache of action plans, invalidated when referenced entities disappear"""
+
+    def __init__(self, state_store=None, embed=None, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL,
+                 similarity=CACHE_SIMILARITY):
+        self.state_store = state_store
+        self.embed = embed  # callable(text) -> vector, or None for exact matching only
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()  # key -> {"plan", "entities", "embedding", "stored_at", "hits"}
+        self._lock = threading.Lock()
+        self.counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0,
+                         "evictions": 0, "expirations": 0, "invalidations": 0, "embedding_errors": 0}
+        if state_store is not None:
+            state_store.add_listener(self._on_state_changed)
+
+    # ------------------------------------------------------------------
+    # Lookup / store
+    # ------------------------------------------------------------------
+
+    def lookup(self, command):
+        """Return a cached action plan for this command, or None"""
+        key = cache_key(command)
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry:
+                self._entries.move_to_end(key)
+                entry["hits"] += 1
+                self.counters["exact_hits"] += 1
+                return entry["plan"]
+
+        if self.embed:
+            plan = self._semantic_lookup(key)
+            if plan:
+                return plan
+
+        with self._lock:
+            self.counters["misses"] += 1
+        return None
+
+    def store(self, command, plan):
+        """Remember a plan that parsed and executed successfully"""
+        if not plan.get('actions'):
+            return
+        key = cache_key(command)
+        embedding = self._embed(key) if self.embed else None
+        with self._lock:
+            self._entries[key] = {
+                "plan": plan,
+                "entities": referenced_entities(plan),
+                "embedding": embedding,
+                "stored_at": time.time(),
+                "hits": 0
+            }
+            self._entries.move_to_end(key)
+            self.counters["stores"] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.counters["evictions"] += 1
+
+    def invalidate(self, entity_id):
+        """Drop every plan that references an entity"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entity_id in entry["entities"]]
+            for key in stale:
+                del self._entries[key]
+            self.counters["invalidations"] += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _live_entry(self, key):
+        """Return the entry if it is fresh and every entity it references still exists (lock held)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry["stored_at"] > self.ttl:
+            del self._entries[key]
+            self.counters["expirations"] += 1
+            return None
+        if self.state_store is not None and entry["entities"]:
+            try:
+                missing = any(self.state_store.get(entity_id) is None for entity_id in entry["entities"])
+            except Exception:
+                missing = False
+            if missing:
+                del self._entries[key]
+                self.counters["invalidations"] += 1
+                return None
+        return entry
+
+    def _semantic_lookup(self, key):
+        vector = self._embed(key)
+        if vector is None:
+            return None
+        with self._lock:
+            best_key, best_score = None, self.similarity
+            for candidate_key, entry in self._entries.items():
+                if entry["embedding"] is None:
+                    continue
+                score = cosine(vector, entry["embedding"])
+                if score >= best_score:
+                    best_key, best_score = candidate_key, score
+            entry = self._live_entry(best_key) if best_key else None
+            if entry:
+                self._entries.move_to_end(best_key)
+                entry["hits"] += 1
+                self.counters["semantic_hits"] += 1
+                return entry["plan"]
+        return None
+
+    def _embed(self, text):
+        try:
+            return self.embed(text)
+        except Exception:
+            with self._lock:
+                self.counters["embedding_errors"] += 1
+            return None
+
+    def _on_state_changed(self, entity_id, old_state, new_state):
+        if new_state is None:
+            self.invalidate(entity_id)
+
+    # ------------------------------------------------------------------
+    # Counters
+    # ------------------------------------------------------------------
+
+    def hit_counts(self):
+        with self._lock:
+            return self.counters["exact_hits"] + self.counters["semantic_hits"], self.counters["misses"]
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            size = len(self._entries)
+        hits = counters["exact_hits"] + counters["semantic_hits"]
+        lookups = hits + counters["misses"]
+        return dict(counters, entries=size, max_entries=self.max_entries, ttl_seconds=self.ttl,
+                    semantic_matching=bool(self.embed),
+                    hit_rate=round(hits / lookups, 3) if lookups else 0.0)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Incremental JSON Scanning for LLM Output
+Finds action objects in a model's token stream the moment they close, so
+they can be dispatched before the rest of the response has been generated.
+Also holds the JSON schemas the bridges pass to Ollama's `format` option and
+a tolerant extractor for replies that still arrive fenced, chatty or cut off.
+"""
+
+import json
+
+# One Home Assistant service call, as ha_bridge_camera.py asks for it
+ACTION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "domain": {"type": "string"},
+        "service": {"type": "string"},
+        "entity_id": {"type": "string"},
+        "service_data": {"type": "object"}
+    },
+    "required": ["domain", "service", "entity_id"]
+}
+
+# A multi-action plan with a spoken reply, as ha_bridge.py asks for it
+ACTION_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "actions": {"type": "array", "items": ACTION_SCHEMA},
+        "response": {"type": "string"}
+    },
+    "required": ["actions", "response"]
+}
+
+
+def extract_json(text):
+    """Return the first JSON object in model output, repaired in one pass, or None.
+
+    Skips prose and code fences before the first '{', drops trailing commas,
+    and closes strings, arrays and objects left open by a truncated reply.
+    """
+    start = text.find('{')
+    if start < 0:
+        return None
+
+    out = []
+    closers = []
+    in_string = escape = False
+    for char in text[start:]:
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in '{[':
+            closers.append('}' if char == '{' else ']')
+        elif char in '}]':
+            if not closers or closers[-1] != char:
+                break
+            _strip_dangling(out)
+            closers.pop()
+            out.append(char)
+            if not closers:
+                break
+            continue
+        out.append(char)
+    else:
+        # Ran out of text: close whatever the model left open
+        if in_string:
+            out.append('"')
+        _strip_dangling(out)
+        if out and out[-1] == ':':
+            out.append('null')
+        out.extend(reversed(closers))
+        closers = []
+
+    if closers:
+        return None
+    try:
+        return json.loads(''.join(out))
+    except json.JSONDecodeError:
+        return None
+
+
+def _strip_dangling(out):
+    """Remove trailing whitespace and commas before a container is closed"""
+    while out and (out[-1].isspace() or out[-1] == ','):
+        out.pop()
+
+
+class ActionStreamParser:
+    """Feed model text piece by piece; collect actions as soon as each object closes.
+
+    Understands both response shapes the bridges ask for:
+      {"actions": [{...}, {...}], "response": "..."}   (ha_bridge.py)
+      {"domain": "...", "service": "...", ...}          (ha_bridge_camera.py)
+    Text before the first '{' (prose, code fences) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.length = 0
+        self.started = False
+        self.finished = False
+        self.document = None
+        self._stack = []        # [container char, key it was opened under, start offset]
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None
+        self._pending_key = None
+        self._emitted_actions = 0
+
+    def feed(self, text):
+        """Consume more model output; return the actions completed by this chunk"""
+        completed = []
+        for char in text:
+            offset = self.length
+            self.buffer.append(char)
+            self.length += 1
+            if self.finished:
+                continue
+            if not self.started:
+                if char != '{':
+                    continue
+                self.started = True
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = ''.join(self.buffer[self._string_start + 1:offset])
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = offset
+            elif char == ':':
+                self._pending_key = self._last_string
+            elif char == ',':
+                self._pending_key = None
+            elif char in '{[':
+                parent_key = self._pending_key if self._stack and self._stack[-1][0] == '{' else None
+                if self._stack and self._stack[-1][0] == '[':
+                    parent_key = self._stack[-1][1]
+                self._stack.append([char, parent_key, offset])
+                self._pending_key = None
+            elif char in '}]':
+                if not self._stack:
+                    continue
+                opener, key, start = self._stack.pop()
+                if opener == '{' and self._stack and self._stack[-1][0] == '[' and key == 'actions':
+                    action = self._parse(start, offset)
+                    if isinstance(action, dict):
+                        completed.append(action)
+                if not self._stack:
+                    self.finished = True
+                    self.document = self._parse(start, offset)
+                    if isinstance(self.document, dict) and 'actions' not in self.document \
+                            and 'domain' in self.document and self._emitted_actions == 0:
+                        completed.append(self.document)
+
+        self._emitted_actions += len(completed)
+        return completed
+
+    def _parse(self, start, end):
+        text = ''.join(self.buffer[start:end + 1])
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            return extract_json(text)
+
+    @property
+    def text(self):
+        return ''.join(self.buffer)
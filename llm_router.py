@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Multi-backend LLM Router
+Spreads LLM calls over a pool of Ollama hosts. Each call names a tier:
+simple commands go to OLLAMA_SMALL_MODEL, open-ended questions to the larger
+OLLAMA_MODEL. Among the healthy hosts that serve the model, the one with the
+lowest moving-average latency (weighted by calls in flight) goes first. On an
+error or timeout the call fails over to the next host, and with
+OLLAMA_HEDGE_AFTER set a slow call is raced against a second host.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+
+import http_client
+import metrics
+import ollama_client
+import tracing
+from ollama_client import OLLAMA_MODEL, OLLAMA_URL, OllamaError
+
+# Configuration
+OLLAMA_BACKENDS = [url.strip().rstrip('/') for url in os.getenv('OLLAMA_BACKENDS', '').split(',') if url.strip()]
+OLLAMA_SMALL_MODEL = os.getenv('OLLAMA_SMALL_MODEL', OLLAMA_MODEL)  # same as OLLAMA_MODEL = one tier
+HEDGE_AFTER = float(os.getenv('OLLAMA_HEDGE_AFTER', '0'))  # seconds before racing a second host; 0 = off
+HEALTH_INTERVAL = float(os.getenv('OLLAMA_HEALTH_INTERVAL', '15'))
+FAILURE_COOLDOWN = float(os.getenv('OLLAMA_FAILURE_COOLDOWN', '30'))  # seconds a failed host sits out
+
+LATENCY_ALPHA = 0.3  # weight of the newest sample in a host's latency average
+
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='llm-hedge')
+
+
+HEDGE_CANCELLED = 'hedge lost'  # asyncio cancel message for the losing task of a hedged pair
+
+
+class HedgeCancelled(Exception):
+    """Raised inside the losing call of a hedged pair once the other call has answered"""
+
+
+def model_key(name):
+    """Ollama treats "model" and "model:latest" as the same model"""
+    return name if ':' in name else f"{name}:latest"
+
+
+class Backend:
+    """One Ollama host: health, installed models and per-model latency"""
+
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.retry_at = 0.0
+        self.models = None  # installed models from /api/tags; None until the first health check
+        self.latency = {}   # model -> moving-average seconds per call
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_check = None
+
+    def usable(self, now):
+        return self.healthy or now >= self.retry_at
+
+    def serves(self, model):
+        return self.models is None or model_key(model) in self.models
+
+
+class LLMRouter:
+    """Backend pool with health checks, latency-aware ordering, failover and optional hedging"""
+
+    def __init__(self, urls=None, large_model=OLLAMA_MODEL, small_model=OLLAMA_SMALL_MODEL,
+                 hedge_after=HEDGE_AFTER, health_interval=HEALTH_INTERVAL, failure_cooldown=FAILURE_COOLDOWN):
+        self.backends = [Backend(url.rstrip('/')) for url in (urls or OLLAMA_BACKENDS or [OLLAMA_URL])]
+        self.models = {'large': large_model, 'small': small_model}
+        self.hedge_after = hedge_after
+        self.health_interval = health_interval
+        self.failure_cooldown = failure_cooldown
+        self._lock = threading.Lock()
+        self._thread = None
+        self.counters = {"failovers": 0, "hedges": 0, "hedge_wins": 0, "hedges_cancelled": 0,
+                         "small_fallbacks": 0}
+
+    # ------------------------------------------------------------------
+    # Health
+    # ------------------------------------------------------------------
+
+    def check(self, backend):
+        """Probe one host's /api/tags; records its health and installed models"""
+        try:
+            response = http_client.get(f"{backend.url}/api/tags", endpoint='ollama_tags')
+            if response.status_code != 200:
+                raise OllamaError(f"HTTP {response.status_code}")
+            models = {model_key(m['name']) for m in response.json().get('models', [])}
+            with self._lock:
+                backend.models = models
+                backend.healthy = True
+        except Exception as e:
+            self._mark_down(backend, e)
+        backend.last_check = time.time()
+
+    def check_all(self):
+        for backend in self.backends:
+            self.check(backend)
+
+    def start(self):
+        """Probe every host now, then keep probing in the background (idempotent)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='llm-health', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self.check_all()
+            time.sleep(self.health_interval)
+
+    def _mark_down(self, backend, error):
+        with self._lock:
+            backend.healthy = False
+            backend.retry_at = time.monotonic() + self.failure_cooldown
+            backend.failures += 1
+            backend.last_error = str(error) or type(error).__name__
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def candidates(self, tier):
+        """[(backend, model)] to try for a tier, best first; hosts that are down come last.
+
+        A small-tier call lists the large model's hosts after the small
+        model's, so it falls back to the large model rather than failing.
+        """
+        now = time.monotonic()
+        model = self.models.get(tier, self.models['large'])
+        models = [model] if model == self.models['large'] else [model, self.models['large']]
+        if len(models) > 1 and not any(b.serves(model) for b in self.backends if b.usable(now)):
+            # No live host has the small model pulled: better slow than failing
+            with self._lock:
+                self.counters["small_fallbacks"] += 1
+            models = models[1:]
+
+        live, down = [], []
+        with self._lock:
+            for model in models:
+                known = [b.latency[model] for b in self.backends if model in b.latency]
+                typical = sum(known) / len(known) if known else 0.0
+
+                def cost(backend):
+                    # Unmeasured hosts count as average and win ties so they get a sample;
+                    # each call in flight adds one more
+                    return (backend.latency.get(model, typical) * (1 + backend.in_flight), model in backend.latency)
+
+                serving = [b for b in self.backends if b.serves(model)] or list(self.backends)
+                live += [(b, model) for b in sorted((b for b in serving if b.usable(now)), key=cost)]
+                down += [(b, model) for b in sorted((b for b in serving if not b.usable(now)),
+                                                    key=lambda b: b.retry_at)]
+        return live + down
+
+    @contextmanager
+    def track(self, backend, model):
+        """Account one call on a host: in-flight count, latency on success, cooldown on failure"""
+        with self._lock:
+            backend.in_flight += 1
+            backend.requests += 1
+        span = tracing.start_span('llm_inference', backend=backend.url, model=model)
+        started = time.monotonic()
+        try:
+            yield
+        except (HedgeCancelled, asyncio.CancelledError) as e:
+            # Abandoned, not failed: the host keeps its health and latency average.
+            # An asyncio cancel is a lost hedge only when routed_chat says so; else the client left
+            if isinstance(e, HedgeCancelled) or e.args == (HEDGE_CANCELLED,):
+                self.count("hedges_cancelled")
+            if span is not None:
+                span.end(cancelled=True)
+            raise
+        except Exception as e:
+            self._mark_down(backend, e)
+            if span is not None:
+                span.end(error=e)
+            raise
+        else:
+            seconds = time.monotonic() - started
+            metrics.observe_stage('llm_inference', seconds)
+            if span is not None:
+                span.end()
+            with self._lock:
+                backend.healthy = True
+                previous = backend.latency.get(model)
+                backend.latency[model] = seconds if previous is None else \
+                    previous + LATENCY_ALPHA * (seconds - previous)
+        finally:
+            with self._lock:
+                backend.in_flight -= 1
+
+    def count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+
+    def _call(self, backend, model, request, cancel=None):
+        with self.track(backend, model):
+            if cancel is None:
+                return ollama_client.chat(**dict(request, base_url=backend.url, model=model))
+            # A racing call streams so it can stop between tokens once cancel is set; closing the
+            # stream drops the connection and Ollama stops generating on that host
+            tokens = ollama_client.stream_chat(**dict(request, base_url=backend.url, model=model))
+            try:
+                reply = []
+                for token in tokens:
+                    if cancel.is_set():
+                        raise HedgeCancelled(backend.url)
+                    reply.append(token)
+                return ''.join(reply)
+            finally:
+                tokens.close()
+
+    def chat(self, request, tier='large'):
+        """ollama_client.chat over the pool; request holds chat() keyword arguments"""
+        attempts = self.candidates(tier)
+        last_error = None
+
+        if self.hedge_after and len(attempts) > 1:
+            cancel = threading.Event()  # set once one call has answered; the other abandons its request
+            racing = [_executor.submit(tracing.bind(self._call), *attempts[0], request, cancel)]
+            done, _ = wait(racing, timeout=self.hedge_after)
+            if not done:
+                self.count("hedges")
+                racing.append(_executor.submit(tracing.bind(self._call), *attempts[1], request, cancel))
+            try:
+                for future in as_completed(racing):
+                    if future.exception() is None:
+                        if future is not racing[0]:
+                            self.count("hedge_wins")
+                        return future.result()
+                    last_error = future.exception()
+            finally:
+                cancel.set()
+            attempts = attempts[len(racing):]
+
+        for backend, model in attempts:
+            if last_error is not None:
+                self.count("failovers")
+            try:
+                return self._call(backend, model, request)
+            except Exception as e:
+                last_error = e
+        raise OllamaError(f"All AI backends failed: {last_error}")
+
+    def stream_chat(self, request, tier='large'):
+        """ollama_client.stream_chat over the pool; fails over only until the first token arrives"""
+        last_error = None
+        for backend, model in self.candidates(tier):
+            if last_error is not None:
+                self.count("failovers")
+            started = False
+            try:
+                with self.track(backend, model):
+                    for token in ollama_client.stream_chat(**dict(request, base_url=backend.url, model=model)):
+                        started = True
+                        yield token
+                return
+            except Exception as e:
+                if started:
+                    raise
+                last_error = e
+        raise OllamaError(f"All AI backends failed: {last_error}")
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            backends = [{
+                "url": backend.url,
+                "healthy": backend.usable(now),
+                "models": sorted(backend.models) if backend.models is not None else None,
+                "latency_seconds": {model: round(seconds, 3) for model, seconds in backend.latency.items()},
+                "in_flight": backend.in_flight,
+                "requests": backend.requests,
+                "failures": backend.failures,
+                "last_error": backend.last_error,
+                "last_check": backend.last_check
+            } for backend in self.backends]
+            return {"models": dict(self.models), "hedge_after": self.hedge_after,
+                    "backends": backends, **self.counters}
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Priority Scheduler for Ollama
+Admits at most OLLAMA_MAX_CONCURRENT generations at a time, matched to what
+the GPU can run in parallel. Waiting requests are served by priority class
+(voice > camera > query > background), FIFO within a class, so a burst of
+dashboard queries cannot starve an interactive command. A request whose
+estimated queue wait already exceeds its class deadline is rejected at once
+rather than left to time out after queueing.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import metrics
+import tracing
+from ollama_client import OllamaError
+
+# Configuration
+MAX_CONCURRENT = int(os.getenv('OLLAMA_MAX_CONCURRENT', '2'))  # keep equal to Ollama's OLLAMA_NUM_PARALLEL
+
+PRIORITIES = ('voice', 'camera', 'query', 'background')  # highest first
+
+# Longest each class will wait in the queue before it is turned away
+DEADLINES = {
+    'voice': float(os.getenv('LLM_DEADLINE_VOICE', '20')),
+    'camera': float(os.getenv('LLM_DEADLINE_CAMERA', '20')),
+    'query': float(os.getenv('LLM_DEADLINE_QUERY', '45')),
+    'background': float(os.getenv('LLM_DEADLINE_BACKGROUND', '120')),
+}
+
+SERVICE_TIME_ALPHA = 0.2  # weight of the newest sample in the slot-hold-time average
+
+
+class LLMBusy(OllamaError):
+    """The request would wait longer than its deadline for a generation slot"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    """One queued request; woken by a threading.Event or an asyncio future"""
+
+    def __init__(self, priority, loop=None):
+        self.priority = priority
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def grant(self):
+        self.granted = True
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._resolve)
+        else:
+            self.event.set()
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class LLMScheduler:
+    """Bounded, priority-ordered admission to the model, shared by threads and event loops"""
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT, deadlines=DEADLINES):
+        self.max_concurrent = max(1, max_concurrent)
+        self.deadlines = dict(deadlines)
+        self._lock = threading.Lock()
+        self._queue = []  # heap of (priority rank, sequence, waiter)
+        self._sequence = itertools.count()
+        self._running = 0
+        self._waiting = 0
+        self.peak_waiting = 0
+        self.service_seconds = None  # moving average of how long a request holds a slot
+        self.counters = {priority: {"admitted": 0, "rejected": 0, "timed_out": 0, "wait_seconds": 0.0,
+                                    "max_wait_seconds": 0.0} for priority in PRIORITIES}
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+
+    def estimated_wait(self, priority):
+        """Seconds a new request of this class would queue, from the slot-hold average"""
+        with self._lock:
+            return self._estimate(PRIORITIES.index(priority))
+
+    def _estimate(self, rank):
+        if self._running < self.max_concurrent and not self._waiting:
+            return 0.0
+        ahead = sum(1 for entry in self._queue if entry[0] <= rank and not entry[2].cancelled)
+        return math.ceil((ahead + 1) / self.max_concurrent) * (self.service_seconds or 0.0)
+
+    def _enqueue(self, waiter):
+        """Grant a free slot, reject if the wait would overrun the deadline, else queue"""
+        rank = PRIORITIES.index(waiter.priority)
+        with self._lock:
+            if self._running < self.max_concurrent and not self._waiting:
+                self._running += 1
+                self._admit(waiter, 0.0)
+                return True
+            estimate = self._estimate(rank)
+            if estimate > self.deadlines[waiter.priority]:
+                self.counters[waiter.priority]["rejected"] += 1
+                raise LLMBusy(f"AI queue wait ~{estimate:.0f}s exceeds the {waiter.priority} deadline",
+                              retry_after=math.ceil(estimate))
+            heapq.heappush(self._queue, (rank, next(self._sequence), waiter))
+            self._waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self._waiting)
+            return False
+
+    def _admit(self, waiter, waited):
+        metrics.observe_stage('llm_queue_wait', waited)
+        entry = self.counters[waiter.priority]
+        entry["admitted"] += 1
+        entry["wait_seconds"] += waited
+        entry["max_wait_seconds"] = max(entry["max_wait_seconds"], waited)
+
+    def _abandon(self, waiter):
+        """Drop a waiter that gave up; returns True if it was granted a slot in the meantime"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            waiter.cancelled = True
+            self._waiting -= 1
+            self.counters[waiter.priority]["timed_out"] += 1
+            return False
+
+    def _release(self, held_seconds=None):
+        """Free a slot (held_seconds=None for one granted but never used) and wake the next waiter"""
+        with self._lock:
+            self._running -= 1
+            if held_seconds is not None:
+                if self.service_seconds is None:
+                    self.service_seconds = held_seconds
+                else:
+                    self.service_seconds += SERVICE_TIME_ALPHA * (held_seconds - self.service_seconds)
+            while self._queue and self._running < self.max_concurrent:
+                _, _, waiter = heapq.heappop(self._queue)
+                if waiter.cancelled:
+                    continue
+                self._waiting -= 1
+                self._running += 1
+                self._admit(waiter, time.monotonic() - waiter.enqueued)
+                waiter.grant()
+
+    def _timeout_error(self, waiter):
+        deadline = self.deadlines[waiter.priority]
+        return LLMBusy(f"No AI slot within the {waiter.priority} deadline of {deadline:g}s",
+                       retry_after=math.ceil(self.service_seconds or deadline))
+
+    @contextmanager
+    def slot(self, priority):
+        """Hold one generation slot for the duration of the block (blocking)"""
+        waiter = _Waiter(priority)
+        span = tracing.start_span('llm_queue_wait', priority=priority)
+        try:
+            if not self._enqueue(waiter):
+                if not waiter.event.wait(self.deadlines[priority]) and not self._abandon(waiter):
+                    raise self._timeout_error(waiter)
+        except LLMBusy as e:
+            if span is not None:
+                span.end(error=e)
+            raise
+        if span is not None:
+            span.end()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def slot_async(self, priority):
+        """Awaitable form of slot() for the asyncio serving mode"""
+        waiter = _Waiter(priority, asyncio.get_running_loop())
+        span = tracing.start_span('llm_queue_wait', priority=priority)
+        try:
+            if not self._enqueue(waiter):
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), self.deadlines[priority])
+                except asyncio.TimeoutError:
+                    if not self._abandon(waiter):
+                        raise self._timeout_error(waiter)
+                except asyncio.CancelledError:
+                    # Client went away while queued: give back a slot granted in the meantime
+                    if self._abandon(waiter):
+                        self._release()
+                    raise
+        except BaseException as e:
+            if span is not None:
+                span.end(error=e)
+            raise
+        if span is not None:
+            span.end()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        with self._lock:
+            classes = {}
+            for priority, entry in self.counters.items():
+                admitted = entry["admitted"]
+                classes[priority] = dict(entry, deadline_seconds=self.deadlines[priority],
+                                         wait_seconds=round(entry["wait_seconds"], 3),
+                                         max_wait_seconds=round(entry["max_wait_seconds"], 3),
+                                         avg_wait_seconds=round(entry["wait_seconds"] / admitted, 3) if admitted else 0.0,
+                                         queued=sum(1 for _, _, waiter in self._queue
+                                                    if waiter.priority == priority and not waiter.cancelled))
+            return {
+                "max_concurrent": self.max_concurrent,
+                "running": self._running,
+                "queue_depth": self._waiting,
+                "peak_queue_depth": self.peak_waiting,
+                "avg_service_seconds": round(self.service_seconds, 3) if self.service_seconds is not None else None,
+                "classes": classes
+            }
+
+
+# Process-wide scheduler: every prompt manager in a service shares the same slots
+scheduler = LLMScheduler()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Bridge Load Test
+Runs the blocking (Flask) and asyncio (Quart) bridges side by side against a
+local fake Home Assistant and a fake Ollama with fixed latency, fires the
+same burst of concurrent requests at each, and prints latency and throughput
+as JSON.
+
+    python load_test.py --concurrency 100 --requests 200 --latency 1.0
+
+--sync-workers caps the blocking server at N request threads, like a
+gunicorn deployment with N sync workers; 0 gives Flask's thread-per-request
+dev server.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import BaseWSGIServer
+
+from fake_ha import FakeHomeAssistant
+from fake_ollama import FakeOllama
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return round(ordered[index], 1)
+
+
+def run_load(url, payloads, concurrency, method='POST', timeout=300):
+    """Send every payload with at most `concurrency` in flight; return latency and throughput
+
+    url is one URL for every request, or a list with one URL per payload.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def one(target, payload):
+        started = time.monotonic()
+        try:
+            response = session.request(method, target, json=payload, timeout=timeout)
+            ok = response.status_code < 400
+            detail = f"HTTP {response.status_code}"
+        except Exception as e:
+            ok, detail = False, str(e)
+        elapsed = (time.monotonic() - started) * 1000
+        with lock:
+            (latencies if ok else errors).append(elapsed if ok else detail)
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, url if isinstance(url, list) else [url] * len(payloads), payloads))
+    wall = time.monotonic() - started
+
+    return {
+        "requests": len(payloads),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / len(payloads), 4) if payloads else 0.0,
+        "error_samples": errors[:3],
+        "wall_seconds": round(wall, 2),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "max": round(max(latencies), 1) if latencies else None
+        }
+    }
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server that handles requests on a fixed pool of threads"""
+
+    def __init__(self, host, port, app, workers):
+        super().__init__(host, port, app)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def serve_sync(app, port, workers):
+    if workers:
+        server = PooledWSGIServer('127.0.0.1', port, app, workers)
+    else:
+        from werkzeug.serving import ThreadedWSGIServer
+        server = ThreadedWSGIServer('127.0.0.1', port, app)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.shutdown
+
+
+def serve_async(app, port):
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.backlog = 1024
+    config.accesslog = None
+    config.loglevel = 'WARNING'
+    loop = asyncio.new_event_loop()
+    shutdown = asyncio.Event()
+
+    async def main():
+        await serve(app, config, shutdown_trigger=shutdown.wait)
+
+    threading.Thread(target=loop.run_until_complete, args=(main(),), daemon=True).start()
+    return lambda: loop.call_soon_threadsafe(shutdown.set)
+
+
+def wait_for(url, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=1.0, help='fake Ollama seconds per generation')
+    parser.add_argument('--sync-workers', type=int, default=8)
+    parser.add_argument('--path', default='/smart_query', choices=['/smart_query', '/voice_command'])
+    args = parser.parse_args()
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    ha = FakeHomeAssistant().start()
+    ha.set_state('light.kitchen', 'off', {'friendly_name': 'Kitchen Lights'})
+    ollama = FakeOllama(first_token_delay=args.latency).start()
+
+    # The bridges read their configuration at import time
+    # The fake Ollama has no GPU to protect, so let every request through the scheduler
+    os.environ.update({'HA_URL': ha.url, 'HA_TOKEN': ha.token, 'OLLAMA_URL': ollama.url,
+                       'OLLAMA_MAX_CONCURRENT': str(args.concurrency)})
+    import ha_bridge
+    import ha_bridge_async
+
+    ha_bridge.state_store.start()
+    ha_bridge.state_store.wait_ready(10)
+
+    # Distinct commands so neither the fast path nor the response cache short-circuits the LLM
+    field = 'query' if args.path == '/smart_query' else 'command'
+    payloads = [{field: f"what should I do about the garden this evening, plan {i}"} for i in range(args.requests)]
+
+    results = {"config": vars(args)}
+    for mode, start in (('sync', lambda port: serve_sync(ha_bridge.app, port, args.sync_workers)),
+                        ('async', lambda port: serve_async(ha_bridge_async.app, port))):
+        port = free_port()
+        stop = start(port)
+        wait_for(f"http://127.0.0.1:{port}/health")
+        results[mode] = run_load(f"http://127.0.0.1:{port}{args.path}", payloads, args.concurrency)
+        stop()
+
+    if results['sync']['throughput_rps']:
+        results['async_speedup'] = round(results['async']['throughput_rps'] / results['sync']['throughput_rps'], 2)
+    print(json.dumps(results, indent=2))
+
+    ha.stop()
+    ollama.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Prometheus Metrics
+Process-wide counters, gauges and latency histograms rendered in the
+Prometheus text format on every service's /metrics endpoint. Each request
+stage (intent parse, LLM queue wait, LLM inference, HA service call,
+snapshot fetch) feeds one histogram, so a slow p99 can be traced to the
+stage that spent the seconds. Upstream status codes, cache hit ratios and
+in-flight gauges are read from the components' own counters at scrape time.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+PREFIX = 'ha_bridge'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; spans a sub-millisecond intent parse up to a cold model load
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Monotonic count per label set"""
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        if not self.label_names:
+            self._values[()] = 0  # an unlabelled series reads 0 before its first update
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, key)} {_number(value)}"
+                                for key, value in values]
+
+
+class Gauge(Counter):
+    """Value that goes up and down per label set"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket latency histogram per label set"""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry["buckets"][index] += 1
+                    break
+            entry["sum"] += value
+            entry["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, dict(entry, buckets=list(entry["buckets"]))) for key, entry in self._values.items())
+        lines = self.header()
+        for key, entry in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry["buckets"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', _number(bound))])} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, key, [('le', '+Inf')])} {entry['count']}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_number(entry['sum'])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {entry['count']}")
+        return lines
+
+
+class Registry:
+    """Metrics owned by this process plus collectors read at scrape time"""
+
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics = {}
+        self._collectors = {}
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        name = f"{self.prefix}_{name}"
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def register(self, key, collector):
+        """Add (or replace) a scrape-time collector: callable returning [(name, kind, help, [(labels, value)])]"""
+        with self._lock:
+            self._collectors[key] = collector
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                families = collector()
+            except Exception:
+                continue  # a broken component must not take the whole scrape down
+            for name, kind, help, samples in families:
+                name = f"{self.prefix}_{name}"
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry: every module in a service reports here
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram('stage_seconds', 'Seconds spent in each request stage', ('stage',))
+REQUESTS = registry.counter('http_requests_total', 'Requests served, by route and status', ('method', 'route', 'status'))
+REQUEST_SECONDS = registry.histogram('http_request_seconds', 'Request latency by route', ('route',))
+IN_FLIGHT = registry.gauge('http_requests_in_flight', 'Requests being served right now')
+
+
+def observe_stage(stage, seconds):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def stage(name):
+    """Context manager timing one request stage"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+def render():
+    return registry.render()
+
+
+# ----------------------------------------------------------------------
+# Scrape-time collectors over the components' own counters
+# ----------------------------------------------------------------------
+
+def http_client_families(stats):
+    """Upstream calls by logical endpoint (ha_service, ollama_generate, ...) and status code"""
+    requests, seconds = [], []
+    for endpoint, entry in stats["endpoints"].items():
+        for status, count in entry["status_codes"].items():
+            requests.append(({"endpoint": endpoint, "status": status}, count))
+        if entry["errors"]:
+            requests.append(({"endpoint": endpoint, "status": "error"}, entry["errors"]))
+        seconds.append(({"endpoint": endpoint}, round(entry["total_seconds"], 6)))
+    families = [
+        ('upstream_requests_total', 'counter', 'Upstream HTTP calls by endpoint and status code', requests),
+        ('upstream_request_seconds_total', 'counter', 'Seconds spent in upstream HTTP calls', seconds),
+        ('upstream_retries_total', 'counter', 'Upstream retries spent from the budget',
+         [({}, stats["totals"]["retries"])])
+    ]
+    if "async_pool" in stats:
+        families.append(('upstream_requests_in_flight', 'gauge', 'Async upstream calls in flight',
+                         [({}, stats["async_pool"]["in_flight"])]))
+    return families
+
+
+def cache_families(caches):
+    """Hits, misses and hit ratio for {name: object with hit_counts() -> (hits, misses)}"""
+    requests, ratios = [], []
+    for name, cache in caches.items():
+        hits, misses = cache.hit_counts()
+        requests += [({"cache": name, "result": "hit"}, hits), ({"cache": name, "result": "miss"}, misses)]
+        ratios.append(({"cache": name}, round(hits / (hits + misses), 4) if hits + misses else 0.0))
+    return [('cache_requests_total', 'counter', 'Cache lookups by result', requests),
+            ('cache_hit_ratio', 'gauge', 'Share of cache lookups served without the upstream', ratios)]
+
+
+def llm_families(prompts):
+    """Scheduler queue and router backend gauges for a PromptManager"""
+    scheduler = prompts.scheduler.stats()
+    router = prompts.router.stats()
+    admitted, rejected = [], []
+    for priority, entry in scheduler["classes"].items():
+        admitted.append(({"priority": priority}, entry["admitted"]))
+        rejected.append(({"priority": priority, "reason": "deadline"}, entry["rejected"]))
+        rejected.append(({"priority": priority, "reason": "timeout"}, entry["timed_out"]))
+    backends = router["backends"]
+    return [
+        ('llm_running', 'gauge', 'LLM calls holding a generation slot', [({}, scheduler["running"])]),
+        ('llm_queued', 'gauge', 'LLM calls waiting for a generation slot', [({}, scheduler["queue_depth"])]),
+        ('llm_admitted_total', 'counter', 'LLM calls admitted by priority class', admitted),
+        ('llm_rejected_total', 'counter', 'LLM calls turned away by priority class', rejected),
+        ('llm_backend_in_flight', 'gauge', 'Calls in flight per Ollama host',
+         [({"backend": b["url"]}, b["in_flight"]) for b in backends]),
+        ('llm_backend_healthy', 'gauge', 'Whether each Ollama host is taking calls',
+         [({"backend": b["url"]}, b["healthy"]) for b in backends]),
+        ('llm_backend_failures_total', 'counter', 'Failed calls and health checks per Ollama host',
+         [({"backend": b["url"]}, b["failures"]) for b in backends]),
+        ('llm_failovers_total', 'counter', 'LLM calls retried on another host', [({}, router["failovers"])]),
+        ('llm_hedges_total', 'counter', 'LLM calls raced against a second host', [({}, router["hedges"])]),
+        ('llm_hedges_cancelled_total', 'counter', 'Losing hedged calls abandoned once the other answered',
+         [({}, router["hedges_cancelled"])])
+    ]
+
+
+def state_store_families(state_store):
+    stats = state_store.stats()
+    return [('state_mirror_connected', 'gauge', 'Whether the HA event stream is up', [({}, stats["connected"])]),
+            ('state_mirror_entities', 'gauge', 'Entities in the state mirror', [({}, stats["entities"])]),
+            ('state_mirror_resyncs_total', 'counter', 'Full state reloads after a reconnect',
+             [({}, stats["resyncs"])])]
+
+
+def watch(http=None, caches=None, prompts=None, state_store=None):
+    """Register the scrape-time collectors for one service's components"""
+    if http is not None:
+        registry.register('http_client', lambda: http_client_families(http.stats()))
+    if caches:
+        registry.register('caches', lambda: cache_families(caches))
+    if prompts is not None:
+        registry.register('llm', lambda: llm_families(prompts))
+    if state_store is not None:
+        registry.register('state_store', lambda: state_store_families(state_store))
+
+
+# ----------------------------------------------------------------------
+# Web framework hooks
+# ----------------------------------------------------------------------
+
+def _route(request):
+    # The URL rule, not the path, so /camera_proxy/<camera_name> stays one series
+    rule = getattr(request, 'url_rule', None)
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def instrument(app, **components):
+    """Count and time every request of a Flask app and serve /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_started = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    def _metrics_record(response):
+        route = _route(request)
+        REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+        REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_started, route=route)
+        return response
+
+    @app.teardown_request
+    def _metrics_finish(error=None):
+        if 'metrics_started' in g:
+            IN_FLIGHT.dec()
+
+    app.add_url_rule('/metrics', 'metrics', lambda: Response(render(), content_type=CONTENT_TYPE))
+    watch(**components)
+
+
+def instrument_async(app, **components):
+    """instrument() for the Quart apps of the asyncio serving mode"""
+    from quart import Response, g, request
+
+    @app.before_request
+    async def _metrics_start():
+        g.metrics_started = time.perf_counter()
+        IN_FLIGHT.inc()
+
+    @app.after_request
+    async def _metrics_record(response):
+        route = _route(request)
+        REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+        REQUEST_SECONDS.observe(time.perf_counter() - g.metrics_started, route=route)
+        return response
+
+    @app.teardown_request
+    async def _metrics_finish(error=None):
+        if 'metrics_started' in g:
+            IN_FLIGHT.dec()
+
+    async def metrics_endpoint():
+        return Response(render(), content_type=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint)
+    watch(**components)
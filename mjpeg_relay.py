@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+MJPEG Relay
+Holds one upstream camera_proxy_stream connection per camera and fans its
+frames out to every viewer. Frames are cut at the multipart boundaries and
+passed on byte-for-byte, never decoded or re-encoded. Each viewer reads from
+its own small ring buffer, so a slow client loses old frames instead of
+holding up the others. The upstream closes once the last viewer has left.
+"""
+
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import deque
+
+# Configuration
+CLIENT_BUFFER = int(os.getenv('MJPEG_CLIENT_BUFFER', '2'))        # frames queued per viewer; older ones are dropped
+RELAY_LINGER = float(os.getenv('MJPEG_RELAY_LINGER', '2'))        # seconds upstream stays open after the last viewer
+RECONNECT_DELAY = float(os.getenv('MJPEG_RECONNECT_DELAY', '2'))  # seconds between upstream attempts while watched
+FRAME_TIMEOUT = float(os.getenv('MJPEG_FRAME_TIMEOUT', '30'))     # a viewer's stream ends after this long without a frame
+
+BOUNDARY = 'frame'
+READ_CHUNK = 64 * 1024
+MAX_BUFFERED = 16 * 1024 * 1024  # give up on an upstream whose frames never end
+FRESH_FRAME = 5.0                # a new viewer is sent the last frame if it is at most this old
+
+
+class RelayError(Exception):
+    """Raised when the upstream stream cannot be opened or parsed"""
+
+
+def part(jpeg):
+    """One multipart section of our own stream, built once per frame and shared by every viewer"""
+    return (f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode('ascii')
+            + jpeg + b"\r\n")
+
+
+class MultipartParser:
+    """Splits a multipart/x-mixed-replace byte stream into its parts without touching their contents"""
+
+    def __init__(self, content_type):
+        match = re.search(r'boundary="?([^";]+)"?', content_type or '')
+        if 'multipart' not in (content_type or '') or not match:
+            raise RelayError(f"not an MJPEG stream: {content_type!r}")
+        boundary = match.group(1).encode('latin-1')
+        self.delimiter = boundary if boundary.startswith(b'--') else b'--' + boundary
+        self.buffer = bytearray()
+
+    def feed(self, chunk):
+        """Add bytes from upstream; returns the frames they completed"""
+        self.buffer += chunk
+        frames = []
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                break
+            frames.append(frame)
+        if len(self.buffer) > MAX_BUFFERED:
+            raise RelayError("frame larger than MAX_BUFFERED")
+        return frames
+
+    def _next_frame(self):
+        buffer = self.buffer
+        start = buffer.find(self.delimiter)
+        if start < 0:
+            return None
+        headers_end = buffer.find(b'\r\n\r\n', start)
+        if headers_end < 0:
+            return None
+        headers = bytes(buffer[start + len(self.delimiter):headers_end]).decode('latin-1').lower()
+        body = headers_end + 4
+        length = re.search(r'content-length:\s*(\d+)', headers)
+        if length:
+            end = body + int(length.group(1))
+            if len(buffer) < end:
+                return None
+        else:
+            # No length header: the part runs to the next delimiter
+            end = buffer.find(b'\r\n' + self.delimiter, body)
+            if end < 0:
+                return None
+        frame = bytes(buffer[body:end])
+        del buffer[:end]
+        return frame
+
+
+def iter_chunks(response):
+    """Upstream bytes as they arrive, not in fixed-size blocks that would hold frames back"""
+    read1 = getattr(response.raw, 'read1', None)  # urllib3 2: whatever has arrived, up to READ_CHUNK
+    if read1 is None:
+        yield from response.iter_content(chunk_size=None)
+        return
+    while True:
+        chunk = read1(READ_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+class Viewer:
+    """One client's bounded frame queue; pushes come from the upstream thread"""
+
+    def __init__(self, key, buffer, loop=None):
+        self.key = key
+        self.frames = deque(maxlen=buffer)
+        self.dropped = 0
+        self.closed = False
+        self._ready = threading.Event()
+        self._loop = loop
+        self._async_ready = asyncio.Event() if loop is not None else None
+
+    def push(self, frame):
+        if len(self.frames) == self.frames.maxlen:
+            self.dropped += 1  # the oldest queued frame falls off the ring
+        self.frames.append(frame)
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        self._ready.set()
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._async_ready.set)
+            except RuntimeError:
+                pass  # the viewer's event loop has already shut down
+
+    def get(self, timeout=FRAME_TIMEOUT):
+        """Next queued frame, or None once closed or after timeout seconds without one"""
+        while not self.closed:
+            try:
+                return self.frames.popleft()
+            except IndexError:
+                pass
+            self._ready.clear()
+            if not self.frames and not self.closed and not self._ready.wait(timeout):
+                return None
+        return None
+
+    async def get_async(self, timeout=FRAME_TIMEOUT):
+        while not self.closed:
+            try:
+                return self.frames.popleft()
+            except IndexError:
+                pass
+            self._async_ready.clear()
+            if not self.frames and not self.closed:
+                try:
+                    await asyncio.wait_for(self._async_ready.wait(), timeout)
+                except asyncio.TimeoutError:
+                    return None
+        return None
+
+
+class CameraStream:
+    """One upstream connection and the viewers it feeds"""
+
+    def __init__(self, relay, key):
+        self.relay = relay
+        self.key = key
+        self.viewers = set()
+        self.response = None
+        self.stopped = False
+        self.last_frame = None
+        self.last_frame_at = 0.0
+        self.frames = 0
+        self.bytes = 0
+        self.connects = 0
+        self.last_error = None
+        self.thread = threading.Thread(target=self._run, name=f"mjpeg-{key}", daemon=True)
+
+    def _run(self):
+        while not self.stopped:
+            try:
+                response = self.relay.open_stream(self.key)
+                with self.relay._lock:
+                    if self.stopped:
+                        response.close()
+                        return
+                    self.response = response
+                    self.connects += 1
+                parser = MultipartParser(response.headers.get('Content-Type'))
+                for chunk in iter_chunks(response):
+                    for jpeg in parser.feed(chunk):
+                        self._fan_out(part(jpeg), len(jpeg))
+                    if self.stopped:
+                        break
+                self.last_error = "upstream closed the stream"
+            except Exception as e:
+                if not self.stopped:
+                    self.last_error = str(e) or type(e).__name__
+            finally:
+                if self.response is not None:
+                    self.response.close()
+                    self.response = None
+            if not self.stopped:
+                time.sleep(self.relay.reconnect_delay)
+
+    def _fan_out(self, frame, size):
+        with self.relay._lock:
+            viewers = list(self.viewers)
+            self.last_frame, self.last_frame_at = frame, time.monotonic()
+            self.frames += 1
+            self.bytes += size
+        for viewer in viewers:
+            viewer.push(frame)
+
+    def stop(self):
+        """Close the upstream; the reader thread sees the closed socket and exits"""
+        self.stopped = True
+        response = self.response
+        if response is not None:
+            response.close()
+
+
+class MJPEGRelay:
+    """Per-camera upstream streams shared by any number of viewers"""
+
+    def __init__(self, open_stream, client_buffer=CLIENT_BUFFER, linger=RELAY_LINGER,
+                 reconnect_delay=RECONNECT_DELAY, frame_timeout=FRAME_TIMEOUT):
+        self.open_stream = open_stream  # callable(key) -> streaming requests.Response; raises on failure
+        self.client_buffer = client_buffer
+        self.linger = linger
+        self.reconnect_delay = reconnect_delay
+        self.frame_timeout = frame_timeout
+        self._lock = threading.Lock()
+        self._streams = {}
+        self.counters = {"viewers_served": 0, "upstreams_opened": 0, "upstreams_closed": 0,
+                         "frames_dropped": 0}
+
+    # ------------------------------------------------------------------
+    # Viewers
+    # ------------------------------------------------------------------
+
+    def subscribe(self, key, loop=None):
+        """Register a viewer, opening the camera's upstream if nobody was watching"""
+        viewer = Viewer(key, self.client_buffer, loop)
+        with self._lock:
+            stream = self._streams.get(key)
+            start = stream is None
+            if start:
+                stream = self._streams[key] = CameraStream(self, key)
+                self.counters["upstreams_opened"] += 1
+            stream.viewers.add(viewer)
+            self.counters["viewers_served"] += 1
+            if stream.last_frame is not None and time.monotonic() - stream.last_frame_at < FRESH_FRAME:
+                viewer.push(stream.last_frame)
+        if start:
+            stream.thread.start()
+        return viewer
+
+    def unsubscribe(self, viewer):
+        """Remove a viewer; the upstream closes linger seconds after the last one leaves"""
+        viewer.close()
+        with self._lock:
+            self.counters["frames_dropped"] += viewer.dropped
+            stream = self._streams.get(viewer.key)
+            if stream is None:
+                return
+            stream.viewers.discard(viewer)
+            idle = not stream.viewers
+        if idle:
+            if self.linger:
+                timer = threading.Timer(self.linger, self._close_if_idle, args=(stream,))
+                timer.daemon = True
+                timer.start()
+            else:
+                self._close_if_idle(stream)
+
+    def _close_if_idle(self, stream):
+        with self._lock:
+            if stream.viewers or self._streams.get(stream.key) is not stream:
+                return
+            del self._streams[stream.key]
+            self.counters["upstreams_closed"] += 1
+        stream.stop()
+
+    def frames(self, key):
+        """Generator of multipart sections for one viewer (sync servers)"""
+        viewer = self.subscribe(key)
+        try:
+            while True:
+                frame = viewer.get(self.frame_timeout)
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(viewer)
+
+    async def frames_async(self, key):
+        """Async generator of multipart sections for one viewer (asyncio servers)"""
+        viewer = self.subscribe(key, asyncio.get_running_loop())
+        try:
+            while True:
+                frame = await viewer.get_async(self.frame_timeout)
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.unsubscribe(viewer)
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def stats(self):
+        with self._lock:
+            streams = {key: {
+                "viewers": len(stream.viewers),
+                "frames": stream.frames,
+                "bytes": stream.bytes,
+                "upstream_connects": stream.connects,
+                "dropped_now": sum(viewer.dropped for viewer in stream.viewers),
+                "last_frame_age": round(time.monotonic() - stream.last_frame_at, 3) if stream.last_frame else None,
+                "last_error": stream.last_error
+            } for key, stream in self._streams.items()}
+            return dict(self.counters, streams=streams, client_buffer=self.client_buffer, linger=self.linger)
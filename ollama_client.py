@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Ollama Client
+Blocking and streaming /api/chat calls shared by both bridges
+"""
+
+import json
+import os
+import time
+
+import http_client
+
+# Configuration
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://100.94.114.43:11434')
+OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'dolphin-llama3:latest')
+OLLAMA_EMBED_MODEL = os.getenv('OLLAMA_EMBED_MODEL', 'nomic-embed-text')
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')  # how long Ollama keeps the model loaded after a call
+
+
+class OllamaError(Exception):
+    """Raised when Ollama is unreachable or answers with an error"""
+
+
+def chat_payload(messages, model, stream, keep_alive, options, format=None):
+    """/api/chat body; format is "json" or a JSON schema that constrains the reply"""
+    payload = {"model": model, "messages": messages, "stream": stream, "keep_alive": keep_alive}
+    if options:
+        payload["options"] = options
+    if format:
+        payload["format"] = format
+    return payload
+
+
+def chat(messages, base_url=OLLAMA_URL, model=OLLAMA_MODEL, endpoint='ollama_generate',
+         keep_alive=OLLAMA_KEEP_ALIVE, options=None, on_done=None, format=None):
+    """Run one non-streaming /api/chat call and return the assistant's reply text.
+
+    on_done, if given, receives the final response body (with Ollama's
+    load/prompt/eval durations) for latency accounting.
+    """
+    response = http_client.post(f"{base_url}/api/chat", endpoint=endpoint,
+                                json=chat_payload(messages, model, False, keep_alive, options, format))
+    if response.status_code != 200:
+        raise OllamaError(f"AI service returned HTTP {response.status_code}")
+    body = response.json()
+    if on_done:
+        on_done(body)
+    return (body.get('message') or {}).get('content', '')
+
+
+def stream_chat(messages, base_url=OLLAMA_URL, model=OLLAMA_MODEL, endpoint='ollama_generate',
+                keep_alive=OLLAMA_KEEP_ALIVE, options=None, on_done=None, format=None):
+    """Yield reply tokens from /api/chat as Ollama produces them (NDJSON stream)"""
+    response = http_client.post(f"{base_url}/api/chat", endpoint=endpoint, stream=True,
+                                json=chat_payload(messages, model, True, keep_alive, options, format))
+    try:
+        if response.status_code != 200:
+            raise OllamaError(f"AI service returned HTTP {response.status_code}")
+
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if chunk.get('error'):
+                raise OllamaError(chunk['error'])
+            token = (chunk.get('message') or {}).get('content', '')
+            if token:
+                yield token
+            if chunk.get('done'):
+                if on_done:
+                    on_done(chunk)
+                break
+    finally:
+        response.close()
+
+
+def embed(text, base_url=OLLAMA_URL, model=OLLAMA_EMBED_MODEL):
+    """Return the embedding vector for a piece of text"""
+    response = http_client.post(f"{base_url}/api/embeddings", endpoint='ollama_embeddings',
+                                json={"model": model, "prompt": text})
+    if response.status_code != 200:
+        raise OllamaError(f"Embedding service returned HTTP {response.status_code}")
+    return response.json().get('embedding') or None
+
+
+class StreamTimer:
+    """Milestones for one streamed request, relative to when it started"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_token_ms = None
+        self.first_action_ms = None
+
+    def elapsed_ms(self):
+        return round((time.monotonic() - self.started) * 1000, 1)
+
+    def token(self):
+        if self.first_token_ms is None:
+            self.first_token_ms = self.elapsed_ms()
+
+    def action(self):
+        if self.first_action_ms is None:
+            self.first_action_ms = self.elapsed_ms()
+
+    def summary(self):
+        return {
+            "time_to_first_token_ms": self.first_token_ms,
+            "time_to_first_action_ms": self.first_action_ms,
+            "total_ms": self.elapsed_ms()
+        }
+
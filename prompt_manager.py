@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Prompt Manager
+Sends every LLM call as /api/chat with a fixed system message per prompt
+kind, so the long instruction block is a byte-identical prefix Ollama can
+reuse from its KV cache. Pins the model with keep_alive, warms it up at
+startup and separates cold-load from warm latency. Prompts that expect JSON
+register a schema, sent as Ollama's `format` so replies parse first time.
+Every call waits for a slot from the process-wide llm_scheduler under its
+prompt's priority class, then goes to the host and model llm_router picks
+for the prompt's tier.
+"""
+
+import os
+import threading
+
+import llm_scheduler
+import ollama_client
+from llm_router import OLLAMA_BACKENDS, LLMRouter
+from ollama_client import OLLAMA_KEEP_ALIVE, OLLAMA_MODEL, OLLAMA_URL
+
+# Configuration
+COLD_LOAD_SECONDS = float(os.getenv('OLLAMA_COLD_LOAD_SECONDS', '0.5'))  # load_duration above this = cold call
+WARM_UP = os.getenv('OLLAMA_WARM_UP', 'true').lower() in ('1', 'true', 'yes')
+JSON_FORMAT = os.getenv('OLLAMA_JSON_FORMAT', 'schema').lower()  # schema, json (Ollama < 0.5) or off
+
+NANOSECONDS = 1e9
+
+
+class PromptManager:
+    """Registry of system prompts plus cold/warm latency accounting for one backend pool"""
+
+    def __init__(self, base_url=OLLAMA_URL, model=OLLAMA_MODEL, keep_alive=OLLAMA_KEEP_ALIVE,
+                 cold_load_seconds=COLD_LOAD_SECONDS, json_format=JSON_FORMAT,
+                 scheduler=llm_scheduler.scheduler, router=None):
+        self.base_url = base_url
+        self.model = model
+        self.router = router or LLMRouter(OLLAMA_BACKENDS or [base_url], large_model=model)
+        self.keep_alive = keep_alive
+        self.cold_load_seconds = cold_load_seconds
+        self.json_format = json_format
+        self.scheduler = scheduler
+        self.system_prompts = {}
+        self.formats = {}
+        self.priorities = {}
+        self.tiers = {}
+        self._lock = threading.Lock()
+        self.warm_up_result = None
+        self.counters = {kind: {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "load_seconds": 0.0}
+                         for kind in ('cold', 'warm')}
+        self.prompt_tokens = {}  # prompt name -> {"calls", "prompt_tokens_evaluated"}
+
+    def register(self, name, system_prompt, schema=None, priority='query', tier='large'):
+        """Add a prompt kind; its system message must stay byte-identical between calls.
+
+        schema, if given, is the JSON schema replies must follow; priority is
+        the llm_scheduler class its calls queue under; tier picks the router's
+        small or large model.
+        """
+        self.system_prompts[name] = system_prompt.strip()
+        self.priorities[name] = priority
+        self.tiers[name] = tier
+        if schema is None or self.json_format == 'off':
+            self.formats[name] = None
+        else:
+            self.formats[name] = schema if self.json_format == 'schema' else 'json'
+
+    def messages(self, name, user):
+        return [{"role": "system", "content": self.system_prompts[name]},
+                {"role": "user", "content": user}]
+
+    def request(self, name, user, endpoint='ollama_generate', options=None):
+        """Keyword arguments for ollama_client.chat / stream_chat; the router replaces base_url and model"""
+        return {
+            "messages": self.messages(name, user),
+            "base_url": self.base_url,
+            "model": self.model,
+            "endpoint": endpoint,
+            "keep_alive": self.keep_alive,
+            "options": options,
+            "on_done": lambda body: self.record(name, body),
+            "format": self.formats.get(name)
+        }
+
+    def slot(self, name):
+        """Scheduler slot for one call of this prompt kind (see slot_async for the async bridges)"""
+        return self.scheduler.slot(self.priorities[name])
+
+    def slot_async(self, name):
+        return self.scheduler.slot_async(self.priorities[name])
+
+    def chat(self, name, user, endpoint='ollama_generate'):
+        with self.slot(name):
+            return self.router.chat(self.request(name, user, endpoint), self.tiers[name])
+
+    def stream_chat(self, name, user, endpoint='ollama_generate'):
+        """Token generator; the slot is held from the first token request until the stream ends"""
+        with self.slot(name):
+            yield from self.router.stream_chat(self.request(name, user, endpoint), self.tiers[name])
+
+    def start(self):
+        """Start backend health checks and the warm-up"""
+        self.router.start()
+        self.start_warm_up()
+
+    # ------------------------------------------------------------------
+    # Warm-up
+    # ------------------------------------------------------------------
+
+    def warm_up(self):
+        """Load each prompt's model on every host that serves it and prime its system prefix"""
+        results = {}
+        for name in self.system_prompts:
+            results[name] = {}
+            candidates = self.router.candidates(self.tiers[name])
+            for backend, model in candidates:
+                if model != candidates[0][1]:
+                    continue  # large-model fallback hosts for a small-tier prompt
+                try:
+                    with self.scheduler.slot('background'):
+                        ollama_client.chat(**dict(self.request(name, "ping", endpoint='ollama_generate',
+                                                               options={"num_predict": 1}),
+                                                  base_url=backend.url, model=model))
+                    results[name][backend.url] = "ok"
+                except Exception as e:
+                    results[name][backend.url] = f"error: {e}"
+        self.warm_up_result = results
+        return results
+
+    def start_warm_up(self):
+        """Warm up in the background so startup is not held up by a cold model load"""
+        if WARM_UP and self.system_prompts:
+            threading.Thread(target=self.warm_up, name='ollama-warm-up', daemon=True).start()
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def record(self, name, body):
+        """Account one finished call from Ollama's own timing fields"""
+        total = (body.get('total_duration') or 0) / NANOSECONDS
+        load = (body.get('load_duration') or 0) / NANOSECONDS
+        kind = 'cold' if load >= self.cold_load_seconds else 'warm'
+        with self._lock:
+            entry = self.counters[kind]
+            entry["calls"] += 1
+            entry["total_seconds"] += total
+            entry["max_seconds"] = max(entry["max_seconds"], total)
+            entry["load_seconds"] += load
+            tokens = self.prompt_tokens.setdefault(name, {"calls": 0, "prompt_tokens_evaluated": 0})
+            tokens["calls"] += 1
+            tokens["prompt_tokens_evaluated"] += body.get('prompt_eval_count') or 0
+
+    def stats(self):
+        with self._lock:
+            latency = {}
+            for kind, entry in self.counters.items():
+                calls = entry["calls"]
+                latency[kind] = dict(entry, avg_seconds=round(entry["total_seconds"] / calls, 3) if calls else 0.0,
+                                     avg_load_seconds=round(entry["load_seconds"] / calls, 3) if calls else 0.0)
+            prompts = {name: dict(entry, avg_prompt_tokens=round(entry["prompt_tokens_evaluated"] / entry["calls"], 1))
+                       for name, entry in self.prompt_tokens.items()}
+        return {
+            "model": self.model,
+            "keep_alive": self.keep_alive,
+            "json_format": self.json_format,
+            "warm_up": self.warm_up_result,
+            "latency": latency,
+            "prompts": prompts,
+            "system_prompt_chars": {name: len(prompt) for name, prompt in self.system_prompts.items()},
+            "scheduler": self.scheduler.stats(),
+            "router": self.router.stats()
+        }
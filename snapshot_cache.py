@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Camera Snapshot Cache
+Shares one upstream fetch per camera per freshness window across every
+browser, tablet and tab, coalescing concurrent misses into a single request
+"""
+
+import hashlib
+import os
+import threading
+import time
+
+# Configuration
+SNAPSHOT_FRESHNESS = float(os.getenv('SNAPSHOT_FRESHNESS', '5'))   # seconds a frame is served without refetching
+SNAPSHOT_MAX_STALE = float(os.getenv('SNAPSHOT_MAX_STALE', '60'))  # serve an older frame if the camera errors
+
+
+class SnapshotUnavailable(Exception):
+    """Raised when no frame can be served for a camera"""
+
+
+class Snapshot:
+    """One cached JPEG frame"""
+
+    def __init__(self, content, content_type='image/jpeg'):
+        self.content = content
+        self.content_type = content_type
+        self.etag = '"' + hashlib.sha1(content).hexdigest() + '"'
+        self.fetched_at = time.time()
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+class SnapshotCache:
+    """Per-camera freshness window with request coalescing and hit/miss counters"""
+
+    def __init__(self, fetch, freshness=SNAPSHOT_FRESHNESS, max_stale=SNAPSHOT_MAX_STALE):
+        self.fetch = fetch  # callable(entity_id) -> (bytes, content_type); raises on failure
+        self.freshness = freshness
+        self.max_stale = max_stale
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._inflight = {}  # entity_id -> threading.Event set when the leader's fetch finishes
+        self._errors = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "stale_served": 0,
+                         "errors": 0, "not_modified": 0}
+
+    def get(self, entity_id):
+        """Return a fresh-enough Snapshot, fetching upstream at most once per window"""
+        while True:
+            with self._lock:
+                snapshot = self._snapshots.get(entity_id)
+                if snapshot and snapshot.age() < self.freshness:
+                    self.counters["hits"] += 1
+                    return snapshot
+
+                waiter = self._inflight.get(entity_id)
+                if waiter is None:
+                    # This request becomes the leader and fetches for everyone
+                    waiter = threading.Event()
+                    self._inflight[entity_id] = waiter
+                    self.counters["misses"] += 1
+                    break
+                self.counters["coalesced"] += 1
+
+            waiter.wait()
+            with self._lock:
+                snapshot = self._snapshots.get(entity_id)
+                error = self._errors.get(entity_id)
+            if snapshot and snapshot.age() < self.freshness:
+                return snapshot
+            if error is not None:
+                return self._stale_or_raise(entity_id, error)
+
+        try:
+            content, content_type = self.fetch(entity_id)
+            snapshot = Snapshot(content, content_type)
+            with self._lock:
+                self._snapshots[entity_id] = snapshot
+                self._errors.pop(entity_id, None)
+            return snapshot
+        except Exception as e:
+            with self._lock:
+                self._errors[entity_id] = e
+                self.counters["errors"] += 1
+            return self._stale_or_raise(entity_id, e)
+        finally:
+            with self._lock:
+                self._inflight.pop(entity_id, None)
+            waiter.set()
+
+    def _stale_or_raise(self, entity_id, error):
+        with self._lock:
+            snapshot = self._snapshots.get(entity_id)
+            if snapshot and snapshot.age() < self.max_stale:
+                self.counters["stale_served"] += 1
+                return snapshot
+        raise SnapshotUnavailable(str(error))
+
+    def record_not_modified(self):
+        with self._lock:
+            self.counters["not_modified"] += 1
+
+    def hit_counts(self):
+        """Coalesced requests count as hits: they were served without a fetch of their own"""
+        with self._lock:
+            return self.counters["hits"] + self.counters["coalesced"], self.counters["misses"]
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            cameras = {entity_id: {"age_seconds": round(snapshot.age(), 2), "bytes": len(snapshot.content),
+                                   "etag": snapshot.etag}
+                       for entity_id, snapshot in self._snapshots.items()}
+        served = counters["hits"] + counters["misses"] + counters["coalesced"]
+        counters["hit_ratio"] = round((counters["hits"] + counters["coalesced"]) / served, 3) if served else 0.0
+        return dict(counters, freshness_seconds=self.freshness, cameras=cameras)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Camera Snapshot Variants
+Downscaled copies of cached camera frames for tiles and tablets. A variant is
+rendered once per source frame and size, using the JPEG decoder's draft mode
+so a thumbnail of a high-resolution frame is decoded at 1/2, 1/4 or 1/8 scale
+instead of full size. Variants are cached by the source frame's hash.
+"""
+
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from snapshot_cache import Snapshot
+
+# Configuration
+THUMB_WIDTH = int(os.getenv('SNAPSHOT_THUMB_WIDTH', '480'))     # dashboard tiles
+MEDIUM_WIDTH = int(os.getenv('SNAPSHOT_MEDIUM_WIDTH', '1280'))  # tablets, single-camera views
+VARIANT_QUALITY = int(os.getenv('SNAPSHOT_VARIANT_QUALITY', '80'))
+VARIANT_CACHE_SIZE = int(os.getenv('SNAPSHOT_VARIANT_CACHE', '64'))  # rendered variants kept
+
+SIZES = {'thumb': THUMB_WIDTH, 'medium': MEDIUM_WIDTH, 'full': None}  # size -> max width (None: original)
+
+
+def downscale(content, width, quality=VARIANT_QUALITY):
+    """JPEG bytes of content scaled to at most width pixels wide, or None if it is already that small"""
+    image = Image.open(io.BytesIO(content))
+    if image.width <= width:
+        return None
+    height = max(1, round(image.height * width / image.width))
+    # Let libjpeg decode at the smallest 1/2^n scale that is still at least width x height
+    image.draft('RGB', (width, height))
+    image = image.convert('RGB').resize((width, height), Image.Resampling.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=quality)
+    return output.getvalue()
+
+
+class SnapshotVariants:
+    """Size variants of a SnapshotCache's frames, rendered once per frame and kept in an LRU"""
+
+    def __init__(self, cache, sizes=None, quality=VARIANT_QUALITY, max_entries=VARIANT_CACHE_SIZE):
+        self.cache = cache
+        self.sizes = dict(SIZES if sizes is None else sizes)
+        self.quality = quality
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._variants = OrderedDict()  # (source etag, size) -> Snapshot, or None when the source is small enough
+        self._inflight = {}             # (source etag, size) -> threading.Event set when the render finishes
+        self.counters = {"hits": 0, "renders": 0, "coalesced": 0, "render_errors": 0,
+                         "render_seconds": 0.0, "source_bytes": 0, "variant_bytes": 0}
+        self.last_error = None
+
+    def get(self, entity_id, size='full'):
+        """Snapshot of one camera at the given size; raises SnapshotUnavailable like SnapshotCache.get"""
+        if size not in self.sizes:
+            raise ValueError(f"size must be one of {', '.join(self.sizes)}")
+        source = self.cache.get(entity_id)
+        if self.sizes[size] is None:
+            return source
+        key = (source.etag, size)
+        while True:
+            with self._lock:
+                if key in self._variants:
+                    self._variants.move_to_end(key)
+                    self.counters["hits"] += 1
+                    return self._variants[key] or source
+                waiter = self._inflight.get(key)
+                if waiter is None:
+                    waiter = self._inflight[key] = threading.Event()
+                    break
+                self.counters["coalesced"] += 1
+            waiter.wait()
+            with self._lock:
+                if key in self._variants:
+                    return self._variants[key] or source
+                if key not in self._inflight:
+                    return source  # the render failed; serve the original frame
+
+        try:
+            return self._render(key, source) or source
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            waiter.set()
+
+    def _render(self, key, source):
+        started = time.monotonic()
+        try:
+            content = downscale(source.content, self.sizes[key[1]], self.quality)
+        except (OSError, ValueError, Image.DecompressionBombError) as e:  # not an image Pillow will read
+            with self._lock:
+                self.counters["render_errors"] += 1
+                self.last_error = str(e)
+            return None
+        variant = None
+        if content is not None:
+            variant = Snapshot(content, 'image/jpeg')
+            variant.fetched_at = source.fetched_at
+        with self._lock:
+            self._variants[key] = variant
+            while len(self._variants) > self.max_entries:
+                self._variants.popitem(last=False)
+            self.counters["renders"] += 1
+            self.counters["render_seconds"] += time.monotonic() - started
+            self.counters["source_bytes"] += len(source.content)
+            self.counters["variant_bytes"] += len(content if content is not None else source.content)
+        return variant
+
+    def hit_counts(self):
+        """Coalesced requests count as hits: they were served without a render of their own"""
+        with self._lock:
+            return self.counters["hits"] + self.counters["coalesced"], self.counters["renders"]
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            cached = len(self._variants)
+        renders = counters["renders"]
+        counters["render_seconds"] = round(counters["render_seconds"], 3)
+        counters["avg_render_ms"] = round(counters["render_seconds"] * 1000 / renders, 1) if renders else None
+        counters["bytes_ratio"] = (round(counters["variant_bytes"] / counters["source_bytes"], 3)
+                                   if counters["source_bytes"] else None)
+        return dict(counters, sizes=self.sizes, quality=self.quality, cached=cached, last_error=self.last_error)
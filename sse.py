@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""
+Server-Sent Events helpers
+"""
+
+import json
+
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'  # stop reverse proxies from buffering the stream
+}
+
+
+def format_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
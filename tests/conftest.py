@@ -0,0 +1,39 @@
+"""
+Shared fixtures: the bridge modules live at the repository root, and the
+fakes stand in for Home Assistant so nothing here needs a network.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_ha import FakeHomeAssistant  # noqa: E402
+from ha_state_store import HAStateStore  # noqa: E402
+
+
+def wait_for(condition, timeout=5.0):
+    """Poll condition() until it is true; returns its last value"""
+    deadline = time.monotonic() + timeout
+    while True:
+        value = condition()
+        if value or time.monotonic() > deadline:
+            return value
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def fake_ha():
+    ha = FakeHomeAssistant().start()
+    yield ha
+    ha.stop()
+
+
+@pytest.fixture
+def state_store(fake_ha):
+    store = HAStateStore(fake_ha.url, fake_ha.token, reconnect_delay=0.1, load_timeout=5)
+    yield store
+    store.stop()
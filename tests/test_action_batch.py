@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+from action_batch import call_payload, execute_actions, execute_actions_async, plan_calls
+
+
+def action(service, entity_id=None, domain='light', **service_data):
+    planned = {"domain": domain, "service": service}
+    if entity_id is not None:
+        planned["entity_id"] = entity_id
+    if service_data:
+        planned["service_data"] = service_data
+    return planned
+
+
+def test_same_service_and_data_become_one_call():
+    stages = plan_calls([action('turn_on', 'light.kitchen', brightness=80),
+                         action('turn_on', 'light.hall', brightness=80),
+                         action('turn_on', 'light.porch', brightness=20),
+                         action('turn_off', 'switch.fan', domain='switch')])
+    assert len(stages) == 1
+    assert [(call["entity_ids"], call["indices"]) for call in stages[0]] == [
+        (['light.kitchen', 'light.hall'], [0, 1]), (['light.porch'], [2]), (['switch.fan'], [3])]
+    assert call_payload(stages[0][0]) == {"brightness": 80, "entity_id": ['light.kitchen', 'light.hall']}
+    assert call_payload(stages[0][1]) == {"brightness": 20, "entity_id": 'light.porch'}
+
+
+def test_actions_on_one_entity_keep_their_order():
+    stages = plan_calls([action('turn_on', 'light.kitchen'), action('turn_on', 'light.hall'),
+                         action('turn_off', 'light.kitchen'), action('turn_on', 'light.kitchen')])
+    assert [[call["indices"] for call in stage] for stage in stages] == [[[0, 1]], [[2]], [[3]]]
+
+
+def test_untargeted_calls_wait_for_everything_before_them():
+    stages = plan_calls([action('turn_on', 'light.kitchen'), action('turn_off', 'all'),
+                         action('turn_on', 'light.hall')])
+    assert [[call["indices"] for call in stage] for stage in stages] == [[[0]], [[1]], [[2]]]
+
+
+def test_results_come_back_per_action_in_order():
+    calls = []
+    lock = threading.Lock()
+
+    def call_service(domain, service, service_data):
+        with lock:
+            calls.append((domain, service, service_data))
+        if domain == 'switch':
+            raise ConnectionError("HA unreachable")
+        return {"success": True, "status_code": 200}
+
+    actions = [action('turn_on', 'light.kitchen'), action('turn_off', 'switch.fan', domain='switch'),
+               action('turn_on', 'light.hall')]
+    results = execute_actions(actions, call_service)
+    assert len(calls) == 2
+    assert results == [
+        {"success": True, "status_code": 200, "action": "light.turn_on", "entity": "light.kitchen", "batched_with": 2},
+        {"success": False, "error": "HA unreachable", "action": "switch.turn_off", "entity": "switch.fan"},
+        {"success": True, "status_code": 200, "action": "light.turn_on", "entity": "light.hall", "batched_with": 2}]
+
+    async def call_service_async(domain, service, service_data):
+        return call_service(domain, service, service_data)
+
+    assert asyncio.run(execute_actions_async(actions, call_service_async)) == results
@@ -0,0 +1,160 @@
+import asyncio
+import time
+
+import pytest
+from flask import Flask
+from quart import Quart
+
+import bridge_io
+
+
+async def double_async(value):
+    await asyncio.sleep(0)
+    return value * 2
+
+
+def doubled(value):
+    result = yield bridge_io.Call(lambda v: v * 2, double_async, value)
+    return result + (yield bridge_io.Blocking(len, 'abc'))
+
+
+def both_ways(handler_factory):
+    """The result of one handler under the sync driver and under the async one"""
+    return bridge_io.run(handler_factory()), asyncio.run(bridge_io.run_async(handler_factory()))
+
+
+def test_both_drivers_give_the_same_result():
+    assert both_ways(lambda: doubled(4)) == (11, 11)
+    assert both_ways(lambda: {"plain": "value"}) == ({"plain": "value"}, {"plain": "value"})
+
+
+def test_effect_errors_are_raised_at_the_yield():
+    def fail(*args):
+        raise ConnectionError("HA unreachable")
+
+    async def fail_async(*args):
+        fail()
+
+    def handler():
+        try:
+            yield bridge_io.Call(fail, fail_async)
+        except ConnectionError as e:
+            return {"error": str(e)}
+
+    assert both_ways(handler) == ({"error": "HA unreachable"}, {"error": "HA unreachable"})
+
+
+def test_fan_out_reports_stragglers():
+    def probe(delay):
+        yield bridge_io.Blocking(time.sleep, delay)
+        return delay
+
+    def handler():
+        return (yield bridge_io.FanOut({'fast': probe(0), 'slow': probe(1)}, deadline=0.3))
+
+    assert both_ways(handler) == (({'fast': 0}, ['slow']), ({'fast': 0}, ['slow']))
+
+
+def test_closed_stream_closes_what_it_was_reading():
+    closed = []
+
+    def numbers():
+        try:
+            yield from range(100)
+        finally:
+            closed.append('sync')
+
+    async def numbers_async():
+        try:
+            for number in range(100):
+                yield number
+        finally:
+            closed.append('async')
+
+    def handler():
+        items = yield bridge_io.Iterate(numbers, numbers_async)
+        while True:
+            item = yield bridge_io.Next(items)
+            if item is None:
+                return
+            yield f"{item}\n"
+
+    chunks = bridge_io.stream(handler())
+    assert [next(chunks), next(chunks)] == ["0\n", "1\n"]
+    chunks.close()
+
+    async def read_two():
+        chunks = bridge_io.stream_async(handler())
+        first = [await chunks.__anext__(), await chunks.__anext__()]
+        await chunks.aclose()
+        return first
+
+    assert asyncio.run(read_two()) == ["0\n", "1\n"]
+    assert closed == ['sync', 'async']
+
+
+def test_handler_may_not_yield_chunks_outside_a_stream():
+    def handler():
+        yield "event: token\n\n"
+
+    with pytest.raises(TypeError):
+        bridge_io.run(handler())
+    with pytest.raises(TypeError):
+        asyncio.run(bridge_io.run_async(handler()))
+
+
+def routes():
+    routes = bridge_io.Routes()
+
+    @routes.route('/double/<int:value>')
+    def double(request, value):
+        return {"value": (yield from doubled(value)), "verbose": request.args.get('verbose')}
+
+    @routes.route('/command', methods=['POST'])
+    def command(request):
+        if not (request.json or {}).get('command'):
+            return {"error": "No command provided"}, 400, {'X-Reason': 'empty'}
+        if request.wants_stream():
+            return bridge_io.Stream(iter_events(request.json['command']))
+        return {"command": request.json['command'], "host": request.host_url}
+
+    def iter_events(command):
+        for word in command.split():
+            yield f"event: token\ndata: {word}\n\n"
+            yield bridge_io.Blocking(time.sleep, 0)
+
+    return routes
+
+
+def test_flask_and_quart_serve_the_same_routes():
+    flask_app, quart_app = Flask(__name__), Quart(__name__)
+    shared = routes()
+    shared.install(flask_app)
+    shared.install_async(quart_app)
+
+    sync_client = flask_app.test_client()
+    sync_results = [
+        sync_client.get('/double/4?verbose=1').get_json(),
+        sync_client.post('/command', json={}),
+        sync_client.post('/command', json={"command": "lights on"}).get_json(),
+        sync_client.post('/command', json={"command": "lights on", "stream": True}).get_data(as_text=True)
+    ]
+
+    async def async_requests():
+        client = quart_app.test_client()
+        empty = await client.post('/command', json={})
+        streamed = await client.post('/command', json={"command": "lights on"},
+                                     headers={'Accept': 'text/event-stream'})
+        return [
+            await (await client.get('/double/4?verbose=1')).get_json(),
+            empty,
+            await (await client.post('/command', json={"command": "lights on"})).get_json(),
+            await streamed.get_data(as_text=True)
+        ]
+
+    async_results = asyncio.run(async_requests())
+    assert sync_results[0] == async_results[0] == {"value": 11, "verbose": "1"}
+    assert [(r.status_code, r.headers['X-Reason']) for r in (sync_results[1], async_results[1])] == \
+        [(400, 'empty'), (400, 'empty')]
+    assert sync_results[2] == async_results[2] == {"command": "lights on", "host": "http://localhost/"}
+    assert sync_results[3] == async_results[3] == "event: token\ndata: lights\n\nevent: token\ndata: on\n\n"
@@ -0,0 +1,66 @@
+import io
+
+import pytest
+from PIL import Image
+
+from camera_mosaic import CameraMosaic, MosaicError
+from snapshot_cache import Snapshot, SnapshotUnavailable
+from snapshot_variants import SIZES
+
+
+def jpeg(width=320, height=180):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 40, 40)).save(output, 'JPEG')
+    return output.getvalue()
+
+
+class StubVariants:
+    """Serves the same frame for every camera except the offline ones"""
+
+    def __init__(self, offline=()):
+        self.sizes = dict(SIZES)
+        self.offline = set(offline)
+        self.requests = []
+        self.frame = Snapshot(jpeg())
+
+    def get(self, entity_id, size='full'):
+        self.requests.append((entity_id, size))
+        if entity_id in self.offline:
+            raise SnapshotUnavailable(f"{entity_id} is offline")
+        return self.frame
+
+
+def cameras(count):
+    return {f"camera_{i}": f"camera.camera_{i}" for i in range(count)}
+
+
+def test_layout_defaults_to_a_square_grid():
+    mosaic = CameraMosaic(StubVariants(), cameras(7))
+    assert mosaic.layout(1280) == (1278, 3, 3, 426, 240)
+    assert mosaic.layout(1280, 7) == (1274, 7, 1, 182, 102)
+
+
+def test_layout_rejects_bad_width_and_columns():
+    mosaic = CameraMosaic(StubVariants(), cameras(4))
+    with pytest.raises(MosaicError):
+        mosaic.layout(100)
+    with pytest.raises(MosaicError):
+        mosaic.layout(1280, 5)
+
+
+def test_narrow_grid_builds_at_the_rounded_width():
+    # 161 / 3 rounds down to 159 pixels; the build must use that layout, not re-derive it
+    mosaic = CameraMosaic(StubVariants(), cameras(7))
+    image = Image.open(io.BytesIO(mosaic.get(161, 3).content))
+    assert image.size == (159, 3 * 30)
+
+
+def test_mosaic_marks_offline_cameras_and_is_cached():
+    variants = StubVariants(offline={'camera.camera_1'})
+    mosaic = CameraMosaic(variants, cameras(4))
+    first = mosaic.get(640)
+    assert first.missing == ['camera_1']
+    assert Image.open(io.BytesIO(first.content)).size == (640, 2 * 180)
+    assert all(size == 'thumb' for _, size in variants.requests)
+    assert mosaic.get(640) is first
+    assert mosaic.hit_counts() == (1, 1)
@@ -0,0 +1,53 @@
+import pytest
+
+from camera_resolver import CameraResolver, PhraseMatcher
+from conftest import wait_for
+
+MAPPINGS = {'road': 'camera.road', 'back road': 'camera.back_road', 'front door': 'camera.front_door',
+            'doorbell': 'camera.front_door', 'garage': 'camera.garage'}
+NAMES = {'camera.road': 'Road', 'camera.back_road': 'Back Road', 'camera.front_door': 'Front Door',
+         'camera.garage': 'Garage'}
+
+
+def test_phrase_matcher_finds_overlapping_phrases_in_one_pass():
+    matcher = PhraseMatcher({'back road': 1, 'road': 2, 'road camera': 3})
+    found = sorted((start, end, value) for start, end, _, value in matcher.find_all("show the back road camera"))
+    assert found == [(2, 4, 1), (3, 4, 2), (3, 5, 3)]
+    assert matcher.contains_any("is the ROAD clear?")
+    assert not matcher.contains_any("roadside")
+
+
+def test_longest_match_wins():
+    match = CameraResolver(MAPPINGS, NAMES).resolve("show me the back road")
+    assert match['entity_id'] == 'camera.back_road'
+    assert not match['ambiguous']
+    assert match['confidence'] == 1.0
+
+
+def test_competing_cameras_are_reported():
+    match = CameraResolver(MAPPINGS, NAMES).resolve("compare the garage and the front door")
+    assert match['entity_id'] == 'camera.front_door'
+    assert match['ambiguous']
+    assert match['alternatives'] == [{'entity_id': 'camera.garage', 'name': 'Garage'}]
+
+
+def test_no_camera():
+    assert CameraResolver(MAPPINGS, NAMES).resolve("turn on the kitchen lights") is None
+
+
+def test_discovers_cameras_from_the_state_store(fake_ha, state_store):
+    fake_ha.set_state('camera.side_gate', 'idle', {'friendly_name': 'Side Gate Camera'})
+    state_store.start()
+    assert state_store.wait_ready(5)
+    resolver = CameraResolver(MAPPINGS, NAMES, state_store)
+    assert resolver.resolve("show the side gate")['name'] == 'Side Gate Camera'
+
+    # A new camera in HA recompiles the automaton
+    fake_ha.set_state('camera.pool', 'idle', {'friendly_name': 'Pool Camera'})
+    assert wait_for(lambda: state_store.get('camera.pool') is not None)
+    assert resolver.resolve("show the pool")['entity_id'] == 'camera.pool'
+
+
+@pytest.mark.parametrize('command', ["Show me the DOORBELL!", "doorbell camera please"])
+def test_case_and_punctuation_are_ignored(command):
+    assert CameraResolver(MAPPINGS, NAMES).resolve(command)['entity_id'] == 'camera.front_door'
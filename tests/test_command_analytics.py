@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from action_batch import execute_actions
+from command_analytics import CommandAnalytics, LatencySketch
+from command_history import CommandHistory
+
+
+def row(ts, outcome='success', response_ms=100.0, action='light.turn_on', entity_id='light.kitchen', source='llm'):
+    return {'ts': ts, 'outcome': outcome, 'response_ms': response_ms, 'action': action,
+            'entity_id': entity_id, 'source': source}
+
+
+def test_rolling_windows_only_count_their_own_span():
+    analytics = CommandAnalytics()
+    now = time.time()
+    analytics.observe(row(now))
+    analytics.observe(row(now - 30 * 60, outcome='failed'))
+    analytics.observe(row(now - 3 * 3600))
+    analytics.observe(row(now - 3 * 86400, outcome='rejected'))
+    analytics.observe(row(now - 30 * 86400))  # older than every window; dropped
+
+    counts = {name: analytics.window(name)['commands'] for name in ('5m', '1h', '24h', '7d')}
+    assert counts == {'5m': 1, '1h': 2, '24h': 3, '7d': 4}
+    assert analytics.window('1h')['success_rate'] == 0.5
+    assert analytics.window('7d')['outcomes'] == {'success': 2, 'failed': 1, 'rejected': 1}
+
+
+def test_breakdowns_count_commands_and_failures():
+    analytics = CommandAnalytics()
+    now = time.time()
+    analytics.observe(row(now, entity_id='light.kitchen'))
+    analytics.observe(row(now, outcome='failed', entity_id='light.kitchen'))
+    analytics.observe(row(now, action='fan.turn_off', entity_id='fan.office', source='fast_path'))
+    summary = analytics.summary()
+    assert summary['entities'][0] == {'key': 'light.kitchen', 'commands': 2, 'failures': 1}
+    assert {entry['key'] for entry in summary['intents']} == {'light.turn_on', 'fan.turn_off'}
+    assert {entry['key']: entry['commands'] for entry in summary['sources']} == {'llm': 2, 'fast_path': 1}
+
+
+def test_latency_quantiles_within_sketch_accuracy():
+    sketch = LatencySketch()
+    for value in range(1, 1001):
+        sketch.add(float(value))
+    summary = sketch.summary()
+    assert summary['p50'] == pytest.approx(500, rel=0.02)
+    assert summary['p99'] == pytest.approx(990, rel=0.02)
+
+
+def test_main_bridge_replies_reach_the_breakdowns(tmp_path):
+    history = CommandHistory(str(tmp_path / 'history.db'))
+    analytics = CommandAnalytics()
+    analytics.attach(history)
+
+    def call_service(domain, service, service_data):
+        if domain == 'fan':
+            return {"success": False, "error": "HA returned 500"}
+        return {"success": True, "status_code": 200}
+
+    # The shape ha_bridge.py returns: batched execution_results alongside the planned actions
+    actions = [{"domain": "light", "service": "turn_on", "entity_id": "light.kitchen"},
+               {"domain": "fan", "service": "turn_off", "entity_id": "fan.office"}]
+    reply = {"success": True, "source": "fast_path", "response": "Done",
+             "ai_interpretation": {"actions": actions},
+             "execution_results": execute_actions(actions, call_service)}
+    history.record("turn on the kitchen light and turn off the office fan", reply, response_ms=40)
+    history.record("turn on the kitchen light", dict(reply, ai_interpretation={"actions": actions[:1]},
+                                                     execution_results=execute_actions(actions[:1], call_service)),
+                   response_ms=20)
+
+    summary = analytics.summary()
+    assert summary['windows']['5m']['commands'] == 2
+    assert summary['windows']['5m']['success_rate'] == 0.5
+    assert {entry['key']: (entry['commands'], entry['failures']) for entry in summary['entities']} == \
+        {'fan.office': (1, 1), 'light.kitchen': (1, 0)}
+    assert {entry['key'] for entry in summary['intents']} == {'fan.turn_off', 'light.turn_on'}
+    assert summary['sources'] == [{'key': 'fast_path', 'commands': 2, 'failures': 1}]
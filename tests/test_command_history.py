@@ -0,0 +1,113 @@
+import sqlite3
+
+import pytest
+
+from action_validation import rejected_result
+from command_history import CommandHistory, HistoryError, summarize, touched_entities
+
+
+@pytest.fixture
+def history(tmp_path):
+    return CommandHistory(str(tmp_path / 'history.db'))
+
+
+def test_summarize_camera_bridge_reply():
+    result = {"success": True, "source": "llm", "response": "Showing the garage",
+              "ai_interpretation": {"domain": "camera", "service": "snapshot", "entity_id": "camera.garage"},
+              "execution_result": {"success": True, "status_code": 200}}
+    assert summarize(result) == ('success', 'camera.garage', 'camera.snapshot', 'llm', 'Showing the garage')
+
+
+def test_summarize_camera_view_without_action():
+    result = {"success": True, "camera_entity": "camera.front_door", "response": "Displaying Front Door"}
+    assert summarize(result)[:3] == ('success', 'camera.front_door', 'camera.view')
+
+
+def test_summarize_main_bridge_names_the_failing_action():
+    result = {"success": True, "source": "fast_path", "response": "ok",
+              "ai_interpretation": {"actions": [
+                  {"domain": "light", "service": "turn_on", "entity_id": "light.kitchen"},
+                  {"domain": "fan", "service": "turn_off", "entity_id": "fan.office"}]},
+              "execution_results": [
+                  {"success": True, "status_code": 200, "action": "light.turn_on", "entity": "light.kitchen"},
+                  {"success": False, "error": "timeout", "action": "fan.turn_off", "entity": "fan.office"}]}
+    assert summarize(result) == ('failed', 'fan.office', 'fan.turn_off', 'fast_path', 'ok')
+
+
+def test_summarize_rejected_action():
+    action = {"domain": "lock", "service": "unlock", "entity_id": "lock.front_door"}
+    result = {"success": True, "source": "llm", "ai_interpretation": {"actions": [action]},
+              "execution_results": [rejected_result(action, "lock.unlock needs confirmation")]}
+    assert summarize(result)[:3] == ('rejected', 'lock.front_door', 'lock.unlock')
+
+
+def test_summarize_error_reply():
+    assert summarize({"success": False, "error": "AI service unavailable"}) == \
+        ('failed', None, None, None, 'AI service unavailable')
+
+
+def test_record_and_page(history):
+    history.record("turn on the kitchen lights", {"success": True, "source": "fast_path", "execution_results": [
+        {"success": True, "action": "light.turn_on", "entity": "light.kitchen"}]}, response_ms=12)
+    history.append("open the garage", 'failed', entity_id='cover.garage', response_ms=300)
+    page = history.page(limit=1)
+    assert [row['command'] for row in page['commands']] == ["open the garage"]
+    older = history.page(limit=1, cursor=page['next_cursor'])
+    assert older['commands'][0]['entity_id'] == 'light.kitchen'
+    assert history.page(outcome='failed')['commands'][0]['command'] == "open the garage"
+
+
+@pytest.mark.parametrize('fields', [
+    {'command': ''},
+    {'command': 'x' * 1001},
+    {'outcome': 'maybe'},
+    {'entity_id': '<img src=x onerror=alert(1)>' * 20},
+    {'response_ms': 'fast'},
+    {'response_ms': -1},
+    {'entity_ids': [42]},
+    {'entity_ids': [f'light.l{i}' for i in range(101)]},
+])
+def test_append_validates_fields(history, fields):
+    arguments = dict({'command': 'turn on the lights', 'outcome': 'success'}, **fields)
+    with pytest.raises(HistoryError):
+        history.append(**arguments)
+
+
+def test_entity_filter_finds_every_entity_a_command_touched(history):
+    actions = [{"domain": "light", "service": "turn_on", "entity_id": ["light.kitchen", "light.hall"]},
+               {"domain": "fan", "service": "turn_off", "entity_id": "fan.office"}]
+    result = {"success": True, "ai_interpretation": {"actions": actions}, "execution_results": [
+        {"success": True, "action": "light.turn_on", "entity": "light.kitchen", "batched_with": 2},
+        {"success": True, "action": "light.turn_on", "entity": "light.hall", "batched_with": 2},
+        {"success": True, "action": "fan.turn_off", "entity": "fan.office"}]}
+    assert touched_entities(result) == ["light.kitchen", "light.hall", "fan.office"]
+    command_id = history.record("lights on, fan off", result)
+    history.append("fan on", 'success', entity_id='fan.office')
+
+    for entity_id in ("light.kitchen", "light.hall"):
+        assert [row['id'] for row in history.page(entity_id=entity_id)['commands']] == [command_id]
+    page = history.page(entity_id='fan.office', limit=1)
+    assert page['commands'][0]['command'] == "fan on"
+    assert history.page(entity_id='fan.office', cursor=page['next_cursor'])['commands'][0]['id'] == command_id
+
+
+def test_compaction_removes_entity_rows(history):
+    history.append("old", 'success', entity_id='light.a', entity_ids=['light.b'], ts=1)
+    assert history.compact() == 1
+    assert history.page(entity_id='light.b')['commands'] == []
+    assert history._connection().execute('SELECT COUNT(*) FROM command_entities').fetchone()[0] == 0
+
+
+def test_existing_store_is_indexed_on_upgrade(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE commands (id INTEGER PRIMARY KEY AUTOINCREMENT, ts REAL NOT NULL, command TEXT NOT NULL,
+            outcome TEXT NOT NULL, entity_id TEXT, action TEXT, source TEXT, bridge TEXT, response_ms REAL,
+            request_id TEXT, response TEXT);
+        CREATE INDEX commands_entity ON commands (entity_id, id);
+        INSERT INTO commands (ts, command, outcome, entity_id) VALUES (1e10, 'lock up', 'success', 'lock.front');
+    """)
+    conn.close()
+    history = CommandHistory(path)
+    assert history.page(entity_id='lock.front')['commands'][0]['command'] == 'lock up'
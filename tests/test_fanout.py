@@ -0,0 +1,63 @@
+import asyncio
+import threading
+import time
+
+from fanout import fan_out, fan_out_async, timed_out
+
+
+def test_results_errors_and_pending():
+    release = threading.Event()
+
+    def fail():
+        raise RuntimeError("HA unreachable")
+
+    results, pending = fan_out({'ok': lambda: 1, 'bad': fail, 'slow': lambda: release.wait(5)}, deadline=0.2)
+    release.set()
+    assert results == {'ok': 1, 'bad': {'error': 'HA unreachable'}}
+    assert pending == ['slow']
+
+
+def test_waits_for_the_slowest_not_the_sum():
+    started = time.monotonic()
+    results, pending = fan_out({key: lambda: time.sleep(0.2) or True for key in range(10)}, deadline=2)
+    assert len(results) == 10 and not pending
+    assert time.monotonic() - started < 1
+
+
+def test_stragglers_do_not_starve_the_next_fan_out():
+    release = threading.Event()
+    try:
+        # More stuck calls than any shared pool would have workers
+        _, pending = fan_out({key: lambda: release.wait(5) for key in range(40)}, deadline=0.1)
+        assert len(pending) == 40
+        results, pending = fan_out({'home_assistant': lambda: 'up', 'ai_service': lambda: 'up'}, deadline=1)
+        assert results == {'home_assistant': 'up', 'ai_service': 'up'}
+        assert pending == []
+    finally:
+        release.set()
+
+
+def test_async_fan_out_cancels_pending():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def fast():
+        return 'up'
+
+    async def run():
+        results, pending = await fan_out_async({'fast': fast(), 'slow': slow()}, deadline=0.1)
+        await asyncio.sleep(0)
+        return results, pending
+
+    assert asyncio.run(run()) == ({'fast': 'up'}, ['slow'])
+    assert cancelled == [True]
+
+
+def test_timed_out_placeholder():
+    assert timed_out(3, name='Garage') == {'name': 'Garage', 'error': 'No response within 3s', 'timed_out': True}
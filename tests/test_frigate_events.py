@@ -0,0 +1,91 @@
+import time
+from datetime import datetime
+
+import pytest
+
+from conftest import wait_for
+from fake_mqtt import FakeMQTTBroker
+from frigate_events import DetectionIndex, FrigateSubscriber, parse_presence_question
+
+NOON = datetime(2026, 10, 14, 12, 0).timestamp()
+MIDNIGHT = datetime(2026, 10, 14).timestamp()
+
+
+def event(camera, label, event_id, start_time=None, event_type='new', **after):
+    detection = dict({"id": event_id, "camera": camera, "label": label, "score": 0.8,
+                      "start_time": start_time or time.time(), "end_time": None}, **after)
+    return {"type": event_type, "before": detection, "after": detection}
+
+
+@pytest.mark.parametrize('text, label, window, present', [
+    ("was anyone at the front door?", 'person', 'in the last hour', False),
+    ("is anyone in the driveway right now?", 'person', 'right now', True),
+    ("has someone left a package today?", 'package', 'today', False),
+    ("any cars in the last 3 hours?", 'car', 'in the last 3 hours', False),
+])
+def test_presence_questions_are_parsed(text, label, window, present):
+    question = parse_presence_question(text, now=NOON)
+    assert (question["label"], question["window"], question["present"]) == (label, window, present)
+
+
+def test_yesterday_is_a_closed_window():
+    question = parse_presence_question("did a car come by yesterday?", now=NOON)
+    assert (question["since"], question["until"]) == (MIDNIGHT - 86400, MIDNIGHT)
+
+
+@pytest.mark.parametrize('text', ["is the car charging?", "turn on the porch light", "what's the weather?"])
+def test_other_questions_are_not_presence(text):
+    assert parse_presence_question(text, now=NOON) is None
+
+
+def test_index_answers_from_recent_detections():
+    index = DetectionIndex()
+    now = time.time()
+    index.observe_event(event('front_door', 'person', 'a', start_time=now - 600))
+    index.observe_event(event('front_door', 'person', 'a', start_time=now - 600, event_type='end', end_time=now))
+    index.observe_event(event('driveway', 'car', 'b', start_time=now - 120))
+    index.observe_event(event('front_door', 'person', 'c', start_time=now - 60, false_positive=True))
+
+    assert [detection['id'] for detection in index.query()] == ['b', 'a']
+    assert (index.counters["events"], index.counters["updates"], index.counters["false_positives"]) == (2, 1, 1)
+    assert index.in_view('front_door', 'person') == 0
+
+    answer = index.answer(parse_presence_question("was anyone at the front door?"), 'front_door', 'Front Door')
+    assert answer["count"] == 1
+    assert answer["response"] == "Yes, 1 person detection at the Front Door in the last hour, most recently 10 minutes ago."
+    answer = index.answer(parse_presence_question("is anyone at the front door right now?"), 'front_door', 'Front Door')
+    assert answer["response"] == "No person at the Front Door right now. Last seen 10 minutes ago."
+
+
+def test_keys_are_bounded():
+    index = DetectionIndex(per_key=3, max_age=3600)
+    now = time.time()
+    index.observe_event(event('garden', 'cat', 'old', start_time=now - 7200))
+    for number in range(5):
+        index.observe_event(event('garden', 'cat', f"cat-{number}", start_time=now - 10 + number))
+    assert [detection['id'] for detection in index.query(limit=None)] == ['cat-4', 'cat-3', 'cat-2']
+    assert index.counters["evicted"] == 3
+
+
+def test_subscriber_indexes_only_known_cameras():
+    broker = FakeMQTTBroker().start()
+    index = DetectionIndex()
+    subscriber = FrigateSubscriber(index, host=broker.host, port=broker.port, enabled=True,
+                                   cameras=['front_door'])
+    try:
+        subscriber.start()
+        assert wait_for(lambda: broker.subscriber_count() == 1)
+        broker.frigate_event('front_door', 'person')
+        broker.object_count('front_door', 'person', 2)
+        broker.object_count('porch_zone', 'person', 1)
+        broker.publish('frigate/front_door/detect', 'ON')
+        broker.publish('frigate/events', b'{not json')
+        assert wait_for(lambda: subscriber.counters["messages"] == 5)
+
+        assert index.in_view() == 2
+        assert len(index.query('front_door', 'person')) == 1
+        assert (subscriber.counters["ignored"], subscriber.counters["bad_messages"]) == (1, 1)
+        assert subscriber.stats()["connected"]
+    finally:
+        subscriber.stop()
+        broker.stop()
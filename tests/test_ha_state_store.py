@@ -0,0 +1,46 @@
+from conftest import wait_for
+
+
+def test_initial_load_and_live_events(fake_ha, state_store):
+    fake_ha.set_state('light.kitchen', 'off', {'friendly_name': 'Kitchen'})
+    state_store.start()
+    assert state_store.wait_ready(5)
+    assert state_store.get('light.kitchen')['state'] == 'off'
+
+    assert wait_for(lambda: state_store.connected)
+    fake_ha.set_state('light.kitchen', 'on', {'friendly_name': 'Kitchen'})
+    assert wait_for(lambda: state_store.get('light.kitchen')['state'] == 'on')
+    assert state_store.stats()['events_applied'] >= 1
+
+
+def test_resync_after_reconnect(fake_ha, state_store):
+    fake_ha.set_state('light.kitchen', 'off')
+    fake_ha.set_state('switch.fan', 'on')
+    state_store.start()
+    assert state_store.wait_ready(5)
+    assert wait_for(lambda: state_store.connected)
+    resyncs = state_store.resync_count
+    changes = []
+    state_store.add_listener(lambda entity_id, old, new: changes.append(entity_id))
+
+    # Changes while the stream is down reach no subscriber; only the resync can pick them up
+    fake_ha.drop_connections()
+    fake_ha.set_state('light.kitchen', 'on')
+    fake_ha.remove_state('switch.fan')
+    fake_ha.set_state('lock.front_door', 'locked')
+
+    assert wait_for(lambda: state_store.resync_count > resyncs)
+    assert wait_for(lambda: state_store.connected)
+    assert state_store.get('light.kitchen')['state'] == 'on'
+    assert state_store.get('switch.fan') is None
+    assert state_store.get('lock.front_door')['state'] == 'locked'
+    assert {'light.kitchen', 'switch.fan', 'lock.front_door'} <= set(changes)
+
+
+def test_stale_event_does_not_overwrite_newer_state(state_store):
+    state_store._loaded.set()
+    newer = {'entity_id': 'light.hall', 'state': 'on', 'last_updated': '2026-01-01T00:00:02+00:00'}
+    older = {'entity_id': 'light.hall', 'state': 'off', 'last_updated': '2026-01-01T00:00:01+00:00'}
+    state_store.apply_event({'data': {'entity_id': 'light.hall', 'new_state': newer}})
+    state_store.apply_event({'data': {'entity_id': 'light.hall', 'new_state': older}})
+    assert state_store.get('light.hall')['state'] == 'on'
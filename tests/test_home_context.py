@@ -0,0 +1,59 @@
+import pytest
+
+from conftest import wait_for
+from home_context import HomeContextBuilder, estimate_tokens
+
+
+@pytest.fixture
+def builder(fake_ha, state_store):
+    fake_ha.set_state('light.kitchen_lights', 'on', {'friendly_name': 'Kitchen Lights', 'brightness': 128})
+    fake_ha.set_state('light.bedroom_lamp', 'off', {'friendly_name': 'Bedroom Lamp'})
+    fake_ha.set_state('climate.thermostat', 'heat', {'friendly_name': 'Thermostat', 'current_temperature': 19,
+                                                    'temperature': 21})
+    fake_ha.set_state('sensor.garden_temperature', '12', {'friendly_name': 'Garden Temperature',
+                                                         'device_class': 'temperature',
+                                                         'unit_of_measurement': '°C'})
+    fake_ha.set_state('lock.front_door', 'unlocked', {'friendly_name': 'Front Door'})
+    fake_ha.set_state('sensor.router_uptime', '42', {'friendly_name': 'Router Uptime'})
+    for number in range(40):
+        fake_ha.set_state(f'switch.outlet_{number}', 'off', {'friendly_name': f'Spare Outlet {number}'})
+    fake_ha.set_area('light.bedroom_lamp', 'Bedroom')
+    state_store.start()
+    assert state_store.wait_ready(5)
+    return HomeContextBuilder(state_store)
+
+
+def test_named_entities_outrank_the_rest(builder):
+    ranked = [entry['entity_id'] for _, entry, _ in builder.rank("is the kitchen light on?")]
+    assert ranked[0] == 'light.kitchen_lights'
+    assert 'switch.outlet_0' not in ranked
+
+
+def test_topic_words_find_entities_by_kind(builder):
+    context = builder.build("how warm is it?")
+    assert set(context["entity_ids"]) == {'climate.thermostat', 'sensor.garden_temperature'}
+    assert "climate: Thermostat=heat now 19 set 21" in context["text"]
+    assert "sensor: Garden Temperature=12°C" in context["text"]
+
+
+def test_areas_match_like_names(builder):
+    context = builder.build("what's on in the bedroom?")
+    assert context["entity_ids"][0] == 'light.bedroom_lamp'
+
+
+def test_open_questions_get_priority_domains_within_budget(builder):
+    context = builder.build("what's going on at home?", token_budget=60)
+    assert context["estimated_tokens"] <= 60
+    assert set(context["entity_ids"][:2]) == {'lock.front_door', 'climate.thermostat'}
+    assert 'sensor.router_uptime' not in context["entity_ids"]
+    assert len(context["entity_ids"]) < context["candidates"]
+    assert estimate_tokens(context["text"]) == context["estimated_tokens"]
+
+
+def test_new_entities_rebuild_the_index(builder, fake_ha):
+    builder.build("anything on?")
+    rebuilds = builder.stats()["index_rebuilds"]
+    fake_ha.set_state('light.porch', 'on', {'friendly_name': 'Porch Light'})
+    assert wait_for(lambda: builder.state_store.get('light.porch'))
+    assert 'light.porch' in builder.build("porch light")["entity_ids"]
+    assert builder.stats()["index_rebuilds"] == rebuilds + 1
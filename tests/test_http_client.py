@@ -0,0 +1,50 @@
+import pytest
+import requests
+
+from http_client import CONNECT_TIMEOUT, EndpointPolicy, PooledHTTPClient
+
+DEAD_URL = 'http://127.0.0.1:9/api/'
+
+
+def test_calls_reuse_one_keep_alive_connection(fake_ha):
+    client = PooledHTTPClient()
+    headers = {'Authorization': f'Bearer {fake_ha.token}'}
+    for _ in range(5):
+        assert client.get(f"{fake_ha.url}/api/", endpoint='ha_api', headers=headers).status_code == 200
+
+    stats = client.stats()
+    pool = stats["pools"][fake_ha.url]
+    assert (pool["connections_opened"], pool["connections_reused"]) == (1, 4)
+    assert stats["endpoints"]["ha_api"]["status_codes"] == {"200": 5}
+    assert stats["totals"] == {"requests": 5, "retries": 0}
+
+
+def test_idempotent_calls_retry_connection_errors():
+    client = PooledHTTPClient()
+    with pytest.raises(requests.ConnectionError):
+        client.get(DEAD_URL, endpoint='ha_api')  # ha_api allows one retry
+    assert client.stats()["totals"] == {"requests": 2, "retries": 1}
+    assert client.stats()["endpoints"]["ha_api"]["errors"] == 2
+
+
+def test_service_calls_are_never_retried():
+    client = PooledHTTPClient()
+    with pytest.raises(requests.ConnectionError):
+        client.post(DEAD_URL, endpoint='ha_api')
+    assert client.stats()["totals"] == {"requests": 1, "retries": 0}
+
+
+def test_retries_stop_when_the_budget_is_spent():
+    client = PooledHTTPClient(retry_budget_ratio=0.0, retry_budget_min=1)
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            client.get(DEAD_URL, endpoint='ha_api')
+    assert client.stats()["totals"] == {"requests": 3, "retries": 1}
+
+
+def test_endpoint_timeouts_follow_the_environment(monkeypatch):
+    monkeypatch.setenv('HTTP_TIMEOUT_OLLAMA_COMMAND', '45')
+    monkeypatch.setenv('HTTP_RETRIES_OLLAMA_COMMAND', '2')
+    policy = EndpointPolicy('ollama_command', 15, 0)
+    assert (policy.timeout, policy.retries) == ((CONNECT_TIMEOUT, 45.0), 2)
+    assert PooledHTTPClient().policy('no_such_endpoint').name == 'default'
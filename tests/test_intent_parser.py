@@ -0,0 +1,73 @@
+import pytest
+
+from conftest import wait_for
+from intent_parser import IntentParser
+
+
+@pytest.fixture
+def parser(fake_ha, state_store):
+    fake_ha.set_state('light.kitchen_lights', 'off', {'friendly_name': 'Kitchen Lights'})
+    fake_ha.set_state('light.bedroom_lamp', 'off', {'friendly_name': 'Bedroom Lamp'})
+    fake_ha.set_state('fan.office_fan', 'off', {'friendly_name': 'Office Fan'})
+    fake_ha.set_state('climate.thermostat', 'heat', {'friendly_name': 'Thermostat'})
+    fake_ha.set_state('camera.front_door', 'idle', {'friendly_name': 'Front Door Camera'})
+    state_store.start()
+    assert state_store.wait_ready(5)
+    return IntentParser(state_store)
+
+
+def test_turn_on_resolves_entity(parser):
+    plan = parser.parse("Turn on the kitchen lights")
+    assert plan["intent"] == "turn_on"
+    assert plan["actions"] == [{"domain": "light", "service": "turn_on", "entity_id": "light.kitchen_lights"}]
+
+
+def test_turn_off_all_of_a_domain(parser):
+    plan = parser.parse("turn off all the lights")
+    assert plan["intent"] == "turn_off_all"
+    assert plan["actions"] == [{"domain": "light", "service": "turn_off", "entity_id": "all"}]
+
+
+def test_brightness_and_temperature(parser):
+    plan = parser.parse("set the bedroom lamp to 40%")
+    assert plan["actions"][0]["service_data"] == {"brightness_pct": 40}
+    plan = parser.parse("set the temperature to 21")
+    assert plan["actions"][0]["entity_id"] == "climate.thermostat"
+    assert plan["actions"][0]["service_data"] == {"temperature": 21}
+
+
+@pytest.mark.parametrize('command', [
+    "set kitchen lights to 50",
+    "set alarm to 7",
+    "make the kitchen lights at 20",
+    "set to 72",
+    "set the bedroom lamp temperature to 3000",
+])
+def test_set_temperature_needs_a_thermostat(parser, command):
+    assert parser.parse(command) is None
+
+
+def test_set_temperature_by_name(parser):
+    plan = parser.parse("set the thermostat to 68 degrees")
+    assert plan["intent"] == "set_temperature"
+    assert plan["actions"][0]["entity_id"] == "climate.thermostat"
+
+
+def test_show_camera(parser):
+    plan = parser.parse("show me the front door camera")
+    assert plan["intent"] == "show_camera"
+    assert plan["camera"]["entity_id"] == "camera.front_door"
+
+
+def test_unrecognised_commands_fall_back(parser):
+    assert parser.parse("what's the weather like tomorrow?") is None
+    assert parser.parse("turn on the garage heater") is None
+    hits, misses = parser.hit_counts()
+    assert (hits, misses) == (0, 2)
+
+
+def test_index_follows_new_entities(fake_ha, parser):
+    assert parser.parse("turn on the porch light") is None
+    fake_ha.set_state('light.porch', 'off', {'friendly_name': 'Porch Light'})
+    assert wait_for(lambda: parser.state_store.get('light.porch') is not None)
+    assert parser.parse("turn on the porch light")["actions"][0]["entity_id"] == "light.porch"
@@ -0,0 +1,69 @@
+import time
+
+from conftest import wait_for
+from llm_cache import LLMResponseCache, cache_key, referenced_entities
+
+PLAN = {"actions": [{"domain": "light", "service": "turn_on", "entity_id": ["light.kitchen", "light.hall"]}],
+        "response": "I've turned on the lights"}
+
+
+def test_cache_key_ignores_politeness_and_punctuation():
+    assert cache_key("Hey, please turn on the kitchen lights!") == cache_key("turn on the kitchen lights")
+
+
+def test_referenced_entities():
+    plan = {"actions": [{"entity_id": "light.a"}, {"service_data": {"entity_id": ["fan.b"]}},
+                        {"entity_id": "all"}]}
+    assert referenced_entities(plan) == {"light.a", "fan.b"}
+
+
+def test_exact_hit_and_ttl():
+    cache = LLMResponseCache(ttl=60)
+    cache.store("turn on the lights", PLAN)
+    assert cache.lookup("please turn on the lights") == PLAN
+    cache._entries[cache_key("turn on the lights")]["stored_at"] = time.time() - 61
+    assert cache.lookup("turn on the lights") is None
+    assert cache.counters["expirations"] == 1
+
+
+def test_hit_checks_only_the_referenced_entities(fake_ha, state_store):
+    for entity_id in ('light.kitchen', 'light.hall', 'switch.unrelated'):
+        fake_ha.set_state(entity_id, 'off')
+    state_store.start()
+    assert state_store.wait_ready(5)
+    calls = []
+    state_store.entity_ids = lambda: calls.append('entity_ids')  # a full copy is never needed on a hit
+    cache = LLMResponseCache(state_store)
+    cache.store("turn on the lights", PLAN)
+    assert cache.lookup("turn on the lights") == PLAN
+    assert calls == []
+
+
+def test_removed_entity_invalidates_plan(fake_ha, state_store):
+    fake_ha.set_state('light.kitchen', 'off')
+    fake_ha.set_state('light.hall', 'off')
+    state_store.start()
+    assert state_store.wait_ready(5)
+    cache = LLMResponseCache(state_store)
+    cache.store("turn on the lights", PLAN)
+    fake_ha.remove_state('light.hall')
+    assert wait_for(lambda: state_store.get('light.hall') is None)
+    assert cache.lookup("turn on the lights") is None
+    assert cache.counters["invalidations"] == 1
+
+
+def test_semantic_match_above_threshold():
+    vectors = {"turn on the lights": [1.0, 0.0], "switch the lights on": [0.99, 0.05], "lock the door": [0.0, 1.0]}
+    cache = LLMResponseCache(embed=lambda text: vectors[text], similarity=0.9)
+    cache.store("turn on the lights", PLAN)
+    assert cache.lookup("switch the lights on") == PLAN
+    assert cache.lookup("lock the door") is None
+    assert (cache.counters["semantic_hits"], cache.counters["misses"]) == (1, 1)
+
+
+def test_lru_eviction():
+    cache = LLMResponseCache(max_entries=2)
+    for command in ("one", "two", "three"):
+        cache.store(command, PLAN)
+    assert cache.lookup("one") is None
+    assert cache.stats()["entries"] == 2
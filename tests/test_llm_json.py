@@ -0,0 +1,29 @@
+from llm_json import ActionStreamParser, extract_json
+
+
+def test_extract_skips_prose_and_fences():
+    text = ('Sure! Here you go:\n```json\n'
+            '{"actions": [{"domain": "light", "service": "turn_on"}], "response": "ok"}\n```')
+    assert extract_json(text) == {"actions": [{"domain": "light", "service": "turn_on"}], "response": "ok"}
+
+
+def test_extract_repairs_trailing_commas():
+    assert extract_json('{"domain": "fan", "service": "turn_off",}') == {"domain": "fan", "service": "turn_off"}
+
+
+def test_extract_closes_truncated_reply():
+    assert extract_json('{"actions": [{"domain": "light", "entity_id": "light.kit') == \
+        {"actions": [{"domain": "light", "entity_id": "light.kit"}]}
+
+
+def test_extract_without_json():
+    assert extract_json("I'm not sure what you mean.") is None
+
+
+def test_stream_parser_emits_each_action_when_it_closes():
+    parser = ActionStreamParser()
+    chunks = ['Ok {"actions": [{"domain": "li', 'ght", "service": "turn_on"}, {"domain": "fan"',
+              ', "service": "turn_off"}], "response": "done"}']
+    emitted = [parser.feed(chunk) for chunk in chunks]
+    assert emitted == [[], [{"domain": "light", "service": "turn_on"}], [{"domain": "fan", "service": "turn_off"}]]
+    assert parser.document["response"] == "done"
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+import async_http
+import tracing
+from async_ollama import routed_chat
+from conftest import wait_for
+from fake_ollama import FakeOllama
+from llm_router import LLMRouter
+from ollama_client import OllamaError
+
+MODEL = 'dolphin-llama3:latest'
+REQUEST = {"messages": [{"role": "user", "content": "hi"}]}
+
+
+@pytest.fixture
+def hosts():
+    slow = FakeOllama(first_token_delay=1.0, token_delay=0.02).start()
+    fast = FakeOllama(first_token_delay=0.02).start()
+    for host in (slow, fast):
+        host.respond_with('ok ' * 20)
+    yield slow, fast
+    slow.stop()
+    fast.stop()
+
+
+def hedged_router(slow, fast):
+    router = LLMRouter([slow.url, fast.url], hedge_after=0.2)
+    # The slow host looks fastest, so it is tried first and the fast one is the hedge
+    router.backends[0].latency[MODEL] = 0.1
+    router.backends[1].latency[MODEL] = 0.2
+    return router
+
+
+def inference_spans(trace_id):
+    return sorted((entry["attributes"]["backend"], entry["status"]) for entry in tracing.tracer.spans(trace_id)
+                  if entry["name"] == 'llm_inference')
+
+
+def test_failover_to_the_next_host(hosts):
+    _, fast = hosts
+    router = LLMRouter(['http://127.0.0.1:9', fast.url])
+    assert router.chat(REQUEST).split()[0] == 'ok'
+    assert router.counters["failovers"] == 1
+    assert not router.stats()["backends"][0]["healthy"]
+
+
+def test_all_hosts_down():
+    with pytest.raises(OllamaError):
+        LLMRouter(['http://127.0.0.1:9']).chat(REQUEST)
+
+
+def test_small_tier_falls_back_to_the_large_model(hosts):
+    _, fast = hosts
+    router = LLMRouter([fast.url], small_model='tiny:latest')
+    router.check_all()
+    assert router.candidates('small') == [(router.backends[0], MODEL)]
+    assert router.counters["small_fallbacks"] == 1
+
+
+def test_sync_hedge_abandons_the_loser(hosts):
+    slow, fast = hosts
+    router = hedged_router(slow, fast)
+    server, token = tracing.begin_request('POST', '/voice_command', {})
+    try:
+        assert router.chat(REQUEST).split()[0] == 'ok'
+    finally:
+        tracing.end_request(server, token)
+
+    assert wait_for(lambda: all(backend.in_flight == 0 for backend in router.backends))
+    assert (router.counters["hedges"], router.counters["hedge_wins"], router.counters["hedges_cancelled"]) == (1, 1, 1)
+    assert all(backend.healthy for backend in router.backends)
+    assert inference_spans(server.trace_id) == sorted([(slow.url, 'cancelled'), (fast.url, 'ok')])
+
+
+def test_async_hedge_counts_and_ends_the_loser_the_same_way(hosts):
+    slow, fast = hosts
+    router = hedged_router(slow, fast)
+
+    async def run():
+        server, token = tracing.begin_request('POST', '/voice_command', {})
+        try:
+            return await routed_chat(router, REQUEST), server
+        finally:
+            tracing.end_request(server, token)
+            await async_http.aclose()  # the shared client is bound to this test's event loop
+
+    reply, server = asyncio.run(run())
+    assert reply.split()[0] == 'ok'
+    assert (router.counters["hedges"], router.counters["hedge_wins"], router.counters["hedges_cancelled"]) == (1, 1, 1)
+    assert [backend.in_flight for backend in router.backends] == [0, 0]
+    assert all(backend.healthy for backend in router.backends)
+    assert inference_spans(server.trace_id) == sorted([(slow.url, 'cancelled'), (fast.url, 'ok')])
+
+
+def test_async_cancel_outside_a_hedge_is_not_counted(hosts):
+    slow, _ = hosts
+    router = LLMRouter([slow.url])
+
+    async def run():
+        task = asyncio.ensure_future(routed_chat(router, REQUEST))
+        await asyncio.sleep(0.2)
+        task.cancel()  # the client went away
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await async_http.aclose()
+
+    started = time.monotonic()
+    asyncio.run(run())
+    assert time.monotonic() - started < 1
+    assert router.counters["hedges_cancelled"] == 0
+    assert router.backends[0].healthy and router.backends[0].in_flight == 0
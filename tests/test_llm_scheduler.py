@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+from conftest import wait_for
+from llm_scheduler import DEADLINES, LLMBusy, LLMScheduler
+
+
+def hold(scheduler, priority, order, release):
+    with scheduler.slot(priority):
+        order.append(priority)
+        release.wait(5)
+
+
+def test_queued_requests_are_admitted_by_priority():
+    scheduler = LLMScheduler(max_concurrent=1)
+    order, release = [], threading.Event()
+    threads = [threading.Thread(target=hold, args=(scheduler, 'background', order, release))]
+    threads[0].start()
+    assert wait_for(lambda: order == ['background'])
+
+    # Queue lower priority first; the voice request must still go next
+    for priority in ('query', 'voice'):
+        thread = threading.Thread(target=hold, args=(scheduler, priority, order, release))
+        thread.start()
+        threads.append(thread)
+        expected = len(threads) - 1
+        assert wait_for(lambda: scheduler.stats()['queue_depth'] == expected)
+
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert order == ['background', 'voice', 'query']
+    assert scheduler.stats()['running'] == 0
+
+
+def test_rejects_when_estimated_wait_exceeds_deadline():
+    scheduler = LLMScheduler(max_concurrent=1, deadlines=dict(DEADLINES, voice=1.0))
+    scheduler.service_seconds = 10.0  # each request holds its slot about 10s
+    with scheduler.slot('background'):
+        with pytest.raises(LLMBusy) as busy:
+            with scheduler.slot('voice'):
+                pass
+    assert busy.value.retry_after == 10
+    assert scheduler.counters['voice']['rejected'] == 1
+
+
+def test_times_out_in_queue_past_deadline():
+    scheduler = LLMScheduler(max_concurrent=1, deadlines=dict(DEADLINES, query=0.05))
+    with scheduler.slot('background'):
+        with pytest.raises(LLMBusy):
+            with scheduler.slot('query'):
+                pass
+    assert scheduler.counters['query']['timed_out'] == 1
+    assert scheduler.stats()['queue_depth'] == 0
+    with scheduler.slot('query'):  # the abandoned waiter does not hold the slot
+        pass
@@ -0,0 +1,43 @@
+import pytest
+
+from mjpeg_relay import MultipartParser, RelayError, part
+
+
+def section(body, boundary=b'--frame', length=True):
+    headers = b'Content-Type: image/jpeg\r\n'
+    if length:
+        headers += b'Content-Length: %d\r\n' % len(body)
+    return boundary + b'\r\n' + headers + b'\r\n' + body + b'\r\n'
+
+
+def test_frames_split_across_chunks():
+    parser = MultipartParser('multipart/x-mixed-replace; boundary=frame')
+    stream = section(b'\xff\xd8first\xff\xd9') + section(b'\xff\xd8second\xff\xd9')
+    frames = []
+    for i in range(0, len(stream), 7):
+        frames.extend(parser.feed(stream[i:i + 7]))
+    assert frames == [b'\xff\xd8first\xff\xd9', b'\xff\xd8second\xff\xd9']
+
+
+def test_length_header_wins_over_boundary_bytes_in_the_body():
+    parser = MultipartParser('multipart/x-mixed-replace;boundary="frame"')
+    body = b'\xff\xd8 not a delimiter: \r\n--frame \xff\xd9'
+    assert parser.feed(section(body)) == [body]
+
+
+def test_parts_without_length_run_to_the_next_delimiter():
+    parser = MultipartParser('multipart/x-mixed-replace; boundary=--myboundary')
+    stream = section(b'one', b'--myboundary', length=False) + section(b'two', b'--myboundary', length=False)
+    # The last part is only complete once the following delimiter arrives
+    assert parser.feed(stream) == [b'one']
+    assert parser.feed(b'--myboundary\r\n') == [b'two']
+
+
+def test_own_parts_round_trip():
+    parser = MultipartParser('multipart/x-mixed-replace; boundary=frame')
+    assert parser.feed(part(b'a') + part(b'bc')) == [b'a', b'bc']
+
+
+def test_rejects_non_multipart_streams():
+    with pytest.raises(RelayError):
+        MultipartParser('image/jpeg')
@@ -0,0 +1,73 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from snapshot_cache import Snapshot, SnapshotCache, SnapshotUnavailable
+
+
+class Camera:
+    """Counts fetches; each one blocks until released when gated"""
+
+    def __init__(self, gated=False):
+        self.fetches = 0
+        self.release = threading.Event()
+        if not gated:
+            self.release.set()
+        self.fail = False
+
+    def fetch(self, entity_id):
+        self.fetches += 1
+        self.release.wait(5)
+        if self.fail:
+            raise ConnectionError("camera offline")
+        return f"{entity_id} frame {self.fetches}".encode(), 'image/jpeg'
+
+
+def test_concurrent_misses_share_one_fetch():
+    camera = Camera(gated=True)
+    cache = SnapshotCache(camera.fetch, freshness=5)
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        futures = [pool.submit(cache.get, 'camera.garage') for _ in range(10)]
+        time.sleep(0.2)
+        camera.release.set()
+        snapshots = [future.result() for future in futures]
+
+    assert camera.fetches == 1
+    assert len({snapshot.etag for snapshot in snapshots}) == 1
+    assert (cache.counters["misses"], cache.counters["coalesced"]) == (1, 9)
+    assert cache.hit_counts() == (9, 1)
+
+
+def test_fresh_frames_are_hits_and_expire():
+    camera = Camera()
+    cache = SnapshotCache(camera.fetch, freshness=0.2)
+    first = cache.get('camera.garage')
+    assert cache.get('camera.garage') is first
+    time.sleep(0.25)
+    assert cache.get('camera.garage').content == b"camera.garage frame 2"
+    assert (cache.counters["hits"], cache.counters["misses"]) == (1, 2)
+
+
+def test_stale_frame_covers_a_camera_error():
+    camera = Camera()
+    cache = SnapshotCache(camera.fetch, freshness=0.1, max_stale=60)
+    first = cache.get('camera.garage')
+    time.sleep(0.15)
+    camera.fail = True
+    assert cache.get('camera.garage') is first
+    assert (cache.counters["errors"], cache.counters["stale_served"]) == (1, 1)
+
+    with pytest.raises(SnapshotUnavailable):
+        cache.get('camera.driveway')
+
+
+def test_etag_follows_the_content():
+    assert Snapshot(b"a").etag == Snapshot(b"a").etag != Snapshot(b"b").etag
+    cache = SnapshotCache(Camera().fetch)
+    cache.get('camera.garage')
+    cache.record_not_modified()
+    stats = cache.stats()
+    assert stats["not_modified"] == 1
+    assert stats["cameras"]["camera.garage"]["etag"] == Snapshot(b"camera.garage frame 1").etag
@@ -0,0 +1,59 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from snapshot_cache import SnapshotCache
+from snapshot_variants import SnapshotVariants
+
+
+def jpeg(width, height):
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 120, 40)).save(output, 'JPEG', quality=95)
+    return output.getvalue()
+
+
+FRAMES = {'camera.driveway': jpeg(1920, 1080), 'camera.doorbell': jpeg(320, 240), 'camera.broken': b'not a jpeg'}
+
+
+def variants(**kwargs):
+    cache = SnapshotCache(lambda entity_id: (FRAMES[entity_id], 'image/jpeg'), freshness=60)
+    return SnapshotVariants(cache, sizes={'thumb': 480, 'medium': 1280, 'full': None}, **kwargs)
+
+
+def size_of(snapshot):
+    return Image.open(io.BytesIO(snapshot.content)).size
+
+
+def test_frames_are_downscaled_keeping_the_aspect_ratio():
+    renditions = variants()
+    assert size_of(renditions.get('camera.driveway', 'thumb')) == (480, 270)
+    assert size_of(renditions.get('camera.driveway', 'medium')) == (1280, 720)
+    assert renditions.get('camera.driveway', 'full').content == FRAMES['camera.driveway']
+    assert renditions.stats()["bytes_ratio"] < 1
+
+
+def test_small_and_unreadable_frames_are_served_as_they_are():
+    renditions = variants()
+    assert renditions.get('camera.doorbell', 'thumb').content == FRAMES['camera.doorbell']
+    assert renditions.get('camera.broken', 'thumb').content == b'not a jpeg'
+    assert renditions.counters["render_errors"] == 1
+    with pytest.raises(ValueError):
+        renditions.get('camera.driveway', 'poster')
+
+
+def test_each_frame_and_size_renders_once():
+    renditions = variants()
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        thumbs = list(pool.map(lambda _: renditions.get('camera.driveway', 'thumb'), range(8)))
+    assert len({thumb.etag for thumb in thumbs}) == 1
+    assert renditions.hit_counts() == (7, 1)
+
+
+def test_least_recently_used_variants_are_dropped():
+    renditions = variants(max_entries=1)
+    renditions.get('camera.driveway', 'thumb')
+    renditions.get('camera.driveway', 'medium')
+    renditions.get('camera.driveway', 'thumb')
+    assert (renditions.counters["renders"], renditions.stats()["cached"]) == (3, 1)
@@ -0,0 +1,124 @@
+import asyncio
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+from fake_ha import FakeHomeAssistant
+from fake_ollama import FakeOllama
+
+PLAN = json.dumps({"actions": [{"domain": "light", "service": "turn_on", "entity_id": "light.kitchen"},
+                               {"domain": "switch", "service": "turn_off", "entity_id": "switch.fan"}],
+                   "response": "Kitchen light on and the fan off, as you asked"})
+
+
+@pytest.fixture(scope='module')
+def bridge():
+    """ha_bridge configured against a fake HA and a fake Ollama; it reads its settings at import time"""
+    ha = FakeHomeAssistant().start()
+    ollama = FakeOllama(token_delay=0.01).start()
+    ha.set_state('light.kitchen', 'off', {'friendly_name': 'Kitchen Lights'})
+    ha.set_state('switch.fan', 'on', {'friendly_name': 'Ceiling Fan'})
+    saved = {key: os.environ.get(key) for key in ('HA_URL', 'HA_TOKEN', 'OLLAMA_URL')}
+    os.environ.update({'HA_URL': ha.url, 'HA_TOKEN': ha.token, 'OLLAMA_URL': ollama.url})
+    for name in ('ha_bridge', 'ha_bridge_async'):
+        sys.modules.pop(name, None)
+    module = importlib.import_module('ha_bridge')
+    module.state_store.start()
+    assert module.state_store.wait_ready(5)
+    yield module, ha, ollama
+    module.state_store.stop()
+    for key, value in saved.items():
+        if value is None:
+            os.environ.pop(key, None)
+        else:
+            os.environ[key] = value
+    ha.stop()
+    ollama.stop()
+
+
+def events(body):
+    """[(event, data)] of a Server-Sent Events body"""
+    parsed = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        parsed.append((fields['event'], json.loads(fields['data'])))
+    return parsed
+
+
+def test_actions_run_while_the_reply_is_still_streaming(bridge):
+    module, ha, ollama = bridge
+    ollama.respond_with(PLAN)
+    response = module.app.test_client().post('/voice_command', json={"command": "evening routine", "stream": True})
+    assert response.mimetype == 'text/event-stream'
+    stream = events(response.get_data(as_text=True))
+
+    names = [name for name, _ in stream]
+    assert names[0] == 'token' and names[-1] == 'done'
+    assert names.count('action') == 2
+    # Both actions closed before the spoken reply finished streaming
+    assert max(i for i, name in enumerate(names) if name == 'action') < max(i for i, name in enumerate(names)
+                                                                           if name == 'token')
+    assert ''.join(data["text"] for name, data in stream if name == 'token') == PLAN
+
+    done = stream[-1][1]
+    assert done["success"] and done["source"] == 'llm'
+    assert [result["success"] for result in done["execution_results"]] == [True, True]
+    assert {(call["domain"], call["service"]) for call in ha.service_calls} >= {('light', 'turn_on'),
+                                                                              ('switch', 'turn_off')}
+
+
+def test_stream_is_chosen_by_body_query_or_accept_header(bridge):
+    module, _, ollama = bridge
+    ollama.respond_with('All quiet at home.')
+    client = module.app.test_client()
+    assert client.post('/smart_query', json={"query": "anything on?"}).mimetype == 'application/json'
+    assert client.post('/smart_query?stream=1', json={"query": "anything on?"}).mimetype == 'text/event-stream'
+    assert client.post('/smart_query', json={"query": "anything on?"},
+                       headers={'Accept': 'text/event-stream'}).mimetype == 'text/event-stream'
+
+
+def test_smart_query_stream_ends_with_the_whole_answer(bridge):
+    module, _, ollama = bridge
+    ollama.respond_with('The kitchen light is off and the fan is on.')
+    stream = events(module.app.test_client().post('/smart_query', json={"query": "what is on?", "stream": True})
+                    .get_data(as_text=True))
+    tokens = ''.join(data["text"] for name, data in stream if name == 'token')
+    name, done = stream[-1]
+    assert name == 'done' and done["answer"] == tokens == 'The kitchen light is off and the fan is on.'
+    assert 'light.kitchen' in done["context_used"]["entity_ids"]
+
+
+def test_unparseable_reply_ends_the_stream_with_an_error(bridge):
+    module, ha, ollama = bridge
+    calls = len(ha.service_calls)
+    ollama.respond_with("Sorry, I didn't catch that.")
+    stream = events(module.app.test_client().post('/voice_command', json={"command": "mumble", "stream": True})
+                    .get_data(as_text=True))
+    assert stream[-1][0] == 'done' and stream[-1][1]["error"] == "AI response was not valid JSON"
+    assert len(ha.service_calls) == calls
+
+
+def test_async_bridge_streams_the_same_events(bridge):
+    module, _, ollama = bridge
+    ollama.respond_with(PLAN)
+    async_module = importlib.import_module('ha_bridge_async')
+
+    async def post(command):
+        try:
+            response = await async_module.app.test_client().post('/voice_command',
+                                                                 json={"command": command, "stream": True})
+            return await response.get_data(as_text=True)
+        finally:
+            await async_module.async_http.aclose()
+
+    sync_stream = events(module.app.test_client().post('/voice_command', json={"command": "sync routine",
+                                                                               "stream": True})
+                         .get_data(as_text=True))
+    async_stream = events(asyncio.run(post("async routine")))
+    shape = [[(name, data.get("text"), data.get("action")) for name, data in stream[:-1]]
+             for stream in (sync_stream, async_stream)]
+    assert shape[0] == shape[1]
+    assert async_stream[-1][1]["execution_results"] == sync_stream[-1][1]["execution_results"]
@@ -0,0 +1,66 @@
+from flask import Flask, jsonify
+
+import tracing
+from http_client import PooledHTTPClient
+
+CALLER_TRACE = '4bf92f3577b34da6a3ce929d0e0e4736'
+CALLER_SPAN = '00f067aa0ba902b7'
+
+
+def traced_app(fake_ha):
+    app = Flask(__name__)
+    tracing.instrument(app, 'test-bridge')
+    client = PooledHTTPClient()
+
+    @app.route('/probe')
+    def probe():
+        with tracing.span('check_ha', probe='api'):
+            client.get(f"{fake_ha.url}/api/", endpoint='ha_api',
+                       headers={'Authorization': f'Bearer {fake_ha.token}'})
+        return jsonify(tracing.inject({}))
+
+    @app.route('/health')
+    def health():
+        return jsonify({"status": "ok"})
+
+    return app.test_client()
+
+
+def test_caller_traceparent_is_continued(fake_ha):
+    client = traced_app(fake_ha)
+    response = client.get('/probe', headers={'traceparent': f'00-{CALLER_TRACE}-{CALLER_SPAN}-01'})
+    assert response.headers['X-Request-ID'] == CALLER_TRACE
+    assert response.headers['traceparent'].startswith(f'00-{CALLER_TRACE}-')
+    # The handler forwards the trace under its own server span
+    assert response.get_json()['traceparent'] == response.headers['traceparent']
+
+    view = tracing.trace_view(CALLER_TRACE)
+    assert [(entry["name"], entry["kind"], entry["depth"]) for entry in view["spans"]] == [
+        ('GET /probe', 'server', 0), ('check_ha', 'internal', 1), ('GET ha_api', 'client', 2)]
+    assert view["spans"][0]["parent_id"] == CALLER_SPAN
+    assert view["spans"][2]["attributes"]["http.status_code"] == 200
+    assert view["services"] == ['test-bridge']
+
+
+def test_request_id_starts_a_trace_and_health_is_untraced(fake_ha):
+    client = traced_app(fake_ha)
+    request_id = '0af7651916cd43dd8448eb211c80319c'
+    assert client.get('/probe', headers={'X-Request-ID': request_id}).headers['X-Request-ID'] == request_id
+    fresh = client.get('/probe').headers['X-Request-ID']
+    assert tracing.TRACE_ID.match(fresh) and fresh != request_id
+    assert 'X-Request-ID' not in client.get('/health').headers
+
+
+def test_debug_routes_serve_the_trace(fake_ha):
+    client = traced_app(fake_ha)
+    trace_id = client.get('/probe').headers['X-Request-ID']
+    assert client.get(f'/debug/trace/{trace_id}').get_json()["span_count"] == 3
+    assert client.get(f'/debug/trace/{"0" * 32}').status_code == 404
+    assert client.get('/debug/traces?limit=1').get_json()["traces"][0]["trace_id"] == trace_id
+
+
+def test_spans_outside_a_request_are_not_recorded():
+    assert tracing.current() is None
+    with tracing.span('background') as span:
+        assert span is None
+    assert tracing.inject({'Accept': 'text/plain'}) == {'Accept': 'text/plain'}
@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Request Tracing
+Follows one command across web UI → bridge → Ollama → HA. Every request a
+service handles opens a server span, continuing the caller's W3C
+`traceparent` (or `X-Request-ID`) when there is one; every outgoing HTTP call
+made inside it carries the trace onward and gets a client span, and the LLM
+queue wait, inference and HA service calls get spans of their own. Finished
+spans are kept in memory for /debug/trace/<id>, and optionally appended to a
+JSON-lines file (TRACE_FILE) and/or pushed to an OTLP/HTTP collector
+(OTLP_ENDPOINT).
+"""
+
+import contextvars
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Configuration
+TRACING = os.getenv('TRACING', 'true').lower() in ('1', 'true', 'yes')
+TRACE_FILE = os.getenv('TRACE_FILE', '')        # JSON lines, one span per line; shared by services on one host
+OTLP_ENDPOINT = os.getenv('OTLP_ENDPOINT', '')  # e.g. http://collector:4318; spans go to /v1/traces
+TRACE_BUFFER = int(os.getenv('TRACE_BUFFER', '500'))  # recent traces kept in memory per service
+
+EXPORT_BATCH = 256
+RESPONSE_HEADERS = ['X-Request-ID', 'traceparent']  # expose via CORS so the browser UI can link a trace
+UNTRACED_ROUTES = {'/health', '/metrics', '/debug/trace/<trace_id>', '/debug/traces'}
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+TRACE_ID = re.compile(r'^[0-9a-f]{32}$')
+
+_current = contextvars.ContextVar('trace_span', default=None)
+
+
+class Span:
+    """One timed operation in a trace"""
+
+    def __init__(self, name, trace_id, parent_id=None, kind='internal', service=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.service = service or tracer.service
+        self.attributes = dict(attributes or {})
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self.cancelled = False
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def inject(self, headers=None):
+        """Copy of headers carrying this span's trace to the next hop"""
+        return dict(headers or {}, traceparent=self.traceparent(), **{'X-Request-ID': self.trace_id})
+
+    def end(self, error=None, cancelled=False):
+        """Finish the span; cancelled marks work abandoned on purpose, neither ok nor an error"""
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = str(error) or type(error).__name__
+        self.cancelled = cancelled
+        tracer.record(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "service": self.service,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": "error" if self.error else "cancelled" if self.cancelled else "ok",
+            "error": self.error,
+            "attributes": self.attributes
+        }
+
+
+class Tracer:
+    """Recent traces in memory plus the optional file and OTLP exporters"""
+
+    def __init__(self, buffer=TRACE_BUFFER, trace_file=TRACE_FILE, otlp_endpoint=OTLP_ENDPOINT):
+        self.service = 'ha-bridge'
+        self.buffer = buffer
+        self.trace_file = trace_file
+        self.otlp_endpoint = otlp_endpoint.rstrip('/')
+        self._lock = threading.Lock()
+        self._traces = OrderedDict()  # trace_id -> [span dicts], oldest first
+        self._queue = queue.SimpleQueue()
+        self._exporter = None
+        self.counters = {"spans": 0, "exported": 0, "export_errors": 0}
+
+    def record(self, span):
+        entry = span.to_dict()
+        with self._lock:
+            self.counters["spans"] += 1
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = []
+                while len(self._traces) > self.buffer:
+                    self._traces.popitem(last=False)
+            spans.append(entry)
+            start_exporter = (self.trace_file or self.otlp_endpoint) and self._exporter is None
+            if start_exporter:
+                self._exporter = threading.Thread(target=self._export_loop, name='trace-export', daemon=True)
+        if self.trace_file or self.otlp_endpoint:
+            self._queue.put(entry)
+        if start_exporter:
+            self._exporter.start()
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def _export_loop(self):
+        # Runs outside any request, so its own HTTP calls are not traced
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < EXPORT_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if self.trace_file:
+                    with open(self.trace_file, 'a') as f:
+                        f.writelines(json.dumps(entry) + '\n' for entry in batch)
+                if self.otlp_endpoint:
+                    self._post_otlp(batch)
+                with self._lock:
+                    self.counters["exported"] += len(batch)
+            except Exception:
+                with self._lock:
+                    self.counters["export_errors"] += 1
+                time.sleep(1)
+
+    def _post_otlp(self, batch):
+        import http_client  # imported late: http_client traces its own calls through this module
+        by_service = {}
+        for entry in batch:
+            by_service.setdefault(entry["service"], []).append(otlp_span(entry))
+        body = {"resourceSpans": [{
+            "resource": {"attributes": otlp_attributes({"service.name": service})},
+            "scopeSpans": [{"scope": {"name": "ha-bridge-deploy"}, "spans": spans}]
+        } for service, spans in by_service.items()]}
+        response = http_client.post(f"{self.otlp_endpoint}/v1/traces", endpoint='otlp', json=body)
+        if response.status_code >= 300:
+            raise RuntimeError(f"OTLP collector answered HTTP {response.status_code}")
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+
+    def spans(self, trace_id):
+        """Spans of one trace from this process, plus other services' from the shared TRACE_FILE"""
+        with self._lock:
+            spans = {entry["span_id"]: entry for entry in self._traces.get(trace_id, [])}
+        if self.trace_file and os.path.exists(self.trace_file):
+            with open(self.trace_file) as f:
+                for line in f:
+                    if trace_id in line:
+                        entry = json.loads(line)
+                        spans.setdefault(entry["span_id"], entry)
+        return list(spans.values())
+
+    def recent(self, limit=50, min_ms=0.0):
+        """Newest traces first: root span name, service and duration"""
+        with self._lock:
+            traces = list(self._traces.items())
+        summary = []
+        for trace_id, spans in reversed(traces):
+            ids = {entry["span_id"] for entry in spans}
+            roots = [entry for entry in spans if entry["parent_id"] not in ids] or spans
+            root = min(roots, key=lambda entry: entry["start"])
+            if (root["duration_ms"] or 0) < min_ms:
+                continue
+            summary.append({"trace_id": trace_id, "name": root["name"], "service": root["service"],
+                            "start": root["start"], "duration_ms": root["duration_ms"], "spans": len(spans),
+                            "errors": sum(1 for entry in spans if entry["status"] == "error")})
+            if len(summary) >= limit:
+                break
+        return summary
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, traces=len(self._traces), trace_file=self.trace_file or None,
+                        otlp_endpoint=self.otlp_endpoint or None)
+
+
+tracer = Tracer()
+
+
+# ----------------------------------------------------------------------
+# Span API
+# ----------------------------------------------------------------------
+
+def current():
+    return _current.get()
+
+
+def start_span(name, kind='internal', **attributes):
+    """Span under the current one that the caller ends; None outside a traced request.
+
+    Unlike span(), it does not become the current span, so it is safe to
+    hold across a generator's yields.
+    """
+    parent = _current.get()
+    if parent is None:
+        return None
+    return Span(name, parent.trace_id, parent.span_id, kind, attributes=attributes)
+
+
+@contextmanager
+def span(name, kind='internal', **attributes):
+    """Time a block as a child of the current span; yields None outside a traced request"""
+    child = start_span(name, kind, **attributes)
+    if child is None:
+        yield None
+        return
+    token = _current.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.end(error=e)
+        raise
+    finally:
+        _current.reset(token)
+        child.end()
+
+
+def bind(func):
+    """func wrapped to run in a copy of the caller's context, for thread-pool submission"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def inject(headers=None):
+    """headers plus the current trace context, for a call to another service"""
+    parent = _current.get()
+    return parent.inject(headers) if parent is not None else headers
+
+
+def begin_request(method, route, headers):
+    """Open the server span for an incoming request; returns (span, context token) or (None, None)"""
+    if not TRACING or route in UNTRACED_ROUTES:
+        return None, None
+    trace_id, parent_id = None, None
+    match = TRACEPARENT.match(headers.get('traceparent', '').strip().lower())
+    if match:
+        trace_id, parent_id = match.groups()
+    else:
+        request_id = headers.get('X-Request-ID', '').strip().lower().replace('-', '')
+        if TRACE_ID.match(request_id):
+            trace_id = request_id
+    server = Span(f"{method} {route}", trace_id or secrets.token_hex(16), parent_id, kind='server',
+                  attributes={"http.method": method, "http.route": route})
+    return server, _current.set(server)
+
+
+def end_request(server, token, error=None):
+    try:
+        _current.reset(token)
+    except ValueError:
+        _current.set(None)  # a streamed response finished in another context
+    server.end(error=error)
+
+
+# ----------------------------------------------------------------------
+# Views
+# ----------------------------------------------------------------------
+
+def trace_view(trace_id):
+    """One trace as a timeline: spans in call-tree order with offsets from the first span"""
+    spans = tracer.spans(trace_id.lower())
+    if not spans:
+        return None
+    children = {}
+    ids = {entry["span_id"] for entry in spans}
+    for entry in sorted(spans, key=lambda entry: entry["start"]):
+        parent = entry["parent_id"] if entry["parent_id"] in ids else None
+        children.setdefault(parent, []).append(entry)
+
+    origin = min(entry["start"] for entry in spans)
+    timeline = []
+
+    def walk(parent, depth):
+        for entry in children.get(parent, []):
+            timeline.append(dict(entry, depth=depth, offset_ms=round((entry["start"] - origin) * 1000, 3)))
+            walk(entry["span_id"], depth + 1)
+
+    walk(None, 0)
+    end = max(entry["start"] + (entry["duration_ms"] or 0) / 1000 for entry in spans)
+    return {
+        "trace_id": trace_id,
+        "duration_ms": round((end - origin) * 1000, 3),
+        "services": sorted({entry["service"] for entry in spans}),
+        "span_count": len(spans),
+        "spans": timeline
+    }
+
+
+def otlp_attributes(attributes):
+    values = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            typed = {"boolValue": value}
+        elif isinstance(value, int):
+            typed = {"intValue": str(value)}
+        elif isinstance(value, float):
+            typed = {"doubleValue": value}
+        else:
+            typed = {"stringValue": str(value)}
+        values.append({"key": key, "value": typed})
+    return values
+
+
+OTLP_KINDS = {'internal': 1, 'server': 2, 'client': 3}
+OTLP_STATUS = {'ok': {"code": 1}, 'cancelled': {"code": 0, "message": "cancelled"}}  # error: code 2
+
+
+def otlp_span(entry):
+    start = int(entry["start"] * 1e9)
+    span = {
+        "traceId": entry["trace_id"],
+        "spanId": entry["span_id"],
+        "name": entry["name"],
+        "kind": OTLP_KINDS.get(entry["kind"], 1),
+        "startTimeUnixNano": str(start),
+        "endTimeUnixNano": str(start + int((entry["duration_ms"] or 0) * 1e6)),
+        "attributes": otlp_attributes(entry["attributes"]),
+        "status": OTLP_STATUS.get(entry["status"], {"code": 2, "message": entry["error"]})
+    }
+    if entry["parent_id"]:
+        span["parentSpanId"] = entry["parent_id"]
+    return span
+
+
+# ----------------------------------------------------------------------
+# Web framework hooks
+# ----------------------------------------------------------------------
+
+def _route(request):
+    rule = getattr(request, 'url_rule', None)
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def instrument(app, service):
+    """Trace every request of a Flask app and serve /debug/trace/<id> and /debug/traces"""
+    from flask import g, jsonify, request
+
+    tracer.service = service
+
+    @app.before_request
+    def _trace_start():
+        g.trace_span, g.trace_token = begin_request(request.method, _route(request), request.headers)
+
+    @app.after_request
+    def _trace_headers(response):
+        server = g.get('trace_span')
+        if server is not None:
+            server.set(**{"http.status_code": response.status_code})
+            response.headers['X-Request-ID'] = server.trace_id
+            response.headers['traceparent'] = server.traceparent()
+        return response
+
+    @app.teardown_request
+    def _trace_end(error=None):
+        server = g.pop('trace_span', None)
+        if server is not None:
+            end_request(server, g.pop('trace_token'), error)
+
+    def debug_trace(trace_id):
+        view = trace_view(trace_id)
+        return jsonify(view) if view else (jsonify({"error": "Trace not found", "trace_id": trace_id}), 404)
+
+    def debug_traces():
+        return jsonify({"traces": tracer.recent(request.args.get('limit', 50, type=int),
+                                                request.args.get('min_ms', 0.0, type=float)),
+                        "tracer": tracer.stats()})
+
+    app.add_url_rule('/debug/trace/<trace_id>', 'debug_trace', debug_trace)
+    app.add_url_rule('/debug/traces', 'debug_traces', debug_traces)
+
+
+def instrument_async(app, service):
+    """instrument() for the Quart apps of the asyncio serving mode"""
+    from quart import g, jsonify, request
+
+    tracer.service = service
+
+    @app.before_request
+    async def _trace_start():
+        g.trace_span, g.trace_token = begin_request(request.method, _route(request), request.headers)
+
+    @app.after_request
+    async def _trace_headers(response):
+        server = g.get('trace_span')
+        if server is not None:
+            server.set(**{"http.status_code": response.status_code})
+            response.headers['X-Request-ID'] = server.trace_id
+            response.headers['traceparent'] = server.traceparent()
+        return response
+
+    @app.teardown_request
+    async def _trace_end(error=None):
+        server = g.pop('trace_span', None)
+        if server is not None:
+            end_request(server, g.pop('trace_token'), error)
+
+    async def debug_trace(trace_id):
+        view = trace_view(trace_id)
+        return jsonify(view) if view else (jsonify({"error": "Trace not found", "trace_id": trace_id}), 404)
+
+    async def debug_traces():
+        return jsonify({"traces": tracer.recent(request.args.get('limit', 50, type=int),
+                                                request.args.get('min_ms', 0.0, type=float)),
+                        "tracer": tracer.stats()})
+
+    app.add_url_rule('/debug/trace/<trace_id>', 'debug_trace', debug_trace)
+    app.add_url_rule('/debug/traces', 'debug_traces', debug_traces)
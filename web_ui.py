@@ -5,7 +5,12 @@ Modern web interface for voice commands and camera control
 """
 
 from flask import Flask, render_template_string, request, jsonify, send_from_directory, Response
-import requests
+import http_client
+import metrics
+import tracing
+from snapshot_cache import SnapshotCache, SnapshotUnavailable
+from snapshot_variants import SIZES, SnapshotVariants
+from camera_mosaic import MOSAIC_WIDTH, CameraMosaic, MosaicError
 import json
 import os
 
@@ -32,6 +37,18 @@ HA_HEADERS = {
     'Content-Type': 'application/json'
 }
 
+# One upstream snapshot fetch per camera per freshness window, shared by every client
+snapshot_cache = SnapshotCache(lambda entity_id: fetch_snapshot(entity_id))
+# Thumbnail and medium renditions of those frames, rendered once per frame
+snapshot_variants = SnapshotVariants(snapshot_cache)
+# Every camera in one grid JPEG for wall displays and slow links
+mosaic = CameraMosaic(snapshot_variants, CAMERA_ENTITIES)
+
+# Request counters, snapshot-fetch latency and cache hit ratio on /metrics
+metrics.instrument(app, http=http_client,
+                   caches={'snapshot': snapshot_cache, 'snapshot_variants': snapshot_variants, 'mosaic': mosaic})
+tracing.instrument(app, 'smart-home-ui')
+
 # HTML Template
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -493,7 +510,7 @@ HTML_TEMPLATE = """
 
                         card.innerHTML = `
                             <div class="camera-preview">
-                                <img src="/camera_proxy/${cameraKey}"
+                                <img src="/camera_proxy/${cameraKey}?size=thumb"
                                      alt="${name}"
                                      style="width: 100%; height: 100%; object-fit: cover; border-radius: 8px;"
                                      onerror="this.style.display='none'; this.nextElementSibling.style.display='flex';"
@@ -616,38 +633,81 @@ HTML_TEMPLATE = """
 
 @app.route('/camera_proxy/<camera_name>')
 def camera_proxy(camera_name):
-    """Proxy camera snapshots from Home Assistant"""
+    """Proxy camera snapshots from Home Assistant through the shared snapshot cache (?size=thumb|medium|full)"""
     try:
-        # Get camera entity ID
         entity_id = CAMERA_ENTITIES.get(camera_name)
         if not entity_id:
             return Response("Camera not found", status=404, mimetype='text/plain')
 
-        # Fetch camera snapshot from Home Assistant
-        snapshot_url = f"{HA_URL}/api/camera_proxy/{entity_id}"
-        response = requests.get(snapshot_url, headers=HA_HEADERS, timeout=10)
+        size = request.args.get('size', 'full')
+        if size not in SIZES:
+            return Response(f"size must be one of {', '.join(SIZES)}", status=400, mimetype='text/plain')
 
-        if response.status_code == 200:
-            return Response(
-                response.content,
-                mimetype='image/jpeg',
-                headers={
-                    'Cache-Control': 'no-cache',
-                    'Access-Control-Allow-Origin': '*'
-                }
-            )
-        else:
+        try:
+            snapshot = snapshot_variants.get(entity_id, size)
+        except SnapshotUnavailable:
             return Response("Camera unavailable", status=503, mimetype='text/plain')
 
+        headers = {
+            'Cache-Control': 'no-cache',
+            'ETag': snapshot.etag,
+            'Access-Control-Allow-Origin': '*'
+        }
+        if snapshot.etag in request.headers.get('If-None-Match', ''):
+            snapshot_cache.record_not_modified()
+            return Response(status=304, headers=headers)
+
+        return Response(snapshot.content, mimetype=snapshot.content_type, headers=headers)
+
     except Exception as e:
         return Response(f"Error: {str(e)}", status=500, mimetype='text/plain')
 
+def fetch_snapshot(entity_id):
+    """Fetch one JPEG frame from Home Assistant (snapshot cache miss path)"""
+    response = http_client.get(f"{HA_URL}/api/camera_proxy/{entity_id}", endpoint='ha_camera', headers=HA_HEADERS)
+    if response.status_code != 200:
+        raise SnapshotUnavailable(f"HTTP {response.status_code}")
+    return response.content, response.headers.get('Content-Type', 'image/jpeg')
+
+@app.route('/camera_mosaic')
+def camera_mosaic():
+    """All cameras composited into one JPEG grid (?width=<pixels>&columns=<n>), cached briefly"""
+    try:
+        try:
+            width = int(request.args.get('width', MOSAIC_WIDTH))
+            columns = int(request.args['columns']) if request.args.get('columns') else None
+        except ValueError:
+            return Response("width and columns must be integers", status=400, mimetype='text/plain')
+        try:
+            image = mosaic.get(width, columns)
+        except MosaicError as e:
+            return Response(str(e), status=400, mimetype='text/plain')
+
+        headers = {
+            'Cache-Control': 'no-cache',
+            'ETag': image.etag,
+            'X-Mosaic-Missing': ','.join(image.missing),
+            'Access-Control-Allow-Origin': '*'
+        }
+        if image.etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+
+        return Response(image.content, mimetype=image.content_type, headers=headers)
+
+    except Exception as e:
+        return Response(f"Error: {str(e)}", status=500, mimetype='text/plain')
+
+@app.route('/snapshot_stats')
+def snapshot_stats():
+    """Report snapshot cache hit/miss and coalescing counters, thumbnail rendering and mosaic builds"""
+    return jsonify(dict(snapshot_cache.stats(), variants=snapshot_variants.stats(), mosaic=mosaic.stats()))
+
 @app.route('/list_cameras')
 def list_cameras():
     """List available cameras for the web UI"""
     try:
         # Get camera list from camera bridge
-        response = requests.get(f"{CAMERA_BRIDGE_URL}/list_cameras", timeout=5)
+        response = http_client.get(f"{CAMERA_BRIDGE_URL}/list_cameras", endpoint='bridge')
         if response.status_code == 200:
             return response.json()
         else:
@@ -668,6 +728,11 @@ def index():
 def health():
     return jsonify({"status": "healthy", "service": "smart-home-ui"})
 
+@app.route('/http_stats')
+def http_stats():
+    """Report shared HTTP connection-pool usage"""
+    return jsonify(http_client.stats())
+
 if __name__ == '__main__':
     print("🌐 Smart Home Web UI Starting...")
     print("🏠 Home Assistant:", HA_URL)
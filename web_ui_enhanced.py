@@ -4,14 +4,26 @@ Enhanced Smart Home Voice Command Web UI
 Advanced web interface with real-time updates, device control, and analytics
 """
 
-from flask import Flask, render_template_string, request, jsonify, Response
+from flask import Flask, render_template_string, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import requests
+import http_client
+import metrics
+import tracing
+from snapshot_cache import SnapshotCache, SnapshotUnavailable
+from snapshot_variants import SIZES, SnapshotVariants
+from camera_mosaic import MOSAIC_WIDTH, CameraMosaic, MosaicError
+from command_history import HISTORY_DB, CommandHistory, HistoryError
+from command_analytics import BREAKDOWN_WINDOWS, CommandAnalytics
 import json
 import os
 from datetime import datetime
+import threading
 import time
 
+from event_hub import EventHub
+from ha_state_store import HAStateStore
+from sse import SSE_HEADERS
+
 app = Flask(__name__)
 CORS(app)
 
@@ -36,8 +48,47 @@ HA_HEADERS = {
     'Content-Type': 'application/json'
 }
 
-# In-memory storage for demo (replace with Redis/DB in production)
-command_history = []
+# One upstream snapshot fetch per camera per freshness window, shared by every client
+snapshot_cache = SnapshotCache(lambda entity_id: fetch_snapshot(entity_id))
+# Thumbnail and medium renditions of those frames, rendered once per frame
+snapshot_variants = SnapshotVariants(snapshot_cache)
+# Every camera in one grid JPEG for wall displays and slow links
+mosaic = CameraMosaic(snapshot_variants, CAMERA_ENTITIES)
+
+# In-memory mirror of HA entity states, kept current over the WebSocket API
+state_store = HAStateStore(HA_URL, HA_TOKEN)
+
+# Request counters, snapshot-fetch latency and cache hit ratio on /metrics
+metrics.instrument(app, http=http_client,
+                   caches={'snapshot': snapshot_cache, 'snapshot_variants': snapshot_variants, 'mosaic': mosaic},
+                   state_store=state_store)
+tracing.instrument(app, 'enhanced-smart-home-ui')
+
+# Server-push channel for the dashboard: every event is computed once and fanned out
+event_hub = EventHub()
+DASHBOARD_DOMAINS = ('light', 'switch', 'climate', 'media_player', 'camera')
+HEALTH_INTERVAL = float(os.getenv('DASHBOARD_HEALTH_INTERVAL', '15'))
+SNAPSHOT_PUSH_INTERVAL = float(os.getenv('DASHBOARD_SNAPSHOT_INTERVAL', '10'))
+_publishers_lock = threading.Lock()
+_publishers_started = False
+
+# Every command sent from the dashboard, persisted with bounded retention.
+# Opened on first use, so importing this module never touches the filesystem.
+_command_history = None
+_history_lock = threading.Lock()
+MAX_HISTORY_POST = 16 * 1024  # bytes; a command plus its bridge reply
+
+# Rolling windows, latency quantiles and breakdowns, updated as commands are recorded
+analytics = CommandAnalytics()
+
+def history_store():
+    """The command history store (COMMAND_HISTORY_DB), opened and followed by analytics on first use"""
+    global _command_history
+    with _history_lock:
+        if _command_history is None:
+            _command_history = CommandHistory(HISTORY_DB)
+            analytics.attach(_command_history)
+        return _command_history
 device_states = {}
 
 # Enhanced HTML Template
@@ -620,8 +671,6 @@ HTML_TEMPLATE = """
 
     <script>
         // Enhanced JavaScript with real-time features
-        let commandCount = 0;
-        let responseTimes = [];
         let recognition = null;
         let isRecording = false;
 
@@ -634,48 +683,109 @@ HTML_TEMPLATE = """
             'back_road': 'camera.back_lt_facing_road_camera_high_resolution_channel'
         };
 
+        let pollTimers = [];
+
         // Initialize on page load
         document.addEventListener('DOMContentLoaded', function() {
             initializeApp();
-            setInterval(refreshData, 30000); // Refresh every 30 seconds
-            setInterval(updateCameraSnapshots, 10000); // Update camera snapshots every 10 seconds
+            connectEventStream();
         });
 
         function initializeApp() {
-            checkSystemStatus();
             loadCameras();
             loadDevices();
             loadCommandHistory();
-            updateAnalytics();
+            refreshAnalytics();
         }
 
         function refreshData() {
             checkSystemStatus();
             updateCameraSnapshots();
-            updateAnalytics();
+            refreshAnalytics();
         }
 
-        // Enhanced system status check
-        async function checkSystemStatus() {
-            const statuses = {
-                camera: { element: 'cameraStatus', url: 'http://localhost:5002/health', name: 'Camera Bridge' },
-                main: { element: 'mainStatus', url: 'http://localhost:5001/health', name: 'AI Bridge' },
-                ha: { element: 'haStatus', url: 'http://localhost:5002/test_connections', name: 'Home Assistant' }
-            };
+        // Server push: one /api/events stream replaces per-browser polling.
+        // Polling only runs while the stream is down (EventSource retries on its own).
+        function connectEventStream() {
+            if (!window.EventSource) {
+                startPolling();
+                return;
+            }
+            const source = new EventSource('/api/events');
+            source.onopen = stopPolling;
+            source.onerror = startPolling;
+
+            source.addEventListener('health', event => applyHealth(JSON.parse(event.data)));
+            source.addEventListener('analytics', event => updateAnalytics(JSON.parse(event.data)));
+
+            source.addEventListener('snapshot', event => {
+                const data = JSON.parse(event.data);
+                const img = document.querySelector(`.camera-preview img[data-camera="${data.camera}"]`);
+                if (!img) return;
+                if (data.available) {
+                    img.style.display = '';
+                    img.nextElementSibling.style.display = 'none';
+                    markCameraOnline(data.camera);
+                    refreshSnapshot(img);
+                } else {
+                    markCameraOffline(data.camera);
+                }
+            });
+
+            source.addEventListener('state', event => {
+                const data = JSON.parse(event.data);
+                const cameraKey = Object.keys(CAMERA_ENTITIES).find(key => CAMERA_ENTITIES[key] === data.entity_id);
+                if (cameraKey) {
+                    data.state === 'unavailable' ? markCameraOffline(cameraKey) : markCameraOnline(cameraKey);
+                }
+                document.getElementById('lastUpdate').textContent = new Date().toLocaleTimeString();
+            });
+        }
+
+        function startPolling() {
+            if (pollTimers.length) return;
+            refreshData();
+            pollTimers = [
+                setInterval(refreshData, 30000), // Refresh every 30 seconds
+                setInterval(updateCameraSnapshots, 10000) // Update camera snapshots every 10 seconds
+            ];
+        }
+
+        function stopPolling() {
+            pollTimers.forEach(clearInterval);
+            pollTimers = [];
+        }
+
+        const SERVICE_STATUS = {
+            camera: { element: 'cameraStatus', url: 'http://localhost:5002/health', name: 'Camera Bridge', icon: 'video' },
+            main: { element: 'mainStatus', url: 'http://localhost:5001/health', name: 'AI Bridge', icon: 'robot' },
+            ha: { element: 'haStatus', url: 'http://localhost:5002/test_connections', name: 'Home Assistant', icon: 'home' }
+        };
+
+        function setServiceStatus(key, online) {
+            const config = SERVICE_STATUS[key];
+            const element = document.getElementById(config.element);
+            element.className = `status-item ${online ? 'healthy' : 'error'}`;
+            element.innerHTML = `<i class="fas fa-${config.icon}"></i> ${config.name}: ${online ? 'Online' : 'Offline'}`;
+        }
+
+        function applyHealth(health) {
+            for (const key of Object.keys(SERVICE_STATUS)) {
+                setServiceStatus(key, Boolean(health[key]));
+            }
+            const systemElement = document.getElementById('systemStatus');
+            systemElement.className = 'status-item healthy';
+            systemElement.innerHTML = `<i class="fas fa-microchip"></i> System: Online (${new Date(health.checked_at * 1000).toLocaleTimeString()})`;
+        }
 
-            for (const [key, config] of Object.entries(statuses)) {
-                const element = document.getElementById(config.element);
+        // Fallback system status check, used only while the event stream is unavailable
+        async function checkSystemStatus() {
+            for (const [key, config] of Object.entries(SERVICE_STATUS)) {
                 try {
                     const response = await fetch(config.url);
-                    if (response.ok) {
-                        element.className = 'status-item healthy';
-                        element.innerHTML = `<i class="fas fa-${key === 'camera' ? 'video' : key === 'main' ? 'robot' : 'home'}"></i> ${config.name}: Online`;
-                    } else {
-                        throw new Error('Service unavailable');
-                    }
+                    setServiceStatus(key, response.ok);
                 } catch (error) {
-                    element.className = 'status-item error';
-                    element.innerHTML = `<i class="fas fa-${key === 'camera' ? 'video' : key === 'main' ? 'robot' : 'home'}"></i> ${config.name}: Offline`;
+                    setServiceStatus(key, false);
                 }
             }
 
@@ -709,7 +819,8 @@ HTML_TEMPLATE = """
                         card.className = 'camera-card';
                         card.innerHTML = `
                             <div class="camera-preview">
-                                <img src="/camera_proxy/${cameraKey}?t=${Date.now()}"
+                                <img src="/camera_proxy/${cameraKey}?size=thumb" data-src="/camera_proxy/${cameraKey}?size=thumb"
+                                     data-camera="${cameraKey}"
                                      alt="${name}"
                                      onload="this.nextElementSibling.style.display='none'; markCameraOnline('${cameraKey}');"
                                      onerror="this.style.display='none'; this.nextElementSibling.style.display='flex'; markCameraOffline('${cameraKey}');">
@@ -769,12 +880,28 @@ HTML_TEMPLATE = """
             const images = document.querySelectorAll('.camera-preview img');
             images.forEach(img => {
                 if (img.style.display !== 'none') {
-                    const originalSrc = img.src.split('?')[0];
-                    img.src = `${originalSrc}?t=${Date.now()}`;
+                    refreshSnapshot(img);
                 }
             });
         }
 
+        // Revalidate with the server's ETag; unchanged frames come back as 304 and are not re-decoded
+        async function refreshSnapshot(img) {
+            try {
+                const response = await fetch(img.dataset.src, { cache: 'no-cache' });
+                if (!response.ok) return;
+                const etag = response.headers.get('ETag');
+                if (etag && etag === img.dataset.etag) return;
+                img.dataset.etag = etag || '';
+                const blob = await response.blob();
+                if (img.dataset.objectUrl) URL.revokeObjectURL(img.dataset.objectUrl);
+                img.dataset.objectUrl = URL.createObjectURL(blob);
+                img.src = img.dataset.objectUrl;
+            } catch (error) {
+                console.error('Snapshot refresh failed:', error);
+            }
+        }
+
         // Load smart home devices
         async function loadDevices() {
             const deviceGrid = document.getElementById('deviceGrid');
@@ -875,7 +1002,8 @@ HTML_TEMPLATE = """
                 responseArea.innerHTML = '<div class="loading-spinner"></div> Processing...';
 
                 // Determine if it's a camera command
-                const isCameraCommand = ['show', 'display', 'view', 'camera', 'check'].some(keyword =>
+                const isCameraCommand = ['show', 'display', 'view', 'camera', 'check',
+                                         'anyone', 'anybody', 'someone', 'somebody'].some(keyword =>
                     command.toLowerCase().includes(keyword)
                 );
 
@@ -893,13 +1021,21 @@ HTML_TEMPLATE = """
                 const endTime = Date.now();
                 const responseTime = endTime - startTime;
 
-                // Update analytics
-                commandCount++;
-                responseTimes.push(responseTime);
-                updateAnalytics();
+                // The bridge answers with its trace id; link the per-hop breakdown
+                const requestId = response.headers.get('X-Request-ID');
+                const traceLink = requestId ? `
+                        <div style="font-size: 0.8em; margin-top: 8px;">
+                            <a href="${url.replace('/voice_command', '/debug/trace/' + requestId)}" target="_blank">
+                                <i class="fas fa-stream"></i> Trace ${requestId.slice(0, 8)}
+                            </a>
+                        </div>` : '';
 
                 // Add to history
                 addToHistory(command, result.success);
+                recordCommand({
+                    command, result, response_ms: responseTime, request_id: requestId,
+                    bridge: isCameraCommand ? 'camera' : 'main'
+                });
 
                 // Display result
                 if (result.success) {
@@ -907,7 +1043,7 @@ HTML_TEMPLATE = """
                         <div style="color: #28a745; margin-bottom: 10px;">
                             <i class="fas fa-check-circle"></i> Command executed successfully
                         </div>
-                        <div>${result.response || 'Command completed'}</div>
+                        <div>${result.response || 'Command completed'}</div>${traceLink}
                     `;
                     showNotification('Command executed successfully', 'success');
                 } else {
@@ -915,7 +1051,7 @@ HTML_TEMPLATE = """
                         <div style="color: #dc3545; margin-bottom: 10px;">
                             <i class="fas fa-exclamation-circle"></i> Command failed
                         </div>
-                        <div>${result.error || 'Unknown error'}</div>
+                        <div>${result.error || 'Unknown error'}</div>${traceLink}
                     `;
                     showNotification('Command failed', 'error');
                 }
@@ -930,20 +1066,33 @@ HTML_TEMPLATE = """
                     </div>
                 `;
                 showNotification('Network error', 'error');
+                recordCommand({ command, outcome: 'error', result: { error: error.message },
+                                response_ms: Date.now() - startTime });
             }
         }
 
-        function addToHistory(command, success) {
+        function recordCommand(entry) {
+            // Server-side history outlives the browser; a failed write only loses this entry
+            fetch('/api/command_history', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(entry)
+            }).catch(error => console.error('History write failed:', error));
+        }
+
+        function addToHistory(command, success, time = new Date()) {
             const history = document.getElementById('commandHistory');
             const item = document.createElement('div');
             item.className = 'command-item';
+            // Commands come from every dashboard via the server: set as text, never parsed as HTML
             item.innerHTML = `
-                <div class="command-text">${command}</div>
+                <div class="command-text"></div>
                 <div style="display: flex; align-items: center; gap: 10px;">
                     <i class="fas fa-${success ? 'check' : 'times'}" style="color: ${success ? '#28a745' : '#dc3545'};"></i>
-                    <div class="command-time">${new Date().toLocaleTimeString()}</div>
+                    <div class="command-time">${time.toLocaleTimeString()}</div>
                 </div>
             `;
+            item.querySelector('.command-text').textContent = command;
 
             if (history.firstChild && history.firstChild.style && history.firstChild.style.textAlign) {
                 history.innerHTML = '';
@@ -957,22 +1106,34 @@ HTML_TEMPLATE = """
             }
         }
 
-        function updateAnalytics() {
-            document.getElementById('commandCount').textContent = commandCount;
+        // Aggregated server-side over every dashboard's commands; pushed as an 'analytics' event
+        function updateAnalytics(card) {
+            document.getElementById('commandCount').textContent = card.commands;
+            const responseTime = document.getElementById('responseTime');
+            if (card.latency_ms) {
+                responseTime.textContent = `${Math.round(card.latency_ms.mean)}ms`;
+                responseTime.title = `p50 ${card.latency_ms.p50}ms, p95 ${card.latency_ms.p95}ms`;
+            }
+        }
 
-            if (responseTimes.length > 0) {
-                const avgTime = Math.round(responseTimes.reduce((a, b) => a + b, 0) / responseTimes.length);
-                document.getElementById('responseTime').textContent = `${avgTime}ms`;
+        async function refreshAnalytics() {
+            try {
+                const analytics = await fetch('/api/analytics').then(r => r.json());
+                updateAnalytics(analytics.windows['24h']);
+            } catch (error) {
+                console.error('Failed to load analytics:', error);
             }
         }
 
-        function loadCommandHistory() {
-            // Load from localStorage if available
-            const saved = localStorage.getItem('commandHistory');
-            if (saved) {
-                const history = JSON.parse(saved);
-                commandCount = history.length;
-                updateAnalytics();
+        async function loadCommandHistory() {
+            try {
+                const page = await fetch('/api/command_history?limit=10').then(r => r.json());
+                // Newest first from the server; insert oldest first so the newest ends on top
+                page.commands.slice().reverse().forEach(item =>
+                    addToHistory(item.command, item.outcome === 'success', new Date(item.ts * 1000))
+                );
+            } catch (error) {
+                console.error('Failed to load command history:', error);
             }
         }
 
@@ -1031,35 +1192,80 @@ HTML_TEMPLATE = """
 
 @app.route('/camera_proxy/<camera_name>')
 def camera_proxy(camera_name):
-    """Proxy camera snapshots from Home Assistant"""
+    """Proxy camera snapshots from Home Assistant through the shared snapshot cache (?size=thumb|medium|full)"""
     try:
         entity_id = CAMERA_ENTITIES.get(camera_name)
         if not entity_id:
             return Response("Camera not found", status=404, mimetype='text/plain')
 
-        snapshot_url = f"{HA_URL}/api/camera_proxy/{entity_id}"
-        response = requests.get(snapshot_url, headers=HA_HEADERS, timeout=10)
+        size = request.args.get('size', 'full')
+        if size not in SIZES:
+            return Response(f"size must be one of {', '.join(SIZES)}", status=400, mimetype='text/plain')
 
-        if response.status_code == 200:
-            return Response(
-                response.content,
-                mimetype='image/jpeg',
-                headers={
-                    'Cache-Control': 'no-cache',
-                    'Access-Control-Allow-Origin': '*'
-                }
-            )
-        else:
+        try:
+            snapshot = snapshot_variants.get(entity_id, size)
+        except SnapshotUnavailable:
             return Response("Camera unavailable", status=503, mimetype='text/plain')
 
+        headers = {
+            'Cache-Control': 'no-cache',
+            'ETag': snapshot.etag,
+            'Access-Control-Allow-Origin': '*'
+        }
+        if snapshot.etag in request.headers.get('If-None-Match', ''):
+            snapshot_cache.record_not_modified()
+            return Response(status=304, headers=headers)
+
+        return Response(snapshot.content, mimetype=snapshot.content_type, headers=headers)
+
     except Exception as e:
         return Response(f"Error: {str(e)}", status=500, mimetype='text/plain')
 
+def fetch_snapshot(entity_id):
+    """Fetch one JPEG frame from Home Assistant (snapshot cache miss path)"""
+    response = http_client.get(f"{HA_URL}/api/camera_proxy/{entity_id}", endpoint='ha_camera', headers=HA_HEADERS)
+    if response.status_code != 200:
+        raise SnapshotUnavailable(f"HTTP {response.status_code}")
+    return response.content, response.headers.get('Content-Type', 'image/jpeg')
+
+@app.route('/camera_mosaic')
+def camera_mosaic():
+    """All cameras composited into one JPEG grid (?width=<pixels>&columns=<n>), cached briefly"""
+    try:
+        try:
+            width = int(request.args.get('width', MOSAIC_WIDTH))
+            columns = int(request.args['columns']) if request.args.get('columns') else None
+        except ValueError:
+            return Response("width and columns must be integers", status=400, mimetype='text/plain')
+        try:
+            image = mosaic.get(width, columns)
+        except MosaicError as e:
+            return Response(str(e), status=400, mimetype='text/plain')
+
+        headers = {
+            'Cache-Control': 'no-cache',
+            'ETag': image.etag,
+            'X-Mosaic-Missing': ','.join(image.missing),
+            'Access-Control-Allow-Origin': '*'
+        }
+        if image.etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+
+        return Response(image.content, mimetype=image.content_type, headers=headers)
+
+    except Exception as e:
+        return Response(f"Error: {str(e)}", status=500, mimetype='text/plain')
+
+@app.route('/snapshot_stats')
+def snapshot_stats():
+    """Report snapshot cache hit/miss and coalescing counters, thumbnail rendering and mosaic builds"""
+    return jsonify(dict(snapshot_cache.stats(), variants=snapshot_variants.stats(), mosaic=mosaic.stats()))
+
 @app.route('/list_cameras')
 def list_cameras():
     """List available cameras for the web UI"""
     try:
-        response = requests.get(f"{CAMERA_BRIDGE_URL}/list_cameras", timeout=5)
+        response = http_client.get(f"{CAMERA_BRIDGE_URL}/list_cameras", endpoint='bridge')
         if response.status_code == 200:
             return response.json()
         else:
@@ -1073,41 +1279,162 @@ def list_cameras():
 
 @app.route('/api/command_history')
 def get_command_history():
-    """Get command history"""
-    return jsonify(command_history[-50:])  # Last 50 commands
+    """Page through command history, newest first; filter by outcome, entity or time range"""
+    args = request.args
+    try:
+        return jsonify(history_store().page(limit=args.get('limit', 50), cursor=args.get('cursor'),
+                                           outcome=args.get('outcome'), entity_id=args.get('entity'),
+                                           since=args.get('since'), until=args.get('until')))
+    except (HistoryError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/command_history', methods=['POST'])
+def record_command():
+    """Record a command the dashboard sent and the bridge reply it got"""
+    if request.content_length and request.content_length > MAX_HISTORY_POST:
+        return jsonify({"error": f"request body larger than {MAX_HISTORY_POST} bytes"}), 413
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('result') or {}, dict):
+        return jsonify({"error": "expected a JSON object with an optional result object"}), 400
+    try:
+        command_id = history_store().record(data.get('command'), data.get('result'),
+                                            outcome=data.get('outcome'), bridge=data.get('bridge'),
+                                            response_ms=data.get('response_ms'),
+                                            request_id=data.get('request_id'))
+    except (HistoryError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    event_hub.publish('analytics', analytics.window('24h'), retain=True)
+    return jsonify({"id": command_id}), 201
+
+@app.route('/api/command_history/stats')
+def command_history_stats():
+    """Report history rows, file size and compaction counters"""
+    return jsonify(history_store().stats())
 
 @app.route('/api/device_states')
 def get_device_states():
     """Get current device states from Home Assistant"""
     try:
-        response = requests.get(f"{HA_URL}/api/states", headers=HA_HEADERS, timeout=10)
-        if response.status_code == 200:
-            states = response.json()
-            # Filter and format device states
-            filtered_states = {}
-            for state in states:
-                entity_id = state.get('entity_id', '')
-                if any(domain in entity_id for domain in ['light.', 'switch.', 'climate.', 'media_player.']):
-                    filtered_states[entity_id] = {
-                        'state': state.get('state'),
-                        'friendly_name': state.get('attributes', {}).get('friendly_name', entity_id),
-                        'domain': entity_id.split('.')[0]
-                    }
-            return jsonify(filtered_states)
-        else:
+        try:
+            states = state_store.states_by_domain(['light', 'switch', 'climate', 'media_player'])
+        except Exception:
             return jsonify({"error": "Failed to fetch device states"}), 500
+
+        # Filter and format device states
+        filtered_states = {}
+        for state in states:
+            entity_id = state.get('entity_id', '')
+            filtered_states[entity_id] = {
+                'state': state.get('state'),
+                'friendly_name': state.get('attributes', {}).get('friendly_name', entity_id),
+                'domain': entity_id.split('.')[0]
+            }
+        return jsonify(filtered_states)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def publish_state_change(entity_id, old_state, new_state):
+    """Push dashboard-relevant state changes from the HA event stream"""
+    domain = entity_id.split('.')[0]
+    if domain not in DASHBOARD_DOMAINS:
+        return
+    if old_state and new_state and old_state.get('state') == new_state.get('state'):
+        return  # attribute-only update (e.g. a rotated camera access token)
+    event_hub.publish('state', {
+        'entity_id': entity_id,
+        'domain': domain,
+        'state': new_state.get('state') if new_state else None,
+        'friendly_name': (new_state or old_state or {}).get('attributes', {}).get('friendly_name', entity_id)
+    })
+
+state_store.add_listener(publish_state_change)
+
+def check_service_health():
+    """Probe both bridges and HA once on behalf of every connected dashboard"""
+    health = {}
+    for key, url in (('camera', f"{CAMERA_BRIDGE_URL}/health"), ('main', f"{MAIN_BRIDGE_URL}/health")):
+        try:
+            health[key] = http_client.get(url, endpoint='bridge').status_code == 200
+        except Exception:
+            health[key] = False
+    try:
+        response = http_client.get(f"{CAMERA_BRIDGE_URL}/test_connections", endpoint='bridge')
+        health['ha'] = response.status_code == 200 and \
+            response.json().get('home_assistant', {}).get('status') == 'connected'
+    except Exception:
+        health['ha'] = False
+    return health
+
+def health_publisher():
+    last = None
+    while True:
+        health = check_service_health()
+        if health != last:
+            event_hub.publish('health', dict(health, checked_at=time.time()), retain=True)
+            last = health
+        time.sleep(HEALTH_INTERVAL)
+
+def snapshot_publisher():
+    """Refresh snapshots while anyone is watching and announce frames that changed"""
+    last_etags = {}
+    while True:
+        if event_hub.subscriber_count():
+            for camera_key, entity_id in CAMERA_ENTITIES.items():
+                try:
+                    etag = snapshot_cache.get(entity_id).etag
+                except SnapshotUnavailable:
+                    etag = None
+                if etag != last_etags.get(camera_key, ''):
+                    event_hub.publish('snapshot', {'camera': camera_key, 'available': etag is not None, 'etag': etag})
+                    last_etags[camera_key] = etag
+        time.sleep(SNAPSHOT_PUSH_INTERVAL)
+
+def start_dashboard_publishers():
+    """Start the background publishers once, on the first dashboard connection"""
+    global _publishers_started
+    with _publishers_lock:
+        if _publishers_started:
+            return
+        _publishers_started = True
+    state_store.start()
+    for target in (health_publisher, snapshot_publisher):
+        threading.Thread(target=target, name=target.__name__, daemon=True).start()
+
+@app.route('/api/events')
+def dashboard_events():
+    """Server-Sent Events stream of state changes, service health and new snapshots"""
+    start_dashboard_publishers()
+    return Response(stream_with_context(event_hub.stream()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/api/events/stats')
+def dashboard_event_stats():
+    """Report subscriber count and fan-out counters"""
+    return jsonify(event_hub.stats())
+
 @app.route('/api/analytics')
 def get_analytics():
-    """Get system analytics"""
-    return jsonify({
-        "total_commands": len(command_history),
-        "uptime": time.time() - startup_time if 'startup_time' in globals() else 0,
-        "active_cameras": len(CAMERA_ENTITIES),
-        "system_health": "optimal"
-    })
+    """Rolling-window command counts, latency quantiles and per-intent/entity/source breakdowns"""
+    window = request.args.get('window', '24h')
+    if window not in BREAKDOWN_WINDOWS:
+        return jsonify({"error": f"window must be one of {', '.join(BREAKDOWN_WINDOWS)}"}), 400
+    history_store()  # analytics follow the store from its first use
+    return jsonify(dict(analytics.summary(window),
+                        uptime=time.time() - startup_time if 'startup_time' in globals() else 0,
+                        active_cameras=len(CAMERA_ENTITIES),
+                        system_health="optimal"))
+
+@app.route('/api/analytics/series')
+def get_analytics_series():
+    """Downsampled command counts and latency: per minute for the last hour, or per hour"""
+    resolution = request.args.get('resolution', 'minute')
+    if resolution not in ('minute', 'hour'):
+        return jsonify({"error": "resolution must be minute or hour"}), 400
+    try:
+        hours = int(request.args.get('hours', 24))
+    except ValueError:
+        return jsonify({"error": "hours must be an integer"}), 400
+    history_store()
+    return jsonify(analytics.series(resolution, hours))
 
 @app.route('/')
 def index():
@@ -1117,6 +1444,11 @@ def index():
 def health():
     return jsonify({"status": "healthy", "service": "enhanced-smart-home-ui"})
 
+@app.route('/http_stats')
+def http_stats():
+    """Report shared HTTP connection-pool usage"""
+    return jsonify(http_client.stats())
+
 # Record startup time for analytics
 startup_time = time.time()
 
@@ -1129,4 +1461,7 @@ if __name__ == '__main__':
     print("🌟 Enhanced Web UI ready on http://localhost:8081")
     print("📱 Features: Real-time updates, analytics, device control, and more!")
 
+    state_store.start()
+    history_store().start()
+
     app.run(host='0.0.0.0', port=8081, debug=False)
\ No newline at end of file